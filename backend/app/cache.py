@@ -0,0 +1,268 @@
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+import logging
+
+from app.database import BackendUnavailableError
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "900"))
+COMPLETION_CACHE_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", "256"))
+COMPLETION_CACHE_TTL_SECONDS = float(os.getenv("COMPLETION_CACHE_TTL_SECONDS", str(24 * 3600)))
+COMPLETION_CACHE_STALE_SECONDS = float(os.getenv("COMPLETION_CACHE_STALE_SECONDS", str(7 * 24 * 3600)))
+COMPLETION_CACHE_PATH = os.getenv("COMPLETION_CACHE_PATH")
+# Writes within this window are batched into one save of the cache file
+COMPLETION_CACHE_SAVE_DELAY_SECONDS = float(os.getenv("COMPLETION_CACHE_SAVE_DELAY_SECONDS", "2"))
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds.
+
+    With ``stale_ttl`` set, expired entries stay readable through
+    ``get_stale`` for that much longer, for stale-while-revalidate callers.
+    """
+
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, max_entries: int, ttl: float, stale_ttl: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        value, fresh = self.get_stale(key)
+        return value if fresh else default
+
+    def get_stale(self, key):
+        """Return ``(value, is_fresh)``, or ``(None, False)`` if nothing usable is cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            now = self.clock()
+            if entry is not None and entry[0] + self.stale_ttl < now:
+                del self._entries[key]
+                entry = None
+            if entry is None or entry[0] < now:
+                self.misses += 1
+                return (entry[1] if entry else None), False
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], True
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+class PersistentTTLCache(TTLCache):
+    """TTLCache that mirrors its entries to a JSON file so they survive restarts.
+
+    Keys must be strings and values JSON-serialisable. Expiry uses wall-clock
+    time so it stays meaningful across processes. Saves are batched: the
+    first ``set`` after a save schedules the next one ``save_delay`` seconds
+    later; ``flush`` writes pending changes immediately. Each save goes to
+    its own temporary file and is renamed into place, so concurrent savers
+    (threads or processes) never leave a torn file; the last one wins.
+    """
+
+    clock = staticmethod(time.time)
+
+    def __init__(self, max_entries: int, ttl: float, path: str = None, stale_ttl: float = 0.0,
+                 save_delay: float = COMPLETION_CACHE_SAVE_DELAY_SECONDS):
+        super().__init__(max_entries, ttl, stale_ttl)
+        self.path = path
+        self.save_delay = save_delay
+        self._save_lock = threading.Lock()
+        self._timer = None
+        self._timer_lock = threading.Lock()
+        if path:
+            self._load()
+
+    def set(self, key, value):
+        super().set(key, value)
+        if self.path:
+            self._schedule_save()
+
+    def _schedule_save(self):
+        with self._timer_lock:
+            if self._timer is None:
+                self._timer = threading.Timer(self.save_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write pending changes to disk now; a no-op if nothing changed."""
+        with self._timer_lock:
+            timer, self._timer = self._timer, None
+        if timer is None:
+            return
+        timer.cancel()
+        self._save()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache file {self.path}: {e}")
+            return
+        now = self.clock()
+        for key, (expires_at, value) in sorted(stored.items(), key=lambda item: item[1][0]):
+            if expires_at + self.stale_ttl >= now:
+                self._entries[key] = (expires_at, value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self):
+        with self._save_lock:
+            with self._lock:
+                snapshot = {key: list(entry) for key, entry in self._entries.items()}
+            directory = os.path.dirname(os.path.abspath(self.path))
+            tmp_path = None
+            try:
+                with tempfile.NamedTemporaryFile(
+                    "w", dir=directory, prefix=f".{os.path.basename(self.path)}.", suffix=".tmp", delete=False
+                ) as f:
+                    tmp_path = f.name
+                    json.dump(snapshot, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.warning(f"Failed to persist cache to {self.path}: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+
+
+# ---------------------------------------------------------------------------
+# Per-user data versions
+#
+# Every write path bumps the version of the account it touched, so cache keys
+# built from the version go stale the moment new data lands. Competitor views
+# mix several accounts, so they key on the global version instead.
+# ---------------------------------------------------------------------------
+
+_versions = {}
+_global_version = 0
+_versions_lock = threading.Lock()
+
+
+def data_version(username: str = None) -> int:
+    """Current write counter for ``username``, or the global one if omitted."""
+    with _versions_lock:
+        if username is None:
+            return _global_version
+        return _versions.get(username, 0)
+
+
+def bump_data_version(username: str):
+    """Mark ``username``'s data as changed; call after every write."""
+    global _global_version
+    with _versions_lock:
+        _versions[username] = _versions.get(username, 0) + 1
+        _global_version += 1
+
+
+response_cache = TTLCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS)
+
+# Last good response per endpoint/arguments regardless of version, served
+# while the circuit breaker reports the database as down
+last_good_cache = TTLCache(RESPONSE_CACHE_MAX_ENTRIES, 24 * 3600)
+
+
+def cached_response(endpoint: str, per_user: bool = True):
+    """Cache a ``username``-keyed GET handler until that user's data changes.
+
+    Keys are ``(endpoint, username, version)``. ``per_user=False`` keys on the
+    global version for views that read several accounts. The TTL bounds
+    staleness for writes made outside this process, like the seeder.
+    While the database is unavailable the last good response is served.
+    Callers get their own copy, so mutating a response never alters the cache.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(username: str = "my_brand", **kwargs):
+            base_key = (endpoint, username, tuple(sorted(kwargs.items())))
+            key = (*base_key, data_version(username if per_user else None))
+            result = response_cache.get(key)
+            if result is not None:
+                return copy.deepcopy(result)
+            try:
+                result = func(username=username, **kwargs)
+            except BackendUnavailableError:
+                stale = last_good_cache.get(base_key)
+                if stale is None:
+                    raise
+                logger.warning(f"Database unavailable, serving last good {endpoint} for {username}")
+                return copy.deepcopy(stale)
+            stored = copy.deepcopy(result)
+            response_cache.set(key, stored)
+            last_good_cache.set(base_key, stored)
+            return result
+
+        return wrapper
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# LLM completions, content-addressed by their inputs
+# ---------------------------------------------------------------------------
+
+completion_cache = PersistentTTLCache(
+    COMPLETION_CACHE_MAX_ENTRIES,
+    COMPLETION_CACHE_TTL_SECONDS,
+    COMPLETION_CACHE_PATH,
+    stale_ttl=COMPLETION_CACHE_STALE_SECONDS,
+)
+
+
+def completion_key(payload: dict, prompt_version: str, model: str) -> str:
+    """Hash of the canonicalised prompt inputs, prompt version and model."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{prompt_version}\n{model}\n{canonical}".encode()).hexdigest()
+
+
+def _cache_metrics():
+    caches = {"response": response_cache, "last_good": last_good_cache, "completion": completion_cache}
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    yield "gapsight_cache_hits_total", "counter", "Cache lookups that found a fresh entry.", [
+        ({"cache": name}, s["hits"]) for name, s in stats.items()
+    ]
+    yield "gapsight_cache_misses_total", "counter", "Cache lookups that found nothing fresh.", [
+        ({"cache": name}, s["misses"]) for name, s in stats.items()
+    ]
+    yield "gapsight_cache_hit_ratio", "gauge", "Hits over lookups since the process started.", [
+        ({"cache": name}, s["hits"] / (s["hits"] + s["misses"]) if s["hits"] + s["misses"] else 0.0)
+        for name, s in stats.items()
+    ]
+    yield "gapsight_cache_entries", "gauge", "Entries currently held.", [
+        ({"cache": name}, s["entries"]) for name, s in stats.items()
+    ]
+
+
+registry.register_collector(_cache_metrics)
@@ -1,70 +1,399 @@
 import os
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
+from postgrest.exceptions import APIError
 from dotenv import load_dotenv
+from contextvars import ContextVar
+import httpx
+import random
+import threading
 import time
 from functools import wraps
 import logging
 
+from app.localdb import LocalClientPool
+from app.metrics import TimedTransport
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "4"))
+SUPABASE_KEEPALIVE_SECONDS = float(os.getenv("SUPABASE_KEEPALIVE_SECONDS", "60"))
+SUPABASE_HEALTH_CHECK_SECONDS = float(os.getenv("SUPABASE_HEALTH_CHECK_SECONDS", "30"))
+SUPABASE_TIMEOUT_SECONDS = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "20"))
+
+# "supabase" (default) or "local" for the embedded SQLite store in app/localdb.py
+DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "supabase").lower()
+LOCAL_DATABASE_PATH = os.getenv(
+    "LOCAL_DATABASE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gapsight.sqlite3"),
+)
+
 logger = logging.getLogger(__name__)
 
-# Create a fresh client instance
-def get_supabase_client():
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
 
-# Initialize global client
-supabase: Client = get_supabase_client()
+def _create_client() -> Client:
+    """Build a Supabase client on top of a keep-alive HTTP/2 connection pool."""
+    transport = httpx.HTTPTransport(
+        limits=httpx.Limits(
+            max_connections=20,
+            max_keepalive_connections=10,
+            keepalive_expiry=SUPABASE_KEEPALIVE_SECONDS,
+        ),
+        http2=True,
+    )
+    http_client = httpx.Client(
+        timeout=SUPABASE_TIMEOUT_SECONDS,
+        transport=TimedTransport("supabase", transport, database=True),
+        follow_redirects=True,
+    )
+    return create_client(SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(httpx_client=http_client))
+
+
+def _close_client(client: Client):
+    try:
+        client.options.httpx_client.close()
+    except Exception as e:
+        logger.warning(f"Failed to close Supabase client: {e}")
+
+
+class SupabaseClientPool:
+    """Bounded set of long-lived Supabase clients shared by every router.
+
+    Slots are filled lazily and handed out round-robin. A client that has not
+    been verified for ``health_check_seconds`` is probed before it is lent out,
+    and clients that fail the probe or are reported dead by
+    ``retry_on_disconnect`` are closed and rebuilt in place.
+    """
+
+    def __init__(self, size: int = SUPABASE_POOL_SIZE, health_check_seconds: float = SUPABASE_HEALTH_CHECK_SECONDS):
+        self.size = max(1, size)
+        self.health_check_seconds = health_check_seconds
+        self._slots = [None] * self.size
+        self._checked_at = [0.0] * self.size
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def get(self) -> Client:
+        with self._lock:
+            idx = self._next
+            self._next = (self._next + 1) % self.size
+            client = self._slots[idx]
+            if client is None:
+                client = self._replace(idx)
+            needs_probe = time.monotonic() - self._checked_at[idx] > self.health_check_seconds
+
+        if needs_probe and not self._is_healthy(client):
+            logger.warning(f"Supabase client in slot {idx} failed health check, replacing it")
+            with self._lock:
+                client = self._replace(idx, client)
+        elif needs_probe:
+            self._checked_at[idx] = time.monotonic()
+        return client
+
+    def discard(self, client: Client):
+        """Replace a client whose connection is known to be broken."""
+        with self._lock:
+            for idx, slot in enumerate(self._slots):
+                if slot is client:
+                    self._replace(idx, client)
+                    return
+
+    def close(self):
+        with self._lock:
+            for idx, client in enumerate(self._slots):
+                if client is not None:
+                    _close_client(client)
+                self._slots[idx] = None
+
+    def _replace(self, idx: int, expected: Client = None) -> Client:
+        # Another thread may already have swapped the slot; keep its client
+        current = self._slots[idx]
+        if current is not None and current is not expected:
+            return current
+        if current is not None:
+            _close_client(current)
+        client = _create_client()
+        self._slots[idx] = client
+        self._checked_at[idx] = time.monotonic()
+        return client
+
+    @staticmethod
+    def _is_healthy(client: Client) -> bool:
+        try:
+            client.table("users").select("id").limit(1).execute()
+            return True
+        except Exception as e:
+            logger.warning(f"Supabase health probe failed: {str(e)[:100]}")
+            return False
+
+
+def _create_pool():
+    """Client pool for the configured backend; both expose ``get / discard / close``."""
+    if DATABASE_BACKEND == "local":
+        logger.info(f"Using the local database at {LOCAL_DATABASE_PATH}")
+        return LocalClientPool(LOCAL_DATABASE_PATH)
+    if DATABASE_BACKEND != "supabase":
+        raise ValueError(f"Unknown DATABASE_BACKEND {DATABASE_BACKEND!r}, expected 'supabase' or 'local'")
+    return SupabaseClientPool()
+
+
+_pool = _create_pool()
+
+# Client lent to the current request, so retries can report it as dead
+_current_client: ContextVar = ContextVar("supabase_client", default=None)
+
+
+def get_supabase_client() -> Client:
+    """Borrow a pooled, long-lived Supabase client (or the local store's client)."""
+    client = _pool.get()
+    _current_client.set(client)
+    return client
+
+
+def close_supabase_clients():
+    _pool.close()
+
+
+# ---------------------------------------------------------------------------
+# Retry policy: type-based classification, full-jitter backoff, per-endpoint
+# retry budgets and a circuit breaker shared by every database call
+# ---------------------------------------------------------------------------
+
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "2"))
+# Total backoff a plain (threadpool) handler may sleep through before giving
+# up, so an outage can't park every worker thread in time.sleep
+RETRY_MAX_BLOCKING_SECONDS = float(os.getenv("RETRY_MAX_BLOCKING_SECONDS", "1"))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+RETRYABLE_STATUS_CODES = {"502", "503", "504"}
+
+SUPABASE_HOST = httpx.URL(SUPABASE_URL).host if SUPABASE_URL else None
+
+
+class BackendUnavailableError(Exception):
+    """Raised instead of calling Supabase while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"Database temporarily unavailable, retry in {retry_after:.0f}s")
+
+
+def is_database_error(exc: Exception) -> bool:
+    """Whether an exception came from a Supabase/PostgREST call, not another service."""
+    if isinstance(exc, APIError):
+        return True
+    if isinstance(exc, httpx.HTTPError):
+        try:
+            return exc.request.url.host == SUPABASE_HOST
+        except RuntimeError:  # raised without a request attached
+            return False
+    return False
+
+
+def _is_database_outage(exc: Exception) -> bool:
+    return is_database_error(exc) and is_transient_error(exc)
 
-# Retry decorator for database operations with exponential backoff
-def retry_on_disconnect(max_retries=5, initial_delay=0.3):
+
+def is_transient_error(exc: Exception) -> bool:
+    """Whether an exception means the connection, not the query, failed."""
+    if isinstance(exc, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return str(exc.response.status_code) in RETRYABLE_STATUS_CODES
+    if isinstance(exc, APIError):
+        return str(exc.code) in RETRYABLE_STATUS_CODES
+    return False
+
+
+def backoff_delay(attempt: int, initial_delay: float, max_delay: float = RETRY_MAX_DELAY_SECONDS) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(max_delay, initial_delay * (2 ** attempt)))
+
+
+class RetryBudget:
+    """Caps retries for one endpoint at a fraction of its recent calls.
+
+    Every call deposits ``ratio`` tokens and every retry spends one, so a
+    backend outage can add at most ``ratio`` extra load instead of
+    multiplying it by ``max_retries``.
+    """
+
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, max_tokens: float = 10.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def record_call(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive transient failures -> half-open trial call."""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """End a half-open trial whose outcome says nothing about the database."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.error(f"Circuit breaker opened after {self._failures} consecutive database failures")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+breaker = CircuitBreaker()
+_budgets = {}
+_budgets_lock = threading.Lock()
+
+
+def _budget_for(name: str) -> RetryBudget:
+    with _budgets_lock:
+        if name not in _budgets:
+            _budgets[name] = RetryBudget()
+        return _budgets[name]
+
+
+def _discard_current_client():
+    # Swap the broken client out of the pool; the retry borrows a fresh one
+    broken = _current_client.get()
+    if broken is not None:
+        try:
+            _pool.discard(broken)
+        except Exception as client_err:
+            logger.error(f"Failed to recreate client: {client_err}")
+
+
+class _RetryState:
+    """Per-call bookkeeping for one decorated call."""
+
+    def __init__(self, name, max_retries, initial_delay, fallback):
+        self.name = name
+        self.max_retries = max_retries
+        self.initial_delay = initial_delay
+        self.fallback = fallback
+        self.budget = _budget_for(name)
+        self.budget.record_call()
+        self.slept = 0.0
+
+    def unavailable(self, args, kwargs):
+        """Result to use when the breaker refuses the call."""
+        if self.fallback is not None:
+            logger.warning(f"Circuit open, serving fallback for {self.name}")
+            return self.fallback(*args, **kwargs)
+        raise BackendUnavailableError(breaker.retry_after())
+
+    def next_delay(self, attempt, error, max_total: float = None):
+        """Delay before the next attempt, or None if the error should propagate.
+
+        Errors from other services (RapidAPI, Apify, Groq) propagate untouched:
+        they say nothing about the database, so they neither trip the breaker
+        nor retire pooled clients. ``max_total`` caps the summed delays.
+        """
+        if not is_database_error(error):
+            breaker.release()
+            return None
+        if not is_transient_error(error):
+            # The backend answered, so this says nothing bad about its health
+            breaker.record_success()
+            logger.error(f"Non-connection error in {self.name}: {str(error)[:200]}")
+            return None
+        breaker.record_failure()
+        _discard_current_client()
+        if attempt >= self.max_retries - 1:
+            logger.error(f"Max retries ({self.max_retries}) exceeded for {self.name}")
+            return None
+        if not self.budget.try_spend():
+            logger.error(f"Retry budget exhausted for {self.name}")
+            return None
+        delay = backoff_delay(attempt, self.initial_delay)
+        if max_total is not None and self.slept + delay > max_total:
+            logger.error(f"Retry backoff for {self.name} would block a worker past {max_total:.1f}s, giving up")
+            return None
+        self.slept += delay
+        logger.warning(f"Database connection error on attempt {attempt + 1}/{self.max_retries}. Retrying in {delay:.2f}s: {str(error)[:100]}")
+        return delay
+
+
+def retry_on_disconnect(max_retries=5, initial_delay=0.3, fallback=None):
+    """Retry transient database failures with jittered backoff.
+
+    For plain functions, which run in the threadpool; async code calls them
+    through ``run_in_threadpool``. A call gives up once its backoff would
+    total more than RETRY_MAX_BLOCKING_SECONDS, so an outage can't park every
+    worker thread. Only errors from database calls are retried or counted by
+    the circuit breaker. ``fallback`` is called with the handler's arguments
+    when the circuit breaker is open or retries run out, e.g. to serve cached
+    data.
+    """
     def decorator(func):
+        name = func.__qualname__
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            global supabase
-            last_error = None
-            
+            state = _RetryState(name, max_retries, initial_delay, fallback)
             for attempt in range(max_retries):
+                if not breaker.allow():
+                    return state.unavailable(args, kwargs)
                 try:
-                    return func(*args, **kwargs)
+                    result = func(*args, **kwargs)
                 except Exception as e:
-                    last_error = e
-                    error_msg = str(e).lower()
-                    
-                    # Check if it's a connection-related error
-                    is_connection_error = any([
-                        "disconnected" in error_msg,
-                        "server disconnected" in error_msg,
-                        "remoteprotocol" in error_msg,
-                        "connection" in error_msg,
-                        "timeout" in error_msg,
-                        "refused" in error_msg,
-                        "reset" in error_msg,
-                    ])
-                    
-                    if is_connection_error and attempt < max_retries - 1:
-                        delay = initial_delay * (2 ** attempt)  # Exponential backoff
-                        logger.warning(f"Database connection error on attempt {attempt + 1}/{max_retries}. Retrying in {delay}s: {str(e)[:100]}")
-                        time.sleep(delay)
-                        
-                        # Recreate client with fresh connection
-                        try:
-                            supabase = get_supabase_client()
-                        except Exception as client_err:
-                            logger.error(f"Failed to recreate client: {client_err}")
-                        continue
-                    
-                    # If not a connection error or max retries exceeded
-                    if not is_connection_error:
-                        logger.error(f"Non-connection error in {func.__name__}: {str(e)[:200]}")
+                    delay = state.next_delay(attempt, e, RETRY_MAX_BLOCKING_SECONDS)
+                    if delay is None:
+                        if fallback is not None and _is_database_outage(e):
+                            return fallback(*args, **kwargs)
                         raise
-            
-            logger.error(f"Max retries ({max_retries}) exceeded for {func.__name__}")
-            raise last_error
-        
+                    time.sleep(delay)
+                    continue
+                breaker.record_success()
+                return result
+
         return wrapper
     return decorator
-
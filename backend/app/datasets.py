@@ -0,0 +1,221 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import defaultdict
+import logging
+import os
+
+from postgrest.exceptions import APIError
+
+from app.engine import PostFrame, SeriesFrame
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Request-scoped dataset memoization
+#
+# Handlers, insight builders and report exports open a computation context;
+# every loader below then fetches each user id, roster, post frame and
+# follower series at most once for the life of that request. Outside a
+# context the loaders simply query Supabase.
+# ---------------------------------------------------------------------------
+
+# PostgREST silently truncates every response at its max-rows setting (1000
+# on Supabase), so reads that can exceed it are fetched in pages of this size
+POSTGREST_MAX_ROWS = int(os.getenv("POSTGREST_MAX_ROWS", "1000"))
+
+POST_COLUMNS = "user_id, posted_at, likes, comments, shares, content_type"
+FOLLOWER_COLUMNS = "user_id, follower_count, recorded_at"
+
+_current: ContextVar = ContextVar("computation_context", default=None)
+
+
+class ComputationContext:
+    """Datasets already loaded during the current request or export."""
+
+    def __init__(self):
+        self.user_ids = {}
+        self.rosters = {}
+        self.posts = {}
+        self.followers = {}
+        self.buckets = {}
+        self.engagement = {}
+
+
+@contextmanager
+def computation_context():
+    """Share loaded datasets between every computation in this block.
+
+    Nested blocks reuse the outer context.
+    """
+    ctx = _current.get()
+    if ctx is not None:
+        yield ctx
+        return
+    token = _current.set(ComputationContext())
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+def _context():
+    # A throwaway context outside a request keeps the loaders' logic uniform
+    return _current.get() or ComputationContext()
+
+
+def resolve_user_ids(supabase, usernames) -> dict:
+    """Map usernames to user ids; unknown usernames are left out."""
+    ctx = _context()
+    missing = [u for u in dict.fromkeys(usernames) if u not in ctx.user_ids]
+    if missing:
+        res = supabase.table("users").select("id, username").in_("username", missing).execute()
+        found = {u["username"]: u["id"] for u in (res.data or [])}
+        for username in missing:
+            ctx.user_ids[username] = found.get(username)
+    return {u: ctx.user_ids[u] for u in usernames if ctx.user_ids.get(u)}
+
+
+def load_roster(supabase, owner_id) -> list:
+    """Competitor rows tracked by ``owner_id``."""
+    ctx = _context()
+    if owner_id not in ctx.rosters:
+        res = supabase.table("competitors").select("*").eq("owner_id", owner_id).execute()
+        ctx.rosters[owner_id] = res.data or []
+    return ctx.rosters[owner_id]
+
+
+def fetch_all(supabase, make_query) -> list:
+    """Every row of ``make_query()``, paged with ``range`` until a short page.
+
+    The query must have a total order so pages neither overlap nor skip rows.
+    Clients with ``max_rows = None`` (the local store) are read in one go.
+    """
+    page_size = getattr(supabase, "max_rows", POSTGREST_MAX_ROWS)
+    if page_size is None:
+        return make_query().execute().data or []
+    rows = []
+    while True:
+        page = make_query().range(len(rows), len(rows) + page_size - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+
+
+def _load_grouped(supabase, cache: dict, table: str, columns: str, order_by: str, user_ids) -> dict:
+    missing = [uid for uid in dict.fromkeys(user_ids) if uid not in cache]
+    if missing:
+        rows = fetch_all(supabase, lambda: supabase.table(table).select(columns)
+                         .in_("user_id", missing)
+                         .order(order_by, desc=False)
+                         .order("id"))
+        grouped = defaultdict(list)
+        for row in rows:
+            grouped[row["user_id"]].append(row)
+        for uid in missing:
+            cache[uid] = grouped.get(uid, [])
+    return {uid: cache[uid] for uid in user_ids}
+
+
+def load_post_frames(supabase, user_ids) -> dict:
+    """A columnar ``PostFrame`` of each user id's posts, oldest first."""
+    cache = _context().posts
+    missing = [uid for uid in dict.fromkeys(user_ids) if uid not in cache]
+    if missing:
+        rows = _load_grouped(supabase, {}, "posts", POST_COLUMNS, "posted_at", missing)
+        for uid in missing:
+            cache[uid] = PostFrame.from_rows(rows[uid])
+    return {uid: cache[uid] for uid in user_ids}
+
+
+def load_follower_series(supabase, user_ids) -> dict:
+    """Follower snapshots per user id, oldest first."""
+    return _load_grouped(supabase, _context().followers, "follower_metrics", FOLLOWER_COLUMNS, "recorded_at", user_ids)
+
+
+# PostgREST codes for "function does not exist": stop calling an RPC that
+# hasn't been deployed and compute the same result client-side instead
+_MISSING_FUNCTION_CODES = {"PGRST202", "42883"}
+_unavailable_rpcs = set()
+
+
+def call_rpc(supabase, name: str, params: dict):
+    """Every row from a Postgres function, or None if it is not deployed.
+
+    Rows are paged like table reads, so the function must order its output.
+    Any other error propagates: it is a real failure, not a reason to quietly
+    recompute in Python.
+    """
+    if name in _unavailable_rpcs:
+        return None
+    try:
+        return fetch_all(supabase, lambda: supabase.rpc(name, params))
+    except APIError as e:
+        if str(e.code) not in _MISSING_FUNCTION_CODES:
+            raise
+        logger.warning(f"RPC {name} is not deployed, computing in Python instead")
+        _unavailable_rpcs.add(name)
+        return None
+
+
+def load_follower_buckets(supabase, user_ids, resolution: str = "week") -> dict:
+    """Last follower count per day/week/month bucket, per user id, oldest first.
+
+    Bucketing runs in Postgres so only one row per bucket is transferred.
+    """
+    cache = _context().buckets
+    missing = [uid for uid in dict.fromkeys(user_ids) if (uid, resolution) not in cache]
+    if missing:
+        rows = call_rpc(supabase, "follower_series_buckets", {"p_user_ids": missing, "p_resolution": resolution})
+        if rows is None:
+            raw = load_follower_series(supabase, missing)
+            grouped = {uid: SeriesFrame.from_rows(raw[uid]).bucket(resolution).points() for uid in missing}
+        else:
+            grouped = defaultdict(list)
+            for r in rows:
+                grouped[r["user_id"]].append({"date": str(r["bucket"])[:10], "followers": r["follower_count"]})
+        for uid in missing:
+            cache[(uid, resolution)] = grouped.get(uid, [])
+    return {uid: cache[(uid, resolution)] for uid in user_ids}
+
+
+def average_engagement(stats) -> float:
+    """Mean engagement per post across a list of engagement stats groups."""
+    post_count = sum(g["post_count"] for g in stats)
+    if not post_count:
+        return 0
+    return round(sum(g["total_engagement"] for g in stats) / post_count, 1)
+
+
+def load_engagement_stats(supabase, user_ids, group: str = "user", bucket: str = "month", since: str = None) -> dict:
+    """Grouped post counts and engagement totals per user id.
+
+    Each value is a list of ``{"key", "post_count", "total_engagement"}``
+    aggregated in Postgres, so the response is O(groups) rather than O(posts).
+    """
+    cache = _context().engagement
+    variant = (group, bucket, since)
+    missing = [uid for uid in dict.fromkeys(user_ids) if (uid, variant) not in cache]
+    if missing:
+        rows = call_rpc(supabase, "engagement_stats", {
+            "p_user_ids": missing,
+            "p_group": group,
+            "p_bucket": bucket,
+            "p_since": since,
+        })
+        if rows is None:
+            frames = load_post_frames(supabase, missing)
+            grouped = {uid: frames[uid].since(since).group_by(group, bucket) for uid in missing}
+        else:
+            grouped = defaultdict(list)
+            for r in rows:
+                grouped[r["user_id"]].append({
+                    "key": r["group_key"],
+                    "post_count": r["post_count"],
+                    "total_engagement": r["total_engagement"],
+                })
+            # Postgres orders text by collation; match PostFrame.group_by's plain key order
+            for groups in grouped.values():
+                groups.sort(key=lambda g: g["key"] or "")
+        for uid in missing:
+            cache[(uid, variant)] = grouped.get(uid, [])
+    return {uid: cache[(uid, variant)] for uid in user_ids}
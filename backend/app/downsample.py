@@ -0,0 +1,48 @@
+import numpy as np
+
+from app.engine import SeriesFrame
+
+# ---------------------------------------------------------------------------
+# Follower series downsampling
+#
+# Bucketing normally happens in Postgres (see migrations/0003_follower_series_buckets.sql);
+# bucket_points mirrors it for rows that are already in memory. LTTB then
+# trims a bucketed series to a fixed point budget while keeping its peaks
+# and dips.
+# ---------------------------------------------------------------------------
+
+RESOLUTIONS = ("day", "week", "month")
+# Query-parameter pattern accepting exactly the resolutions above
+RESOLUTION_PATTERN = f"^({'|'.join(RESOLUTIONS)})$"
+
+
+def bucket_points(points, resolution: str):
+    """Keep the last follower count of each day/week/month; ``points`` must be oldest first."""
+    return SeriesFrame.from_points(points).bucket(resolution).points()
+
+
+def lttb(points, max_points: int):
+    """Largest-Triangle-Three-Buckets downsampling to at most ``max_points`` points."""
+    n = len(points)
+    if max_points is None or max_points < 3 or n <= max_points:
+        return points
+
+    x = np.asarray([p["date"] for p in points], dtype="datetime64[D]").astype(float)
+    y = np.asarray([p["followers"] for p in points], dtype=float)
+    every = (n - 2) / (max_points - 2)
+
+    selected = [0]
+    a = 0
+    for i in range(max_points - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[avg_start:avg_end].mean()
+        avg_y = y[avg_start:avg_end].mean()
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected.append(a)
+    selected.append(n - 1)
+    return [points[i] for i in selected]
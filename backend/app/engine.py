@@ -0,0 +1,201 @@
+from datetime import datetime, timezone
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# Columnar analytics engine
+#
+# Posts and follower snapshots are held as NumPy columns instead of lists of
+# row dicts: timestamps as datetime64, counts as int arrays and content
+# types dictionary-encoded as small integer codes. Group-bys, time buckets,
+# rolling windows and ranks are vectorized over those columns, and every
+# router computes from this one representation.
+# ---------------------------------------------------------------------------
+
+# 1970-01-01 was a Thursday; shifting by 3 makes Monday weekday 0
+_EPOCH_WEEKDAY_SHIFT = 3
+
+
+def parse_timestamp(value: str) -> datetime:
+    ts = datetime.fromisoformat(value)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def to_datetime64(values) -> np.ndarray:
+    """ISO-8601 strings to UTC ``datetime64[s]``.
+
+    Supabase returns UTC timestamps, which are sliced straight into NumPy;
+    anything with another offset goes through ``parse_timestamp``.
+    """
+    out = []
+    for v in values:
+        if len(v) <= 19 or v.endswith(("+00:00", "Z")):
+            out.append(v[:19])
+        else:
+            out.append(parse_timestamp(v).astimezone(timezone.utc).replace(tzinfo=None).isoformat()[:19])
+    return np.array(out, dtype="datetime64[s]")
+
+
+def bucket_days(days: np.ndarray, resolution: str) -> np.ndarray:
+    """First day of each value's day/week/month bucket, like Postgres date_trunc."""
+    days = days.astype("datetime64[D]")
+    if resolution == "week":
+        weekday = (days.astype(np.int64) + _EPOCH_WEEKDAY_SHIFT) % 7
+        return days - weekday.astype("timedelta64[D]")
+    if resolution == "month":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    return days
+
+
+def rolling_mean(values, window: int) -> np.ndarray:
+    """Mean of each value and the ``window - 1`` values before it."""
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return np.array([], dtype=np.float64)
+    sums = np.cumsum(values)
+    sums[window:] = sums[window:] - sums[:-window]
+    return sums / np.minimum(np.arange(1, len(values) + 1), window)
+
+
+def rank_desc(values) -> np.ndarray:
+    """1-based rank of each value, highest first; ties share the best rank."""
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return np.array([], dtype=np.int64)
+    return np.searchsorted(np.sort(-values), -values, side="left") + 1
+
+
+def _encode(values):
+    """Dictionary-encode ``values``: ``(codes, sorted distinct values)``."""
+    categories, codes = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    return codes.astype(np.int32), categories.tolist()
+
+
+def _group_stats(codes: np.ndarray, labels: list, engagement: np.ndarray) -> list:
+    counts = np.bincount(codes, minlength=len(labels))
+    totals = np.bincount(codes, weights=engagement, minlength=len(labels))
+    return [
+        {"key": label, "post_count": int(count), "total_engagement": int(total)}
+        for label, count, total in zip(labels, counts, totals)
+        if count
+    ]
+
+
+class PostFrame:
+    """One user's posts as columns, oldest first."""
+
+    __slots__ = ("posted_at", "engagement", "type_codes", "content_types")
+
+    def __init__(self, posted_at, engagement, type_codes, content_types):
+        self.posted_at = posted_at
+        self.engagement = engagement
+        self.type_codes = type_codes
+        self.content_types = content_types
+
+    @classmethod
+    def from_rows(cls, rows) -> "PostFrame":
+        if not rows:
+            return cls(
+                np.array([], dtype="datetime64[s]"), np.array([], dtype=np.int64),
+                np.array([], dtype=np.int32), [],
+            )
+        engagement = np.fromiter(
+            ((r["likes"] or 0) + (r["comments"] or 0) + (r["shares"] or 0) for r in rows),
+            dtype=np.int64, count=len(rows),
+        )
+        type_codes, content_types = _encode([r["content_type"] for r in rows])
+        return cls(to_datetime64([r["posted_at"] for r in rows]), engagement, type_codes, content_types)
+
+    def __len__(self):
+        return len(self.engagement)
+
+    def _take(self, mask) -> "PostFrame":
+        return PostFrame(self.posted_at[mask], self.engagement[mask], self.type_codes[mask], self.content_types)
+
+    def since(self, since) -> "PostFrame":
+        """Posts at or after ``since`` (ISO string or aware datetime)."""
+        if since is None:
+            return self
+        if isinstance(since, str):
+            since = parse_timestamp(since)
+        cutoff = np.datetime64(since.astimezone(timezone.utc).replace(tzinfo=None), "s")
+        return self._take(self.posted_at >= cutoff)
+
+    def group_by(self, group: str = "user", bucket: str = "month") -> list:
+        """``{"key", "post_count", "total_engagement"}`` per group, ordered by key.
+
+        ``group`` is ``"user"`` (one group, key None), ``"content_type"`` or
+        ``"time"`` (``bucket`` start days as YYYY-MM-DD).
+        """
+        if not len(self):
+            return []
+        if group == "content_type":
+            return _group_stats(self.type_codes, self.content_types, self.engagement)
+        if group == "time":
+            days, codes = np.unique(bucket_days(self.posted_at, bucket), return_inverse=True)
+            return _group_stats(codes, [str(d) for d in days], self.engagement)
+        return [{"key": None, "post_count": len(self), "total_engagement": int(self.engagement.sum())}]
+
+    def rolling_mean(self, window: int) -> np.ndarray:
+        """Mean engagement of each post and the ``window - 1`` posts before it."""
+        return rolling_mean(self.engagement, window)
+
+    def rank(self) -> np.ndarray:
+        """1-based engagement rank of each post (highest first; ties share the best rank)."""
+        return rank_desc(self.engagement)
+
+    def records(self, window: int = 7) -> list:
+        """``{"date", "engagement", "rolling_engagement", "content_type"}`` per post, oldest first.
+
+        ``rolling_engagement`` averages the post with the ``window - 1`` before it.
+        """
+        dates = self.posted_at.astype("datetime64[D]").astype(str)
+        types = self.content_types
+        rolling = np.round(self.rolling_mean(window), 1)
+        return [
+            {"date": d, "engagement": int(e), "rolling_engagement": r, "content_type": types[c]}
+            for d, e, r, c in zip(
+                dates.tolist(), self.engagement.tolist(), rolling.tolist(), self.type_codes.tolist()
+            )
+        ]
+
+
+class SeriesFrame:
+    """One user's follower snapshots as columns, oldest first."""
+
+    __slots__ = ("days", "followers")
+
+    def __init__(self, days, followers):
+        self.days = days
+        self.followers = followers
+
+    @classmethod
+    def from_rows(cls, rows) -> "SeriesFrame":
+        return cls(
+            to_datetime64([r["recorded_at"] for r in rows]).astype("datetime64[D]"),
+            np.array([r["follower_count"] for r in rows], dtype=np.int64),
+        )
+
+    @classmethod
+    def from_points(cls, points) -> "SeriesFrame":
+        return cls(
+            np.array([p["date"] for p in points], dtype="datetime64[D]"),
+            np.array([p["followers"] for p in points], dtype=np.int64),
+        )
+
+    def __len__(self):
+        return len(self.followers)
+
+    def bucket(self, resolution: str) -> "SeriesFrame":
+        """Last follower count of each day/week/month."""
+        if not len(self):
+            return self
+        keys = bucket_days(self.days, resolution)
+        # np.unique keeps the first occurrence, so search the reversed keys for the last one
+        starts, last_from_end = np.unique(keys[::-1], return_index=True)
+        return SeriesFrame(starts, self.followers[len(keys) - 1 - last_from_end])
+
+    def points(self) -> list:
+        return [
+            {"date": d, "followers": f}
+            for d, f in zip(self.days.astype(str).tolist(), self.followers.tolist())
+        ]
@@ -0,0 +1,95 @@
+import hashlib
+import time
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.cache import RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS, TTLCache, data_version
+
+# Path prefix -> whether responses depend only on the requested user's data
+ETAG_PREFIXES = {
+    "/analytics/": True,
+    "/competitors/": False,
+}
+ETAG_EXCLUDED_PATHS = {"/analytics/users"}
+
+# (path and query, data version, time bucket) -> tag of the body last served
+# for it, so a matching If-None-Match is answered before the handler runs
+_known_tags = TTLCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS)
+
+
+def _etag_scope(request: Request):
+    if request.method != "GET" or request.url.path in ETAG_EXCLUDED_PATHS:
+        return None
+    for prefix, per_user in ETAG_PREFIXES.items():
+        if request.url.path.startswith(prefix):
+            return per_user
+    return None
+
+
+def _version_key(request: Request, per_user: bool) -> tuple:
+    """Changes when this process writes the data in scope, and every RESPONSE_CACHE_TTL_SECONDS.
+
+    The time bucket keeps writes no version sees (other workers, the seeder)
+    and time-relative figures like posts this week at most as stale as the
+    response cache.
+    """
+    username = request.query_params.get("username", "my_brand")
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return (
+        f"{request.url.path}?{query}",
+        data_version(username if per_user else None),
+        int(time.time() // RESPONSE_CACHE_TTL_SECONDS),
+    )
+
+
+def compute_etag(body: bytes) -> str:
+    """Strong tag from the response body alone, so every worker and restart agrees on it."""
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates or "*" in candidates
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+async def etag_middleware(request: Request, call_next):
+    """Tag analytics/competitor GETs with a hash of the body and answer repeats with 304.
+
+    If this process already served the tag the client presents, and no write
+    or TTL bucket has passed since, the 304 goes out without running the
+    handler or touching the database. Otherwise the handler runs (usually a
+    response cache hit) and the body's tag is compared, so a tag from another
+    worker or an earlier process still saves the transfer.
+    """
+    per_user = _etag_scope(request)
+    if per_user is None:
+        return await call_next(request)
+
+    key = _version_key(request, per_user)
+    if_none_match = request.headers.get("if-none-match")
+    known = _known_tags.get(key)
+    if if_none_match and known and _matches(if_none_match, known):
+        return _not_modified(known)
+
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    etag = compute_etag(body)
+    _known_tags.set(key, etag)
+    if if_none_match and _matches(if_none_match, etag):
+        return _not_modified(etag)
+
+    headers = dict(response.headers)
+    headers["ETag"] = etag
+    headers["Cache-Control"] = "no-cache"
+    return Response(
+        content=body, status_code=200, headers=headers,
+        media_type=response.media_type, background=response.background,
+    )
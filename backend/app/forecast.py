@@ -0,0 +1,140 @@
+import numpy as np
+from statistics import NormalDist
+
+# ---------------------------------------------------------------------------
+# Vectorized follower forecasting
+#
+# Every series is padded into one (n_series, n_points) matrix with a validity
+# mask, so fitting the user plus hundreds of competitors is a handful of NumPy
+# reductions instead of a Python loop per point.
+# ---------------------------------------------------------------------------
+
+MODELS = ("linear", "robust", "seasonal")
+
+HUBER_K = 1.345
+ROBUST_ITERATIONS = 10
+
+
+def series_from_points(points):
+    """``(dates, values)`` from ``{"date", "followers"}`` chart points."""
+    return [p["date"] for p in points], [p["followers"] for p in points]
+
+
+def _pad(series):
+    """Stack ragged series into day offsets, values, a mask and each series' first day."""
+    width = max((len(values) for _, values in series), default=0) or 1
+    x = np.zeros((len(series), width))
+    y = np.zeros((len(series), width))
+    mask = np.zeros((len(series), width), dtype=bool)
+    origin = np.zeros(len(series), dtype=np.int64)
+    for i, (dates, values) in enumerate(series):
+        if not len(dates):
+            continue
+        days = np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+        origin[i] = days.min()
+        x[i, :len(days)] = days - origin[i]
+        y[i, :len(days)] = values
+        mask[i, :len(days)] = True
+    return x, y, mask, origin
+
+
+def _wls(x, y, w):
+    """Row-wise weighted least squares line fit."""
+    sw = w.sum(axis=1)
+    safe_sw = np.where(sw > 0, sw, 1.0)
+    x_mean = (w * x).sum(axis=1) / safe_sw
+    y_mean = (w * y).sum(axis=1) / safe_sw
+    dx = x - x_mean[:, None]
+    sxx = (w * dx * dx).sum(axis=1)
+    sxy = (w * dx * (y - y_mean[:, None])).sum(axis=1)
+    slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=sxx > 0)
+    intercept = y_mean - slope * x_mean
+    return slope, intercept, x_mean, sxx
+
+
+def _weekday(origin, x):
+    # 1970-01-01 was a Thursday; shift so Monday is 0
+    return (origin[:, None] + x.astype(np.int64) + 3) % 7
+
+
+def forecast_series(series, horizon_days: int = 28, step_days: int = 7, model: str = "linear", level: float = 0.95):
+    """Fit every series at once and project ``horizon_days`` ahead.
+
+    ``series`` is a list of ``(dates, values)`` pairs. ``model`` is one of
+    ``linear`` (OLS), ``robust`` (Huber IRLS, resistant to one-off spikes) or
+    ``seasonal`` (linear trend plus a day-of-week effect). Returns one dict per
+    series with the daily slope and forecast points carrying ``lower``/``upper``
+    prediction bounds at ``level`` confidence. Series with fewer than two
+    points get no forecast.
+    """
+    if model not in MODELS:
+        raise ValueError(f"Unknown forecast model {model!r}, expected one of {MODELS}")
+    if not series:
+        return []
+
+    x, y, mask, origin = _pad(series)
+    w = mask.astype(float)
+    slope, intercept, x_mean, sxx = _wls(x, y, w)
+
+    if model == "robust":
+        empty = ~mask.any(axis=1)
+        for _ in range(ROBUST_ITERATIONS):
+            resid = y - (intercept[:, None] + slope[:, None] * x)
+            abs_resid = np.where(mask, np.abs(resid), np.nan)
+            abs_resid[empty] = 0.0
+            scale = 1.4826 * np.nanmedian(abs_resid, axis=1)
+            scale = np.where(scale > 0, scale, 1.0)
+            u = np.abs(resid) / (HUBER_K * scale[:, None])
+            w = np.where(mask, np.minimum(1.0, 1.0 / np.maximum(u, 1e-12)), 0.0)
+            slope, intercept, x_mean, sxx = _wls(x, y, w)
+
+    resid = np.where(mask, y - (intercept[:, None] + slope[:, None] * x), 0.0)
+    params = 2
+    season = np.zeros((len(series), 7))
+    if model == "seasonal":
+        onehot = (_weekday(origin, x)[..., None] == np.arange(7)) & mask[..., None]
+        counts = onehot.sum(axis=1)
+        season = np.divide((resid[..., None] * onehot).sum(axis=1), counts, out=np.zeros((len(series), 7)), where=counts > 0)
+        # Centre the weekday effects so they don't shift the trend level
+        seen = counts > 0
+        season -= np.where(seen, season, 0).sum(axis=1, keepdims=True) / np.maximum(seen.sum(axis=1, keepdims=True), 1)
+        season = np.where(seen, season, 0.0)
+        resid = np.where(mask, resid - np.take_along_axis(season, _weekday(origin, x), axis=1), 0.0)
+        params += 6
+
+    n = mask.sum(axis=1)
+    dof = np.maximum(w.sum(axis=1) - params, 1)
+    sigma = np.sqrt((w * resid * resid).sum(axis=1) / dof)
+    z = NormalDist().inv_cdf((1 + level) / 2)
+
+    steps = np.arange(1, max(horizon_days // step_days, 1) + 1) * step_days
+    last_x = np.where(mask, x, 0).max(axis=1)
+    future_x = last_x[:, None] + steps[None, :]
+    predicted = intercept[:, None] + slope[:, None] * future_x
+    predicted += np.take_along_axis(season, _weekday(origin, future_x), axis=1)
+    safe_sxx = np.where(sxx > 0, sxx, np.inf)
+    spread = z * sigma[:, None] * np.sqrt(1 + 1 / np.maximum(n, 1)[:, None] + (future_x - x_mean[:, None]) ** 2 / safe_sxx[:, None])
+
+    future_dates = (origin[:, None] + future_x.astype(np.int64)).astype("datetime64[D]")
+    lower = np.maximum(predicted - spread, 0).round()
+    upper = np.maximum(predicted + spread, 0).round()
+    predicted = np.maximum(predicted, 0).round()
+
+    results = []
+    for i in range(len(series)):
+        if n[i] < 2:
+            results.append({"slope_per_day": 0.0, "points": []})
+            continue
+        results.append({
+            "slope_per_day": round(float(slope[i]), 2),
+            "points": [
+                {
+                    "date": str(future_dates[i, k]),
+                    "followers": int(predicted[i, k]),
+                    "lower": int(lower[i, k]),
+                    "upper": int(upper[i, k]),
+                }
+                for k in range(len(steps))
+            ],
+        })
+    return results
@@ -0,0 +1,332 @@
+"""Durable Apify history backfills.
+
+Each backfill is a row in a local SQLite job table, so it survives restarts.
+A single async poller started from the lifespan drives every active job on
+the event loop: it starts queued Apify runs, polls running ones over one
+shared HTTP client, and stores the follower history once a run succeeds.
+Jobs still queued or running when the process stops are picked up again on
+the next start.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from postgrest.types import CountMethod, ReturnMethod
+
+from app.cache import bump_data_version
+from app.database import get_supabase_client, is_transient_error, retry_on_disconnect
+from app.metrics import AsyncTimedTransport
+
+logger = logging.getLogger(__name__)
+
+APIFY_API_TOKEN = os.getenv("APIFY_API_TOKEN")
+APIFY_ACTOR = "radeance~socialblade-api"
+APIFY_JOBS_DB_PATH = os.getenv(
+    "APIFY_JOBS_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "jobs.sqlite3"),
+)
+APIFY_POLL_SECONDS = float(os.getenv("APIFY_POLL_SECONDS", "5"))
+# follower_metrics rows sent per history upsert request
+HISTORY_UPSERT_BATCH_SIZE = int(os.getenv("HISTORY_UPSERT_BATCH_SIZE", "500"))
+# Dataset items fetched per request when ingesting a finished run
+APIFY_DATASET_PAGE_SIZE = int(os.getenv("APIFY_DATASET_PAGE_SIZE", "100"))
+# Give up on a run this poller has been driving for this long without it
+# finishing; time the process was down does not count
+APIFY_JOB_TIMEOUT_SECONDS = float(os.getenv("APIFY_JOB_TIMEOUT_SECONDS", "600"))
+
+ACTIVE_STATUSES = ("queued", "running")
+FAILED_RUN_STATUSES = ("FAILED", "ABORTED", "TIMED-OUT")
+
+_COLUMNS = (
+    "id", "user_id", "username", "status", "run_id", "dataset_id",
+    "polls", "rows_inserted", "error", "created_at", "updated_at",
+)
+
+
+class JobStore:
+    """SQLite-backed job table; safe to share between threads."""
+
+    clock = time.time
+
+    def __init__(self, path: str = APIFY_JOBS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(
+                "create table if not exists apify_jobs ("
+                " id text primary key,"
+                " user_id text not null,"
+                " username text not null,"
+                " status text not null,"
+                " run_id text,"
+                " dataset_id text,"
+                " polls integer not null default 0,"
+                " rows_inserted integer,"
+                " error text,"
+                " created_at real not null,"
+                " updated_at real not null)"
+            )
+            self._conn.execute("create index if not exists apify_jobs_status_idx on apify_jobs (status)")
+
+    def create(self, user_id: str, username: str) -> dict:
+        """Queue a backfill, reusing the account's job if one is already active."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"select * from apify_jobs where username = ? and status in {ACTIVE_STATUSES}"
+                " order by created_at desc limit 1",
+                (username,),
+            ).fetchone()
+            if row:
+                return dict(row)
+            now = self.clock()
+            job_id = uuid.uuid4().hex
+            self._conn.execute(
+                "insert into apify_jobs (id, user_id, username, status, created_at, updated_at)"
+                " values (?, ?, ?, 'queued', ?, ?)",
+                (job_id, user_id, username, now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("select * from apify_jobs where id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def active(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                f"select * from apify_jobs where status in {ACTIVE_STATUSES} order by created_at"
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def update(self, job_id: str, **fields):
+        unknown = set(fields) - set(_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+        fields["updated_at"] = self.clock()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"update apify_jobs set {assignments} where id = ?", (*fields.values(), job_id))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = JobStore()
+        return _store
+
+
+def submit_history_job(user_id: str, username: str) -> dict:
+    """Queue an Apify history backfill; the poller starts it within a tick."""
+    job = get_job_store().create(user_id, username)
+    logger.info(f"[Apify] Job {job['id']} {job['status']} for {username}")
+    return job
+
+
+# ---------------------------------------------------------------------------
+# Apify dataset -> follower_metrics rows
+# ---------------------------------------------------------------------------
+
+def history_rows(items, user_id: str, username: str):
+    """Yield a follower_metrics row per usable ``daily_growth`` entry."""
+    # The actor returns one item per creator.
+    # Daily history is nested in daily_growth: [{date, subscribers}, ...]
+    for item in items:
+        daily = item.get("daily_growth") or []
+        if not daily:
+            logger.warning(f"[Apify] No daily_growth in item for {username}")
+            logger.info(f"[Apify] Item keys available: {list(item.keys())}")
+            continue
+        logger.info(f"[Apify] Found {len(daily)} daily_growth entries for {username}")
+        for entry in daily:
+            date_str = entry.get("date") or entry.get("day") or entry.get("Date")
+            followers = (
+                entry.get("subscribers") or entry.get("followers")
+                or entry.get("followerCount") or entry.get("followed_by")
+            )
+            if not date_str or followers is None:
+                continue
+            date_str = str(date_str)[:10]
+            yield {"user_id": user_id, "follower_count": int(followers), "recorded_at": date_str}
+
+
+def _history_batches(rows, size: int = HISTORY_UPSERT_BATCH_SIZE):
+    """Group rows into batches of up to ``size`` distinct days."""
+    batch = {}
+    for row in rows:
+        batch[row["recorded_at"]] = row
+        if len(batch) >= size:
+            yield list(batch.values())
+            batch = {}
+    if batch:
+        yield list(batch.values())
+
+
+@retry_on_disconnect()
+def _insert_history_batch(batch: list) -> int:
+    # Days that already have a snapshot are left alone (ON CONFLICT DO NOTHING)
+    res = get_supabase_client().table("follower_metrics").upsert(
+        batch,
+        on_conflict="user_id,recorded_day",
+        ignore_duplicates=True,
+        returning=ReturnMethod.minimal,
+        count=CountMethod.exact,
+    ).execute()
+    return res.count or 0
+
+
+def store_history(user_id: str, username: str, rows) -> int:
+    """Upsert history in bounded batches; returns the number of new days.
+
+    Postgres skips days that are already recorded, so the cost depends on
+    the size of the backfill, not on how much history the user already has.
+    """
+    inserted = 0
+    total = 0
+    for batch in _history_batches(rows):
+        total += len(batch)
+        inserted += _insert_history_batch(batch)
+    logger.info(f"[Apify] Inserted {inserted} new rows for {username} ({total - inserted} already existed)")
+    if inserted:
+        bump_data_version(username)
+    return inserted
+
+
+# ---------------------------------------------------------------------------
+# Async poller
+# ---------------------------------------------------------------------------
+
+class ApifyPoller:
+    def __init__(self, store: JobStore, poll_seconds: float = APIFY_POLL_SECONDS,
+                 timeout_seconds: float = APIFY_JOB_TIMEOUT_SECONDS, page_size: int = APIFY_DATASET_PAGE_SIZE):
+        self.store = store
+        self.page_size = page_size
+        self.poll_seconds = poll_seconds
+        self.timeout_seconds = timeout_seconds
+        # job id -> when this poller first saw it, so jobs resumed after a
+        # restart get the full timeout again
+        self._picked_up = {}
+
+    async def _update(self, job_id: str, **fields):
+        # SQLite writes go to the threadpool so they never stall the event loop
+        await run_in_threadpool(self.store.update, job_id, **fields)
+
+    async def _start_run(self, client: httpx.AsyncClient, job: dict):
+        payload = {
+            "creators": [job["username"]],
+            "platform": "instagram",
+            "proxySettings": {
+                "useApifyProxy": True,
+                "apifyProxyGroups": ["RESIDENTIAL"],
+                "apifyProxyCountry": "US"
+            }
+        }
+        logger.info(f"[Apify] Starting historical fetch for {job['username']}")
+        resp = await client.post(
+            f"https://api.apify.com/v2/acts/{APIFY_ACTOR}/runs",
+            json=payload,
+        )
+        resp.raise_for_status()
+        run_id = resp.json()["data"]["id"]
+        await self._update(job["id"], status="running", run_id=run_id)
+        logger.info(f"[Apify] Run started: {run_id}")
+
+    async def _poll_run(self, client: httpx.AsyncClient, job: dict):
+        resp = await client.get(
+            f"https://api.apify.com/v2/actor-runs/{job['run_id']}",
+        )
+        resp.raise_for_status()
+        data = resp.json()["data"]
+        status = data["status"]
+        polls = job["polls"] + 1
+        logger.info(f"[Apify] Poll {polls} for {job['username']} — status: {status}")
+
+        if status in FAILED_RUN_STATUSES:
+            await self._update(job["id"], status="failed", polls=polls, error=f"Apify run ended with status {status}")
+            return
+        if status != "SUCCEEDED":
+            await self._update(job["id"], polls=polls)
+            return
+
+        dataset_id = data["defaultDatasetId"]
+        await self._update(job["id"], polls=polls, dataset_id=dataset_id)
+        inserted = await self._ingest_dataset(client, job, dataset_id)
+        await self._update(job["id"], status="succeeded", rows_inserted=inserted)
+        logger.info(f"[Apify] Done — inserted {inserted} rows for {job['username']}")
+
+    async def _ingest_dataset(self, client: httpx.AsyncClient, job: dict, dataset_id: str) -> int:
+        """Store the dataset page by page, so only one page is held in memory."""
+        inserted = 0
+        offset = 0
+        while True:
+            resp = await client.get(
+                f"https://api.apify.com/v2/datasets/{dataset_id}/items",
+                params={"offset": offset, "limit": self.page_size, "clean": "true"},
+            )
+            resp.raise_for_status()
+            items = resp.json()
+            logger.info(f"[Apify] Fetched {len(items)} items at offset {offset} for {job['username']}")
+            if items:
+                rows = history_rows(items, job["user_id"], job["username"])
+                inserted += await run_in_threadpool(store_history, job["user_id"], job["username"], rows)
+            if len(items) < self.page_size:
+                return inserted
+            offset += len(items)
+
+    async def _advance(self, client: httpx.AsyncClient, job: dict):
+        try:
+            picked_up = self._picked_up.setdefault(job["id"], self.store.clock())
+            if self.store.clock() - picked_up > self.timeout_seconds:
+                await self._update(job["id"], status="failed", error="Timed out waiting for the Apify run")
+                logger.error(f"[Apify] Job {job['id']} for {job['username']} timed out")
+            elif job["run_id"] is None:
+                await self._start_run(client, job)
+            else:
+                await self._poll_run(client, job)
+        except Exception as e:
+            if is_transient_error(e) or (
+                isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429
+            ):
+                # Try again on the next tick; the job timeout still applies
+                logger.warning(f"[Apify] Job {job['id']} for {job['username']} will retry: {e}")
+                return
+            logger.error(f"[Apify] Job {job['id']} failed for {job['username']}: {e}")
+            await self._update(job["id"], status="failed", error=str(e)[:500])
+
+    async def run_once(self, client: httpx.AsyncClient):
+        """Advance every active job concurrently."""
+        jobs = await run_in_threadpool(self.store.active)
+        active_ids = {job["id"] for job in jobs}
+        for job_id in list(self._picked_up):
+            if job_id not in active_ids:
+                del self._picked_up[job_id]
+        if jobs:
+            await asyncio.gather(*(self._advance(client, job) for job in jobs))
+
+    async def run(self):
+        resumed = len(await run_in_threadpool(self.store.active))
+        if resumed:
+            logger.info(f"[Apify] Resuming {resumed} job(s)")
+        headers = {"Authorization": f"Bearer {APIFY_API_TOKEN}"} if APIFY_API_TOKEN else {}
+        async with httpx.AsyncClient(timeout=30, headers=headers, transport=AsyncTimedTransport("apify")) as client:
+            while True:
+                await self.run_once(client)
+                await asyncio.sleep(self.poll_seconds)
+
+
+def start_job_poller():
+    """Start the background poller; returns its task."""
+    return asyncio.create_task(ApifyPoller(get_job_store()).run())
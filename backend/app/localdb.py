@@ -0,0 +1,421 @@
+"""Embedded SQLite stand-in for the Supabase client.
+
+Implements the part of the supabase-py / postgrest query builder the app
+uses: ``table(...)`` with ``select / insert / upsert / update / delete``,
+the ``eq / neq / gt / gte / lt / lte / in_`` filters, ``order``, ``limit``
+and ``range``, ``count`` (with ``head``) and upserts with ``on_conflict`` /
+``ignore_duplicates``, returning responses with the same ``.data`` /
+``.count`` shape. tests/test_localdb.py checks each against PostgREST.
+Timestamps are stored as UTC ISO-8601 text, so they sort and compare like
+Postgres ``timestamptz`` and come back in the same format.
+
+``rpc`` always fails with PostgREST's "function not found" error, which
+makes the datasets loaders compute grouped stats in Python instead.
+
+Selected with DATABASE_BACKEND=local; the file lives at LOCAL_DATABASE_PATH.
+"""
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from postgrest import APIError
+from postgrest.types import CountMethod, ReturnMethod
+
+from app.engine import parse_timestamp
+from app.metrics import record_db_query
+
+# Mirrors migrations/0001_schema.sql and 0002_indexes.sql
+SCHEMA = """
+create table if not exists users (
+    id text primary key,
+    username text not null,
+    platform text not null default 'Instagram',
+    instagram_id text,
+    last_synced_at text,
+    created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+create unique index if not exists users_username_key on users (username);
+
+create table if not exists follower_metrics (
+    id text primary key,
+    user_id text not null references users (id) on delete cascade,
+    follower_count integer not null,
+    recorded_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    recorded_day text generated always as (substr(recorded_at, 1, 10)) stored
+);
+create unique index if not exists follower_metrics_user_day_key on follower_metrics (user_id, recorded_day);
+create index if not exists follower_metrics_user_recorded_at_idx on follower_metrics (user_id, recorded_at);
+
+create table if not exists posts (
+    id text primary key,
+    user_id text not null references users (id) on delete cascade,
+    platform_post_id text,
+    content_type text not null default 'Post',
+    likes integer not null default 0,
+    comments integer not null default 0,
+    shares integer not null default 0,
+    posted_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+create unique index if not exists posts_platform_post_id_key on posts (platform_post_id);
+create index if not exists posts_user_posted_at_idx on posts (user_id, posted_at);
+
+create table if not exists competitors (
+    id text primary key,
+    owner_id text not null references users (id) on delete cascade,
+    username text not null,
+    platform text not null default 'Instagram',
+    created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+create unique index if not exists competitors_owner_username_key on competitors (owner_id, username);
+
+create table if not exists competitor_metrics (
+    id text primary key,
+    competitor_id text not null references competitors (id) on delete cascade,
+    follower_count integer,
+    avg_likes integer,
+    avg_comments integer,
+    avg_shares integer,
+    top_content_type text,
+    recorded_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+create index if not exists competitor_metrics_competitor_recorded_at_idx
+    on competitor_metrics (competitor_id, recorded_at);
+"""
+
+TIMESTAMP_COLUMNS = {"created_at", "last_synced_at", "recorded_at", "posted_at"}
+
+_OPERATORS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+class LocalResponse:
+    """``.data`` and ``.count`` like postgrest's APIResponse, without its per-row validation."""
+
+    __slots__ = ("data", "count")
+
+    def __init__(self, data: list, count: int = None):
+        self.data = data
+        self.count = count
+
+
+def _error(code: str, message: str) -> APIError:
+    return APIError({"code": code, "message": message, "details": None, "hint": None})
+
+
+def _to_db(column: str, value):
+    """Store timestamps as UTC ISO text; everything else as is."""
+    if column in TIMESTAMP_COLUMNS and value is not None:
+        ts = value if isinstance(value, datetime) else parse_timestamp(str(value))
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        return ts.astimezone(timezone.utc).isoformat()
+    return value
+
+
+class LocalQuery:
+    """One ``table(...)`` call: an action, filters and modifiers, run by ``execute``."""
+
+    def __init__(self, client: "LocalClient", table: str):
+        self._client = client
+        self._table = table
+        self._action = "select"
+        self._columns = "*"
+        self._payload = None
+        self._on_conflict = ""
+        self._ignore_duplicates = False
+        self._returning = ReturnMethod.representation
+        self._count = None
+        self._head = False
+        self._filters = []
+        self._order = []
+        self._limit = None
+        self._offset = 0
+
+    # -- actions ------------------------------------------------------------
+
+    def select(self, *columns, count: CountMethod = None, head: bool = None):
+        self._action = "select"
+        self._columns = ",".join(columns) or "*"
+        self._count = count
+        self._head = bool(head)
+        return self
+
+    def insert(self, json, *, count: CountMethod = None, returning: ReturnMethod = ReturnMethod.representation,
+               upsert: bool = False, default_to_null: bool = True):
+        self._action = "upsert" if upsert else "insert"
+        self._payload = json if isinstance(json, list) else [json]
+        self._count = count
+        self._returning = returning
+        return self
+
+    def upsert(self, json, *, count: CountMethod = None, returning: ReturnMethod = ReturnMethod.representation,
+               ignore_duplicates: bool = False, on_conflict: str = "", default_to_null: bool = True):
+        self.insert(json, count=count, returning=returning, upsert=True)
+        self._on_conflict = on_conflict
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, json: dict, *, count: CountMethod = None, returning: ReturnMethod = ReturnMethod.representation):
+        self._action = "update"
+        self._payload = json
+        self._count = count
+        self._returning = returning
+        return self
+
+    def delete(self, *, count: CountMethod = None, returning: ReturnMethod = ReturnMethod.representation):
+        self._action = "delete"
+        self._count = count
+        self._returning = returning
+        return self
+
+    # -- filters and modifiers ----------------------------------------------
+
+    def _filter(self, op: str, column: str, value):
+        self._filters.append((op, column, value))
+        return self
+
+    def eq(self, column: str, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column: str, value):
+        return self._filter("neq", column, value)
+
+    def gt(self, column: str, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column: str, value):
+        return self._filter("gte", column, value)
+
+    def lt(self, column: str, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column: str, value):
+        return self._filter("lte", column, value)
+
+    def in_(self, column: str, values):
+        return self._filter("in", column, list(values))
+
+    def order(self, column: str, *, desc: bool = False, nullsfirst: bool = None):
+        self._order.append((column, desc, desc if nullsfirst is None else nullsfirst))
+        return self
+
+    def limit(self, size: int):
+        self._limit = int(size)
+        return self
+
+    def range(self, start: int, end: int):
+        """Rows ``start`` to ``end`` inclusive, like PostgREST's offset/limit pair."""
+        self._offset = int(start)
+        self._limit = int(end) - int(start) + 1
+        return self
+
+    # -- SQL ----------------------------------------------------------------
+
+    def _column(self, name: str) -> str:
+        name = name.strip()
+        if name not in self._client.columns(self._table):
+            raise _error("42703", f'column {self._table}.{name} does not exist')
+        return f'"{name}"'
+
+    def _where(self):
+        clauses, params = [], []
+        for op, column, value in self._filters:
+            col = self._column(column)
+            if op == "in":
+                if not value:
+                    clauses.append("0")
+                    continue
+                clauses.append(f"{col} in ({', '.join('?' * len(value))})")
+                params.extend(_to_db(column, v) for v in value)
+            elif value is None and op in ("eq", "neq"):
+                clauses.append(f"{col} is {'not ' if op == 'neq' else ''}null")
+            else:
+                clauses.append(f"{col} {_OPERATORS[op]} ?")
+                params.append(_to_db(column, value))
+        return (" where " + " and ".join(clauses) if clauses else ""), params
+
+    def _select_list(self) -> str:
+        columns = [c for c in self._columns.split(",") if c.strip()]
+        if not columns or any(c.strip() == "*" for c in columns):
+            return ", ".join(f'"{c}"' for c in self._client.columns(self._table))
+        return ", ".join(self._column(c) for c in columns)
+
+    def _run_select(self, conn):
+        where, params = self._where()
+        sql = f'select {self._select_list()} from "{self._table}"{where}'
+        if self._order:
+            sql += " order by " + ", ".join(
+                f"{self._column(c)} {'desc' if desc else 'asc'} nulls {'first' if nulls_first else 'last'}"
+                for c, desc, nulls_first in self._order
+            )
+        if self._limit is not None or self._offset:
+            sql += f" limit {-1 if self._limit is None else self._limit} offset {self._offset}"
+        # A HEAD request returns only the count
+        rows = [] if self._head else [dict(r) for r in conn.execute(sql, params)]
+        count = None
+        if self._count:
+            count = conn.execute(f'select count(*) from "{self._table}"{where}', params).fetchone()[0]
+        return rows, count
+
+    def _run_insert(self, conn):
+        table_columns = self._client.columns(self._table)
+        provided = list(dict.fromkeys(k for row in self._payload for k in row))
+        for name in provided:
+            self._column(name)
+        columns = provided if "id" in provided else ["id"] + provided
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        sql = f'insert into "{self._table}" ({column_list}) values ({", ".join("?" * len(columns))})'
+        if self._action == "upsert":
+            target = [c.strip() for c in self._on_conflict.split(",") if c.strip()] or ["id"]
+            conflict = ", ".join(self._column(c) for c in target)
+            updates = [c for c in provided if c not in target]
+            if self._ignore_duplicates or not updates:
+                sql += f" on conflict ({conflict}) do nothing"
+            else:
+                sql += f" on conflict ({conflict}) do update set " + ", ".join(
+                    f'"{c}" = excluded."{c}"' for c in updates
+                )
+        params = [
+            [row.get("id") or str(uuid.uuid4()) if c == "id" else _to_db(c, row.get(c)) for c in columns]
+            for row in self._payload
+        ]
+        if self._returning == ReturnMethod.minimal:
+            before = conn.total_changes
+            conn.executemany(sql, params)
+            return [], conn.total_changes - before
+
+        sql += " returning " + ", ".join(f'"{c}"' for c in table_columns)
+        rows = []
+        for values in params:
+            rows.extend(dict(r) for r in conn.execute(sql, values))
+        return rows, len(rows)
+
+    def _run_write(self, conn):
+        where, params = self._where()
+        returning = " returning " + ", ".join(f'"{c}"' for c in self._client.columns(self._table))
+        if self._action == "update":
+            assignments = ", ".join(f"{self._column(c)} = ?" for c in self._payload)
+            values = [_to_db(c, v) for c, v in self._payload.items()]
+            sql = f'update "{self._table}" set {assignments}{where}{returning}'
+            params = values + params
+        else:
+            sql = f'delete from "{self._table}"{where}{returning}'
+        rows = [dict(r) for r in conn.execute(sql, params)]
+        return rows, len(rows)
+
+    def execute(self) -> LocalResponse:
+        runner = {
+            "select": self._run_select,
+            "insert": self._run_insert,
+            "upsert": self._run_insert,
+            "update": self._run_write,
+            "delete": self._run_write,
+        }[self._action]
+        rows, count = self._client.run(runner)
+        if self._action != "select":
+            if self._returning == ReturnMethod.minimal:
+                rows = []
+            count = count if self._count else None
+        return LocalResponse(rows, count)
+
+
+class _MissingRpc:
+    def __init__(self, name: str):
+        self.name = name
+
+    def range(self, start: int, end: int):
+        return self
+
+    def execute(self):
+        raise _error("PGRST202", f"Could not find the function public.{self.name} in the schema cache")
+
+
+class LocalClient:
+    """Thread-safe SQLite database exposing ``table`` and ``rpc`` like a Supabase client."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("pragma foreign_keys = on")
+        if path != ":memory:":
+            self._conn.execute("pragma journal_mode = wal")
+            self._conn.execute("pragma synchronous = normal")
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+        self._columns = {}
+        # Statements executed, for benchmarks and tests
+        self.queries = 0
+        # No response cap, unlike PostgREST's max-rows, so loaders skip paging
+        self.max_rows = None
+
+    def columns(self, table: str) -> list:
+        if table not in self._columns:
+            with self._lock:
+                rows = self._conn.execute(f'pragma table_xinfo("{table}")').fetchall()
+            if not rows:
+                raise _error("42P01", f'relation "public.{table}" does not exist')
+            self._columns[table] = [r["name"] for r in rows]
+        return self._columns[table]
+
+    def run(self, fn):
+        """Run ``fn(connection)`` in one transaction; constraint errors surface as PostgREST errors."""
+        started = time.perf_counter()
+        try:
+            with self._lock:
+                self.queries += 1
+                with self._conn:
+                    return fn(self._conn)
+        except sqlite3.IntegrityError as e:
+            message = str(e)
+            if "UNIQUE" in message:
+                raise _error("23505", f"duplicate key value violates unique constraint: {message}") from e
+            if "FOREIGN KEY" in message:
+                raise _error("23503", f"insert or update violates foreign key constraint: {message}") from e
+            raise _error("23502", message) from e
+        except sqlite3.OperationalError as e:
+            if "ON CONFLICT clause does not match" in str(e):
+                raise _error("42P10", "there is no unique or exclusion constraint matching the ON CONFLICT specification") from e
+            raise
+        finally:
+            # Includes waiting for the lock, which is what the caller experiences
+            record_db_query("local", time.perf_counter() - started)
+
+    def table(self, name: str) -> LocalQuery:
+        return LocalQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: dict = None) -> _MissingRpc:
+        return _MissingRpc(name)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LocalClientPool:
+    """Pool interface over one shared ``LocalClient``."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self) -> LocalClient:
+        with self._lock:
+            if self._client is None:
+                self._client = LocalClient(self.path)
+            return self._client
+
+    def discard(self, client):
+        # An embedded database has no connection to lose
+        pass
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
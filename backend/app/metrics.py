@@ -0,0 +1,357 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+import httpx
+from fastapi import Request
+
+# Upper bounds in seconds; +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels[name] for name in self.label_names)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts (not cumulative), then sum
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics plus callbacks that report values owned by other modules at scrape time.
+
+    A collector returns ``(name, kind, help, samples)`` tuples where samples is
+    a list of ``(labels_dict, value)``.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def gauge(self, name: str, help_text: str, labels=()) -> Gauge:
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Everything in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for name, kind, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    "gapsight_http_request_duration_seconds", "Time to produce a response, by route.", ("method", "route", "status"),
+)
+requests_in_flight = registry.gauge(
+    "gapsight_http_requests_in_flight", "Requests currently being handled.", ("method",),
+)
+request_db_queries = registry.histogram(
+    "gapsight_http_request_db_queries", "Database queries issued per request, by route.", ("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+request_db_seconds = registry.histogram(
+    "gapsight_http_request_db_seconds", "Time spent in database queries per request, by route.", ("method", "route"),
+)
+db_query_duration = registry.histogram(
+    "gapsight_db_query_duration_seconds", "Latency of single database queries.", ("backend",),
+)
+external_duration = registry.histogram(
+    "gapsight_external_request_duration_seconds",
+    "Latency of calls to external APIs; outcome is the status class or 'error' for transport failures.",
+    ("service", "outcome"),
+)
+
+
+# ---------------------------------------------------------------------------
+# Per-request accounting, read back into histograms and Server-Timing
+# ---------------------------------------------------------------------------
+
+class RequestStats:
+    """Time a request spent waiting on the database and external APIs.
+
+    Handlers run in worker threads that share this object through the
+    context, so updates take a lock.
+    """
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.external = {}
+        self._lock = threading.Lock()
+
+    def add_query(self, seconds: float):
+        with self._lock:
+            self.db_queries += 1
+            self.db_seconds += seconds
+
+    def add_external(self, service: str, seconds: float):
+        with self._lock:
+            count, total = self.external.get(service, (0, 0.0))
+            self.external[service] = (count + 1, total + seconds)
+
+
+_request_stats: ContextVar = ContextVar("request_stats", default=None)
+
+
+def record_db_query(backend: str, seconds: float):
+    db_query_duration.observe(seconds, backend=backend)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add_query(seconds)
+
+
+def record_external_call(service: str, outcome: str, seconds: float):
+    external_duration.observe(seconds, service=service, outcome=outcome)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add_external(service, seconds)
+
+
+# ---------------------------------------------------------------------------
+# httpx transports that time every call, including reading the body
+# ---------------------------------------------------------------------------
+
+def _outcome(status_code: int) -> str:
+    return f"{status_code // 100}xx"
+
+
+class _TimedStream(httpx.SyncByteStream):
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._on_close()
+
+
+class _AsyncTimedStream(httpx.AsyncByteStream):
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._on_close()
+
+
+class _CallTimer:
+    def __init__(self, service: str, record):
+        self.service = service
+        self.record = record
+        self.started = time.perf_counter()
+        self.outcome = "error"
+        self._done = False
+
+    def finish(self):
+        if not self._done:
+            self._done = True
+            self.record(self.service, self.outcome, time.perf_counter() - self.started)
+
+
+def _record_database_call(service: str, outcome: str, seconds: float):
+    record_db_query(service, seconds)
+
+
+class TimedTransport(httpx.BaseTransport):
+    """Wraps a transport and records each call from request to fully read response.
+
+    With ``database=True`` calls count as database queries of the current
+    request instead of external API calls.
+    """
+
+    def __init__(self, service: str, transport: httpx.BaseTransport = None, database: bool = False):
+        self.service = service
+        self._transport = transport or httpx.HTTPTransport()
+        self._record = _record_database_call if database else record_external_call
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        timer = _CallTimer(self.service, self._record)
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException:
+            timer.finish()
+            raise
+        timer.outcome = _outcome(response.status_code)
+        response.stream = _TimedStream(response.stream, timer.finish)
+        return response
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncTimedTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of ``TimedTransport`` for external APIs."""
+
+    def __init__(self, service: str, transport: httpx.AsyncBaseTransport = None):
+        self.service = service
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        timer = _CallTimer(self.service, record_external_call)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            timer.finish()
+            raise
+        timer.outcome = _outcome(response.status_code)
+        response.stream = _AsyncTimedStream(response.stream, timer.finish)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------------
+
+def _route_template(request: Request) -> str:
+    # Label by path template, not the raw path, so usernames don't explode
+    # cardinality. Routing stores the matched route in the shared scope;
+    # 404s and ETag 304s are answered without reaching it.
+    route = request.scope.get("route")
+    return getattr(route, "path", "unrouted")
+
+
+def _server_timing(total: float, stats: RequestStats) -> str:
+    parts = [f"total;dur={total * 1000:.1f}"]
+    if stats.db_queries:
+        parts.append(f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.db_queries} queries"')
+    for service, (count, seconds) in sorted(stats.external.items()):
+        parts.append(f'{service};dur={seconds * 1000:.1f};desc="{count} calls"')
+    return ", ".join(parts)
+
+
+async def metrics_middleware(request: Request, call_next):
+    """Record latency, in-flight count and database/API time per route.
+
+    The same numbers go out in a ``Server-Timing`` header so browser dev
+    tools show where a slow request spent its time. Database and API times
+    are summed across concurrent calls, so they can exceed the total.
+    """
+    method = request.method
+    stats = RequestStats()
+    token = _request_stats.set(stats)
+    requests_in_flight.inc(method=method)
+    started = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        status = str(response.status_code)
+        response.headers["Server-Timing"] = _server_timing(time.perf_counter() - started, stats)
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        route = _route_template(request)
+        requests_in_flight.dec(method=method)
+        request_duration.observe(elapsed, method=method, route=route, status=status)
+        request_db_queries.observe(stats.db_queries, method=method, route=route)
+        request_db_seconds.observe(stats.db_seconds, method=method, route=route)
+        _request_stats.reset(token)
@@ -0,0 +1,174 @@
+"""Apply the SQL files in backend/migrations in order and check index usage.
+
+    python app/migrate.py          apply pending migrations
+    python app/migrate.py --list   show applied / pending migrations
+    python app/migrate.py --check  EXPLAIN the API's hot queries and fail on sequential scans
+
+Connects with the Postgres connection string in DATABASE_URL (Supabase:
+Project Settings -> Database -> Connection string).
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import logging
+from pathlib import Path
+
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+
+_SAMPLE_ID = "00000000-0000-0000-0000-000000000000"
+
+# (label, query, params, index the planner is expected to pick).
+# Mirrors what PostgREST generates for the routers and datasets loaders.
+HOT_QUERIES = [
+    (
+        "users by username",
+        "select id from users where username = $1",
+        ["my_brand"],
+        "users_username_key",
+    ),
+    (
+        "users in usernames",
+        "select id, username from users where username = any($1::text[])",
+        [["my_brand", "competitor"]],
+        "users_username_key",
+    ),
+    (
+        "follower series",
+        "select user_id, follower_count, recorded_at from follower_metrics "
+        "where user_id = any($1::uuid[]) order by recorded_at",
+        [[_SAMPLE_ID]],
+        "follower_metrics_user_recorded_at_idx",
+    ),
+    (
+        "posts by user",
+        "select user_id, posted_at, likes, comments, shares, content_type from posts "
+        "where user_id = any($1::uuid[])",
+        [[_SAMPLE_ID]],
+        "posts_user_posted_at_idx",
+    ),
+    (
+        "posts since",
+        "select count(*) from posts where user_id = $1::uuid and posted_at >= now() - interval '7 days'",
+        [_SAMPLE_ID],
+        "posts_user_posted_at_idx",
+    ),
+    (
+        "competitor roster",
+        "select * from competitors where owner_id = $1::uuid",
+        [_SAMPLE_ID],
+        "competitors_owner_username_key",
+    ),
+    (
+        "competitor duplicate check",
+        "select id from competitors where owner_id = $1::uuid and username = $2",
+        [_SAMPLE_ID, "competitor"],
+        "competitors_owner_username_key",
+    ),
+]
+
+
+def migration_files():
+    return sorted(MIGRATIONS_DIR.glob("[0-9][0-9][0-9][0-9]_*.sql"))
+
+
+async def _connect():
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        raise SystemExit("DATABASE_URL is not set")
+    return await asyncpg.connect(url)
+
+
+async def applied_versions(conn) -> set:
+    await conn.execute(
+        "create table if not exists schema_migrations ("
+        " version text primary key,"
+        " applied_at timestamptz not null default now())"
+    )
+    rows = await conn.fetch("select version from schema_migrations")
+    return {r["version"] for r in rows}
+
+
+async def apply_migrations(conn) -> list:
+    """Run every pending migration in its own transaction; returns the versions applied."""
+    done = await applied_versions(conn)
+    applied = []
+    for path in migration_files():
+        version = path.stem
+        if version in done:
+            continue
+        logger.info(f"Applying migration {version}")
+        async with conn.transaction():
+            await conn.execute(path.read_text())
+            await conn.execute("insert into schema_migrations (version) values ($1)", version)
+        applied.append(version)
+    return applied
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+async def check_indexes(conn) -> list:
+    """EXPLAIN each hot query; returns ``(label, ok, detail)`` tuples.
+
+    Sequential scans are disabled for the check so small tables still show
+    which index the planner would use once they grow.
+    """
+    results = []
+    async with conn.transaction():
+        await conn.execute("set local enable_seqscan = off")
+        for label, query, params, expected in HOT_QUERIES:
+            raw = await conn.fetchval(f"explain (format json) {query}", *params)
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+            nodes = list(_plan_nodes(plan))
+            indexes = {n["Index Name"] for n in nodes if "Index Name" in n}
+            seq_scans = [n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan"]
+            ok = expected in indexes and not seq_scans
+            detail = f"seq scan on {', '.join(seq_scans)}" if seq_scans else ", ".join(sorted(indexes)) or "no index"
+            results.append((label, ok, detail))
+    return results
+
+
+async def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--list", action="store_true", help="show migration status and exit")
+    parser.add_argument("--check", action="store_true", help="verify the hot queries use their indexes")
+    args = parser.parse_args(argv)
+
+    conn = await _connect()
+    try:
+        if args.list:
+            done = await applied_versions(conn)
+            for path in migration_files():
+                print(f"{'applied' if path.stem in done else 'pending'}  {path.stem}")
+            return 0
+
+        if args.check:
+            results = await check_indexes(conn)
+            for label, ok, detail in results:
+                print(f"{'ok  ' if ok else 'FAIL'}  {label}: {detail}")
+            return 0 if all(ok for _, ok, _ in results) else 1
+
+        applied = await apply_migrations(conn)
+        print(f"Applied {len(applied)} migration(s)" + (f": {', '.join(applied)}" if applied else ""))
+        return 0
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main()))
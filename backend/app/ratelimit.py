@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from app.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# RapidAPI requests allowed per day; a sync costs two (profile + posts)
+RAPIDAPI_DAILY_QUOTA = int(os.getenv("RAPIDAPI_DAILY_QUOTA", "500"))
+# Requests that may go out back to back before the daily rate applies
+RAPIDAPI_BURST = int(os.getenv("RAPIDAPI_BURST", "10"))
+# Pause used when a 429 comes back without a usable Retry-After header
+DEFAULT_RETRY_AFTER_SECONDS = float(os.getenv("DEFAULT_RETRY_AFTER_SECONDS", "60"))
+
+
+class TokenBucket:
+    """Refills at ``rate`` tokens per second up to ``capacity``.
+
+    Every RapidAPI call ``consume``s a token. That always succeeds and may
+    leave the bucket in debt, so user-initiated syncs are never blocked;
+    background work calls ``wait`` first and simply waits longer after them.
+    ``pause`` holds every waiter until a Retry-After deadline.
+    """
+
+    clock = time.monotonic
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = self.clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, tokens: float = 1) -> float:
+        """Seconds until ``tokens`` can be taken, 0 if they are available now."""
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            pause = max(0.0, self._paused_until - now)
+            shortfall = max(0.0, tokens - self._tokens)
+            return max(pause, shortfall / self.rate if self.rate > 0 else float("inf"))
+
+    async def wait(self, tokens: float = 1):
+        """Sleep until ``tokens`` are available without taking them."""
+        while (delay := self.wait_time(tokens)) > 0:
+            await asyncio.sleep(max(delay, 0.05))
+
+    def consume(self, tokens: float = 1):
+        with self._lock:
+            self._refill(self.clock())
+            self._tokens -= tokens
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, self.clock() + seconds)
+        logger.warning(f"Rate limited, pausing RapidAPI calls for {seconds:.0f}s")
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = self.clock()
+            self._refill(now)
+            return {
+                "tokens": round(self._tokens, 2),
+                "capacity": self.capacity,
+                "paused_for": round(max(0.0, self._paused_until - now), 1),
+            }
+
+
+def retry_after_seconds(response, default: float = DEFAULT_RETRY_AFTER_SECONDS) -> float:
+    """Seconds to wait from a response's Retry-After header (delta or HTTP date)."""
+    value = response.headers.get("retry-after") if response is not None else None
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+rapidapi_bucket = TokenBucket(RAPIDAPI_DAILY_QUOTA / 86400, RAPIDAPI_BURST)
+
+
+def _bucket_metrics():
+    stats = rapidapi_bucket.stats()
+    yield "gapsight_rapidapi_tokens", "gauge", "RapidAPI requests available now; negative after manual syncs.", [
+        ({}, stats["tokens"]),
+    ]
+    yield "gapsight_rapidapi_capacity", "gauge", "Most RapidAPI requests the bucket holds.", [
+        ({}, stats["capacity"]),
+    ]
+    yield "gapsight_rapidapi_paused_seconds", "gauge", "Seconds left on the current Retry-After pause.", [
+        ({}, stats["paused_for"]),
+    ]
+
+
+registry.register_collector(_bucket_metrics)
@@ -1,211 +1,239 @@
 from fastapi import APIRouter, Query, Body
-from app.database import supabase, retry_on_disconnect
-from collections import defaultdict
-from datetime import datetime, timedelta
+from typing import Annotated, Optional
+from app.cache import bump_data_version, cached_response
+from app.database import get_supabase_client, retry_on_disconnect
+from app.datasets import computation_context, load_engagement_stats, load_follower_buckets, load_post_frames, resolve_user_ids
+from app.downsample import RESOLUTION_PATTERN, bucket_points, lttb
+from app.forecast import forecast_series, series_from_points
+from datetime import datetime, timedelta, timezone
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 
-@router.get("/summary")
-@retry_on_disconnect()
-def get_summary(username: str = Query(default="my_brand")):
-    user = supabase.table("users").select("id").eq("username", username).execute()
-    if not user.data:
-        return {}
-    user_id = user.data[0]["id"]
-
-    followers = supabase.table("follower_metrics") \
-        .select("follower_count, recorded_at") \
-        .eq("user_id", user_id) \
-        .order("recorded_at", desc=True) \
-        .limit(1).execute()
-    if not followers.data:
-        return {}
-    total_followers = followers.data[0]["follower_count"]
+def _load_followers(supabase, user_id):
+    # Daily buckets: enough for every chart and for the forecast fit
+    return {"followers": load_follower_buckets(supabase, [user_id], "day")[user_id]}
 
-    all_followers = supabase.table("follower_metrics") \
-        .select("follower_count") \
-        .eq("user_id", user_id) \
-        .order("recorded_at", desc=False).execute()
-    older_count = all_followers.data[0]["follower_count"] if all_followers.data else total_followers
-    growth_pct = round(((total_followers - older_count) / older_count) * 100, 1) if older_count > 0 else 0
 
-    posts = supabase.table("posts").select("*").eq("user_id", user_id).execute()
-    post_data = posts.data
+def _week_ago() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=7)
+
+
+def _type_stats(supabase, user_id):
+    return load_engagement_stats(supabase, [user_id], "content_type")[user_id]
+
 
-    total_engagement = sum(p["likes"] + p["comments"] + p["shares"] for p in post_data)
-    avg_engagement = round(total_engagement / len(post_data), 1) if post_data else 0
-    engagement_rate = round((avg_engagement / total_followers) * 100, 2) if total_followers else 0
+def _month_stats(supabase, user_id):
+    return load_engagement_stats(supabase, [user_id], "time", "month")[user_id]
 
-    content_counts = defaultdict(int)
-    for p in post_data:
-        content_counts[p["content_type"]] += 1
-    top_content = max(content_counts, key=content_counts.get) if content_counts else "N/A"
 
-    week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-    recent_posts = supabase.table("posts").select("id") \
-        .eq("user_id", user_id) \
-        .gte("posted_at", week_ago).execute()
-    posts_this_week = len(recent_posts.data)
+def _posts_this_week(supabase, user_id) -> int:
+    recent = load_engagement_stats(supabase, [user_id], since=_week_ago().isoformat())[user_id]
+    return sum(g["post_count"] for g in recent)
+
+
+def _post_performance(supabase, user_id):
+    return load_post_frames(supabase, [user_id])[user_id].records()
+
+
+def _summary_view(followers, type_stats, posts_this_week):
+    if not followers:
+        return {}
+    total_followers = followers[-1]["followers"]
+    older_count = followers[0]["followers"]
+    growth_pct = round(((total_followers - older_count) / older_count) * 100, 1) if older_count > 0 else 0
+
+    post_count = sum(g["post_count"] for g in type_stats)
+    total_engagement = sum(g["total_engagement"] for g in type_stats)
+    avg_engagement = round(total_engagement / post_count, 1) if post_count else 0
+    top_content = max(type_stats, key=lambda g: g["post_count"])["key"] if type_stats else "N/A"
 
     return {
         "follower_count": total_followers,
         "follower_growth_pct": growth_pct,
         "avg_engagement": avg_engagement,
         "top_content_type": top_content,
-        "posts_per_week": posts_this_week
+        "posts_per_week": posts_this_week,
     }
 
 
-@router.get("/followers")
-@retry_on_disconnect()
-def get_follower_growth(username: str = Query(default="my_brand")):
-    user = supabase.table("users").select("id").eq("username", username).execute()
-    if not user.data:
-        return []
-    user_id = user.data[0]["id"]
-
-    result = supabase.table("follower_metrics") \
-        .select("follower_count, recorded_at") \
-        .eq("user_id", user_id) \
-        .order("recorded_at", desc=False).execute()
-
-    data = result.data[::7] if result.data else []
-    return [{"date": r["recorded_at"][:10], "followers": r["follower_count"]} for r in data]
+def _follower_growth_view(data, resolution: str = "week", max_points: int = None):
+    return lttb(bucket_points(data["followers"], resolution), max_points)
 
 
-@router.get("/content-types")
-@retry_on_disconnect()
-def get_content_types(username: str = Query(default="my_brand")):
-    user = supabase.table("users").select("id").eq("username", username).execute()
-    if not user.data:
-        return []
-    user_id = user.data[0]["id"]
-
-    posts = supabase.table("posts").select("content_type, likes, comments, shares") \
-        .eq("user_id", user_id).execute()
+def _content_types_view(type_stats):
+    return [
+        {
+            "content_type": g["key"],
+            "count": g["post_count"],
+            "avg_engagement": round(g["total_engagement"] / g["post_count"], 1)
+        }
+        for g in type_stats
+    ]
 
-    counts = defaultdict(lambda: {"count": 0, "total_engagement": 0})
-    for p in posts.data:
-        ct = p["content_type"]
-        counts[ct]["count"] += 1
-        counts[ct]["total_engagement"] += p["likes"] + p["comments"] + p["shares"]
 
+def _frequency_correlation_view(month_stats):
     return [
         {
-            "content_type": ct,
-            "count": v["count"],
-            "avg_engagement": round(v["total_engagement"] / v["count"], 1)
+            "week": g["key"][:7],
+            "post_count": g["post_count"],
+            "avg_engagement": round(g["total_engagement"] / g["post_count"], 1)
         }
-        for ct, v in counts.items()
+        for g in sorted(month_stats, key=lambda g: g["key"])
     ]
 
 
-@router.get("/frequency-correlation")
-@retry_on_disconnect()
-def get_frequency_correlation(username: str = Query(default="my_brand")):
-    user = supabase.table("users").select("id").eq("username", username).execute()
-    if not user.data:
-        return []
-    user_id = user.data[0]["id"]
+def _trend_prediction_view(data, weeks: int = 4, model: str = "linear", level: float = 0.95):
+    """Weekly follower history plus a forecast fit on the full daily series."""
+    history = _follower_growth_view(data)
+    if len(history) < 2:
+        return history
+
+    points = [
+        {"date": point["date"], "followers": point["followers"], "type": "actual"}
+        for point in history
+    ]
+    forecast = forecast_series(
+        [series_from_points(data["followers"])], horizon_days=7 * weeks, step_days=7, model=model, level=level
+    )[0]
+    points.extend({**point, "type": "predicted"} for point in forecast["points"])
+    return points
 
-    posts = supabase.table("posts").select("posted_at, likes, comments, shares") \
-        .eq("user_id", user_id).execute()
 
-    weekly = defaultdict(lambda: {"posts": 0, "total_engagement": 0})
-    for p in posts.data:
-        week = p["posted_at"][:7]
-        weekly[week]["posts"] += 1
-        weekly[week]["total_engagement"] += p["likes"] + p["comments"] + p["shares"]
+@router.get("/dashboard")
+@cached_response("analytics.dashboard")
+@retry_on_disconnect()
+def get_dashboard(username: str = Query(default="my_brand")):
+    """Every Dashboard view from one follower load and one post load.
+
+    The post views need the full rows anyway, so the content-type, month and
+    this-week groups come from the same frame instead of separate RPC calls.
+    """
+    with computation_context():
+        supabase = get_supabase_client()
+        user_id = resolve_user_ids(supabase, [username]).get(username)
+        if not user_id:
+            return {
+                "summary": {},
+                "followers": [],
+                "content_types": [],
+                "post_performance": [],
+                "frequency_correlation": [],
+                "trend_prediction": [],
+            }
 
-    return [
-        {
-            "week": week,
-            "post_count": v["posts"],
-            "avg_engagement": round(v["total_engagement"] / v["posts"], 1)
+        data = _load_followers(supabase, user_id)
+        frame = load_post_frames(supabase, [user_id])[user_id]
+        type_stats = frame.group_by("content_type")
+        return {
+            "summary": _summary_view(data["followers"], type_stats, len(frame.since(_week_ago()))),
+            "followers": _follower_growth_view(data),
+            "content_types": _content_types_view(type_stats),
+            "post_performance": frame.records(),
+            "frequency_correlation": _frequency_correlation_view(frame.group_by("time", "month")),
+            "trend_prediction": _trend_prediction_view(data),
         }
-        for week, v in sorted(weekly.items())
-    ]
 
 
-@router.get("/post-performance")
+@router.get("/summary")
+@cached_response("analytics.summary")
 @retry_on_disconnect()
-def get_post_performance(username: str = Query(default="my_brand")):
-    user = supabase.table("users").select("id").eq("username", username).execute()
-    if not user.data:
-        return []
-    user_id = user.data[0]["id"]
-
-    posts = supabase.table("posts").select(
-        "posted_at, likes, comments, shares, content_type"
-    ).eq("user_id", user_id).order("posted_at", desc=False).execute()
-
-    items = []
-    for p in posts.data:
-        total_engagement = p["likes"] + p["comments"] + p["shares"]
-        items.append(
-            {
-                "date": p["posted_at"][:10],
-                "engagement": total_engagement,
-                "content_type": p["content_type"],
-            }
-        )
+def get_summary(username: str = Query(default="my_brand")):
+    with computation_context():
+        supabase = get_supabase_client()
+        user_id = resolve_user_ids(supabase, [username]).get(username)
+        if not user_id:
+            return {}
+        followers = _load_followers(supabase, user_id)["followers"]
+        return _summary_view(followers, _type_stats(supabase, user_id), _posts_this_week(supabase, user_id))
 
-    return items
 
+@router.get("/followers")
+@cached_response("analytics.followers")
+@retry_on_disconnect()
+def get_follower_growth(
+    username: str = Query(default="my_brand"),
+    resolution: Annotated[str, Query(pattern=RESOLUTION_PATTERN)] = "week",
+    max_points: Annotated[Optional[int], Query(ge=3)] = None,
+):
+    """Follower series bucketed in the database, optionally LTTB-trimmed to ``max_points``."""
+    with computation_context():
+        supabase = get_supabase_client()
+        user_id = resolve_user_ids(supabase, [username]).get(username)
+        if not user_id:
+            return []
+        return lttb(load_follower_buckets(supabase, [user_id], resolution)[user_id], max_points)
 
-@router.get("/trend-prediction")
+
+@router.get("/content-types")
+@cached_response("analytics.content_types")
 @retry_on_disconnect()
-def get_trend_prediction(username: str = Query(default="my_brand")):
-    """Forecast follower trend for the next 4 weeks using linear regression."""
-    history = get_follower_growth(username=username)
-    if len(history) < 2:
-        return history
+def get_content_types(username: str = Query(default="my_brand")):
+    with computation_context():
+        supabase = get_supabase_client()
+        user_id = resolve_user_ids(supabase, [username]).get(username)
+        if not user_id:
+            return []
+        return _content_types_view(_type_stats(supabase, user_id))
 
-    x_values = list(range(len(history)))
-    y_values = [point["followers"] for point in history]
 
-    mean_x = sum(x_values) / len(x_values)
-    mean_y = sum(y_values) / len(y_values)
+@router.get("/frequency-correlation")
+@cached_response("analytics.frequency_correlation")
+@retry_on_disconnect()
+def get_frequency_correlation(username: str = Query(default="my_brand")):
+    with computation_context():
+        supabase = get_supabase_client()
+        user_id = resolve_user_ids(supabase, [username]).get(username)
+        if not user_id:
+            return []
+        return _frequency_correlation_view(_month_stats(supabase, user_id))
 
-    numerator = sum((x - mean_x) * (y - mean_y) for x, y in zip(x_values, y_values))
-    denominator = sum((x - mean_x) ** 2 for x in x_values)
-    slope = (numerator / denominator) if denominator else 0
-    intercept = mean_y - (slope * mean_x)
 
-    points = [
-        {"date": point["date"], "followers": point["followers"], "type": "actual"}
-        for point in history
-    ]
+@router.get("/post-performance")
+@cached_response("analytics.post_performance")
+@retry_on_disconnect()
+def get_post_performance(username: str = Query(default="my_brand")):
+    with computation_context():
+        supabase = get_supabase_client()
+        user_id = resolve_user_ids(supabase, [username]).get(username)
+        if not user_id:
+            return []
+        return _post_performance(supabase, user_id)
 
-    last_date = datetime.fromisoformat(history[-1]["date"])
-    start_index = len(history)
-    for step in range(1, 5):
-        idx = start_index + step - 1
-        prediction = max(0, round(intercept + slope * idx))
-        points.append(
-            {
-                "date": (last_date + timedelta(days=7 * step)).strftime("%Y-%m-%d"),
-                "followers": prediction,
-                "type": "predicted",
-            }
-        )
 
-    return points
+@router.get("/trend-prediction")
+@cached_response("analytics.trend_prediction")
+@retry_on_disconnect()
+def get_trend_prediction(
+    username: str = Query(default="my_brand"),
+    weeks: Annotated[int, Query(ge=1, le=52)] = 4,
+    model: Annotated[str, Query(pattern="^(linear|robust|seasonal)$")] = "linear",
+    level: Annotated[float, Query(gt=0, lt=1)] = 0.95,
+):
+    """Forecast follower trend ``weeks`` ahead with prediction bounds."""
+    with computation_context():
+        supabase = get_supabase_client()
+        user_id = resolve_user_ids(supabase, [username]).get(username)
+        if not user_id:
+            return []
+        return _trend_prediction_view(_load_followers(supabase, user_id), weeks, model, level)
+
 
 @router.get("/users")
 @retry_on_disconnect()
 def get_users():
+    supabase = get_supabase_client()
     result = supabase.table("users").select("id, username, platform").execute()
     return result.data if result.data else []
 
-from fastapi import Body
 
 @router.post("/users")
 @retry_on_disconnect()
 def create_user(username: str = Body(...), platform: str = Body(default="instagram")):
+    supabase = get_supabase_client()
     existing = supabase.table("users").select("id").eq("username", username).execute()
     if existing.data:
         return {"error": "Username already exists"}
     result = supabase.table("users").insert({"username": username, "platform": platform}).execute()
+    bump_data_version(username)
     return result.data[0] if result.data else {"error": "Failed to create user"}
\ No newline at end of file
@@ -1,7 +1,13 @@
-from fastapi import APIRouter, Query, Body, HTTPException, BackgroundTasks
-from collections import defaultdict
+from fastapi import APIRouter, Query, Body, HTTPException
+from typing import Annotated, Optional
+from app.cache import bump_data_version, cached_response
 from app.database import get_supabase_client, retry_on_disconnect
-from app.routers.sync import run_apify_historical
+from app.datasets import average_engagement, load_engagement_stats, load_follower_buckets, load_roster, resolve_user_ids
+from app.downsample import RESOLUTION_PATTERN, lttb
+from app.engine import rank_desc
+from app.forecast import forecast_series, series_from_points
+from app.jobs import submit_history_job
+from app.singleflight import coalesce
 
 router = APIRouter(prefix="/competitors", tags=["competitors"])
 
@@ -12,161 +18,99 @@ def _get_user_id(supabase, username: str):
     return res.data[0]["id"] if res.data else None
 
 
-@router.get("/list")
-@retry_on_disconnect()
-def get_competitors(username: str = Query(default="my_brand")):
-    supabase = get_supabase_client()
-    owner_id = _get_user_id(supabase, username)
+def _load_competitor_data(
+    supabase, username: str, followers: bool = True, posts: bool = True, resolution: str = "week"
+):
+    """Load the owner, their competitors and everyone's metrics in one go.
+
+    The query count is fixed no matter how many competitors are tracked:
+    owner lookup, roster, one ``in_`` lookup for the competitor user ids and
+    one query per metrics table. Follower series come back bucketed at
+    ``resolution`` and posts as per-content-type engagement stats. Inside a computation context the datasets are shared
+    with every other view built in the same request.
+    """
+    owner_id = resolve_user_ids(supabase, [username]).get(username)
     if not owner_id:
-        return []
+        return None
+
     # competitors.username holds the competitor's username as a plain string
-    result = supabase.table("competitors").select("*").eq("owner_id", owner_id).execute()
-    rows = result.data or []
-    for row in rows:
-        row["competitor_username"] = row.get("username", "")
-    return rows
+    roster = load_roster(supabase, owner_id)
 
+    names = [row["username"] for row in roster]
+    user_ids = resolve_user_ids(supabase, names) if names and (followers or posts) else {}
+    all_ids = [owner_id, *user_ids.values()]
+
+    return {
+        "owner_id": owner_id,
+        "roster": roster,
+        "user_ids": user_ids,
+        "followers": load_follower_buckets(supabase, all_ids, resolution) if followers else {},
+        "post_stats": load_engagement_stats(supabase, all_ids, "content_type") if posts else {},
+    }
 
-@router.get("/compare")
-@retry_on_disconnect()
-def compare_competitors(username: str = Query(default="my_brand")):
-    supabase = get_supabase_client()
-    owner_id = _get_user_id(supabase, username)
-    if not owner_id:
-        return []
 
-    followers = supabase.table("follower_metrics") \
-        .select("follower_count") \
-        .eq("user_id", owner_id) \
-        .order("recorded_at", desc=True) \
-        .limit(1).execute()
-    my_followers = followers.data[0]["follower_count"] if followers.data else 0
+def _list_view(data):
+    rows = data["roster"]
+    for row in rows:
+        row["competitor_username"] = row.get("username", "")
+    return rows
 
-    posts = supabase.table("posts").select("likes, comments, shares").eq("user_id", owner_id).execute()
-    if posts.data:
-        total_eng = sum(p["likes"] + p["comments"] + p["shares"] for p in posts.data)
-        my_avg_eng = round(total_eng / len(posts.data), 1)
-    else:
-        my_avg_eng = 0
 
-    result = [{"name": username, "followers": my_followers, "avg_engagement": my_avg_eng}]
+def _compare_view(username, data):
+    def entry(name, user_id):
+        series = data["followers"].get(user_id, [])
+        return {
+            "name": name,
+            "followers": series[-1]["followers"] if series else 0,
+            "avg_engagement": average_engagement(data["post_stats"].get(user_id, [])),
+        }
 
-    competitors = supabase.table("competitors").select("username").eq("owner_id", owner_id).execute()
-    for c in (competitors.data or []):
+    result = [entry(username, data["owner_id"])]
+    for c in data["roster"]:
         cname = c["username"]
-        cid = _get_user_id(supabase, cname)
+        cid = data["user_ids"].get(cname)
         if not cid:
             result.append({"name": cname, "followers": 0, "avg_engagement": 0})
             continue
-
-        c_followers = supabase.table("follower_metrics") \
-            .select("follower_count") \
-            .eq("user_id", cid) \
-            .order("recorded_at", desc=True) \
-            .limit(1).execute()
-        c_follower_count = c_followers.data[0]["follower_count"] if c_followers.data else 0
-
-        c_posts = supabase.table("posts").select("likes, comments, shares").eq("user_id", cid).execute()
-        if c_posts.data:
-            c_total = sum(p["likes"] + p["comments"] + p["shares"] for p in c_posts.data)
-            c_avg_eng = round(c_total / len(c_posts.data), 1)
-        else:
-            c_avg_eng = 0
-
-        result.append({"name": cname, "followers": c_follower_count, "avg_engagement": c_avg_eng})
-
+        result.append(entry(cname, cid))
+    # 1 = highest average engagement among you and your competitors
+    for row, rank in zip(result, rank_desc([row["avg_engagement"] for row in result]).tolist()):
+        row["engagement_rank"] = rank
     return result
 
 
-@router.get("/growth")
-@retry_on_disconnect()
-def competitor_growth(username: str = Query(default="my_brand")):
-    supabase = get_supabase_client()
-    owner_id = _get_user_id(supabase, username)
-    if not owner_id:
-        return []
-
-    my_metrics = supabase.table("follower_metrics") \
-        .select("follower_count, recorded_at") \
-        .eq("user_id", owner_id) \
-        .order("recorded_at", desc=False).execute()
-    my_series = [{"date": r["recorded_at"][:10], "followers": r["follower_count"]} for r in (my_metrics.data or [])[::7]]
-    all_series = [{"name": username, "data": my_series}]
-
-    competitors = supabase.table("competitors").select("username").eq("owner_id", owner_id).execute()
-    for c in (competitors.data or []):
+def _growth_view(username, data, max_points: int = None):
+    all_series = [{"name": username, "data": lttb(data["followers"].get(data["owner_id"], []), max_points)}]
+    for c in data["roster"]:
         cname = c["username"]
-        cid = _get_user_id(supabase, cname)
-        if not cid:
-            all_series.append({"name": cname, "data": []})
-            continue
-        metrics = supabase.table("follower_metrics") \
-            .select("follower_count, recorded_at") \
-            .eq("user_id", cid) \
-            .order("recorded_at", desc=False).execute()
-        series = [{"date": r["recorded_at"][:10], "followers": r["follower_count"]} for r in (metrics.data or [])[::7]]
-        all_series.append({"name": cname, "data": series})
-
+        cid = data["user_ids"].get(cname)
+        all_series.append({"name": cname, "data": lttb(data["followers"].get(cid, []), max_points) if cid else []})
     return all_series
 
 
-@router.get("/gaps")
-@retry_on_disconnect()
-def get_gaps(username: str = Query(default="my_brand")):
-    supabase = get_supabase_client()
-    owner_id = _get_user_id(supabase, username)
-    if not owner_id:
-        return []
-
-    posts = supabase.table("posts").select("content_type, likes, comments, shares").eq("user_id", owner_id).execute()
-    counts = defaultdict(int)
-    total_eng = 0
-    for p in (posts.data or []):
-        counts[p["content_type"]] += 1
-        total_eng += p["likes"] + p["comments"] + p["shares"]
-    total_posts = len(posts.data) if posts.data else 1
-    my_avg_eng = total_eng / total_posts
-    num_types = len(counts) or 1
-    baseline = total_posts / num_types
+def _gaps_view(data):
+    my_stats = {g["key"]: g for g in data["post_stats"].get(data["owner_id"], [])}
 
     gaps = []
-    competitors = supabase.table("competitors").select("username").eq("owner_id", owner_id).execute()
-    for c in (competitors.data or []):
+    for c in data["roster"]:
         cname = c["username"]
-        cid = _get_user_id(supabase, cname)
-        if not cid:
+        cid = data["user_ids"].get(cname)
+        c_stats = data["post_stats"].get(cid, []) if cid else []
+        if not c_stats:
             continue
 
-        c_posts = supabase.table("posts") \
-            .select("content_type, likes, comments, shares") \
-            .eq("user_id", cid).execute()
-        if not c_posts.data:
-            continue
-
-        type_metrics = defaultdict(lambda: {"count": 0, "total_eng": 0})
-        for p in c_posts.data:
-            ct = p["content_type"]
-            type_metrics[ct]["count"] += 1
-            type_metrics[ct]["total_eng"] += p["likes"] + p["comments"] + p["shares"]
-
-        top_type = max(
-            type_metrics,
-            key=lambda t: type_metrics[t]["total_eng"] / max(type_metrics[t]["count"], 1)
-        )
+        # First of the content types ranked best by engagement per post; the
+        # stats are sorted by type, so ties go to the alphabetically first one
+        ranks = rank_desc([g["total_engagement"] / max(g["post_count"], 1) for g in c_stats])
+        top = c_stats[int(ranks.argmin())]
+        top_type = top["key"]
 
         # Competitor's avg engagement specifically for their top content type
-        comp_type_posts = [p for p in c_posts.data if p["content_type"] == top_type]
-        comp_type_eng = (
-            sum(p["likes"] + p["comments"] + p["shares"] for p in comp_type_posts) / len(comp_type_posts)
-            if comp_type_posts else 0
-        )
+        comp_type_eng = top["total_engagement"] / top["post_count"]
 
         # Your avg engagement for that same content type
-        my_type_posts = [p for p in (posts.data or []) if p["content_type"] == top_type]
-        my_type_eng = (
-            sum(p["likes"] + p["comments"] + p["shares"] for p in my_type_posts) / len(my_type_posts)
-            if my_type_posts else 0
-        )
+        mine = my_stats.get(top_type)
+        my_type_eng = mine["total_engagement"] / mine["post_count"] if mine else 0
 
         # Gap score = how much % more engagement competitor gets in that type vs you
         # 100 means you don't post it at all; negative means you actually outperform them
@@ -175,7 +119,7 @@ def get_gaps(username: str = Query(default="my_brand")):
         else:
             gap_score = 100.0
 
-        my_usage = counts.get(top_type, 0)
+        my_usage = mine["post_count"] if mine else 0
         gaps.append({
             "competitor": cname,
             "top_content_type": top_type,
@@ -192,10 +136,98 @@ def get_gaps(username: str = Query(default="my_brand")):
     return gaps
 
 
+@router.get("/overview")
+@cached_response("competitors.overview", per_user=False)
+@coalesce("competitors.overview")
+@retry_on_disconnect()
+def get_overview(username: str = Query(default="my_brand")):
+    """List, compare, growth and gaps for the Competitors page from a single load."""
+    supabase = get_supabase_client()
+    data = _load_competitor_data(supabase, username)
+    if data is None:
+        return {"list": [], "compare": [], "growth": [], "gaps": []}
+    return {
+        "list": _list_view(data),
+        "compare": _compare_view(username, data),
+        "growth": _growth_view(username, data),
+        "gaps": _gaps_view(data),
+    }
+
+
+@router.get("/list")
+@cached_response("competitors.list")
+@retry_on_disconnect()
+def get_competitors(username: str = Query(default="my_brand")):
+    supabase = get_supabase_client()
+    data = _load_competitor_data(supabase, username, followers=False, posts=False)
+    return _list_view(data) if data else []
+
+
+@router.get("/compare")
+@cached_response("competitors.compare", per_user=False)
+@coalesce("competitors.compare")
+@retry_on_disconnect()
+def compare_competitors(username: str = Query(default="my_brand")):
+    supabase = get_supabase_client()
+    data = _load_competitor_data(supabase, username)
+    return _compare_view(username, data) if data else []
+
+
+@router.get("/growth")
+@cached_response("competitors.growth", per_user=False)
+@retry_on_disconnect()
+def competitor_growth(
+    username: str = Query(default="my_brand"),
+    resolution: Annotated[str, Query(pattern=RESOLUTION_PATTERN)] = "week",
+    max_points: Annotated[Optional[int], Query(ge=3)] = None,
+):
+    supabase = get_supabase_client()
+    data = _load_competitor_data(supabase, username, posts=False, resolution=resolution)
+    return _growth_view(username, data, max_points) if data else []
+
+
+@router.get("/gaps")
+@cached_response("competitors.gaps", per_user=False)
+@retry_on_disconnect()
+def get_gaps(username: str = Query(default="my_brand")):
+    supabase = get_supabase_client()
+    data = _load_competitor_data(supabase, username, followers=False)
+    return _gaps_view(data) if data else []
+
+
+@router.get("/forecast")
+@cached_response("competitors.forecast", per_user=False)
+@retry_on_disconnect()
+def competitor_forecast(
+    username: str = Query(default="my_brand"),
+    weeks: Annotated[int, Query(ge=1, le=52)] = 4,
+    model: Annotated[str, Query(pattern="^(linear|robust|seasonal)$")] = "linear",
+    level: Annotated[float, Query(gt=0, lt=1)] = 0.95,
+):
+    """Follower forecasts for you and every competitor, fit in one vectorized batch."""
+    supabase = get_supabase_client()
+    data = _load_competitor_data(supabase, username, posts=False, resolution="day")
+    if data is None:
+        return []
+
+    names = [username, *(c["username"] for c in data["roster"])]
+    ids = [data["owner_id"], *(data["user_ids"].get(c["username"]) for c in data["roster"])]
+    forecasts = forecast_series(
+        [series_from_points(data["followers"].get(uid, [])) for uid in ids],
+        horizon_days=7 * weeks,
+        step_days=7,
+        model=model,
+        level=level,
+    )
+    return [
+        {"name": name, "slope_per_day": f["slope_per_day"], "data": f["points"]}
+        for name, f in zip(names, forecasts)
+    ]
+
+
 @router.post("/")
 @retry_on_disconnect()
 def add_competitor(
-    background_tasks: BackgroundTasks,
     owner_username: str = Body(...),
     competitor_username: str = Body(...),
     platform: str = Body(default="instagram")
@@ -224,12 +256,13 @@ def add_competitor(
     }).execute()
     if not result.data:
         raise HTTPException(status_code=500, detail="Failed to add competitor")
+    bump_data_version(owner_username)
+    bump_data_version(competitor_username)
 
-    # Kick off Apify history fetch for this competitor in the background
-    if comp_id:
-        background_tasks.add_task(run_apify_historical, comp_id, competitor_username)
+    # Queue an Apify history backfill for this competitor
+    job = submit_history_job(comp_id, competitor_username) if comp_id else None
 
-    return result.data[0]
+    return {**result.data[0], "history_job_id": job["id"] if job else None}
 
 
 @router.delete("/{competitor_username}")
@@ -245,4 +278,5 @@ def remove_competitor(competitor_username: str, owner_username: str = Query(...)
         .eq("owner_id", owner_id) \
         .eq("username", competitor_username) \
         .execute()
+    bump_data_version(owner_username)
     return {"success": True}
\ No newline at end of file
@@ -1,77 +1,64 @@
 from fastapi import APIRouter, Query
+from app.cache import TTLCache, completion_cache, completion_key
 from app.database import get_supabase_client, retry_on_disconnect
+from app.datasets import average_engagement, computation_context, load_engagement_stats, load_follower_buckets, load_roster, resolve_user_ids
+from app.metrics import TimedTransport
 from app.routers.competitors import get_gaps
+from app.singleflight import coalesce
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 import os
 import json
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/insights", tags=["insights"])
 
+INSIGHTS_MODEL = "llama-3.1-8b-instant"
+# Bump whenever the prompt text changes so cached completions are not reused
+PROMPT_VERSION = "1"
+INSIGHTS_AI_TIMEOUT_SECONDS = float(os.getenv("INSIGHTS_AI_TIMEOUT_SECONDS", "20"))
+
 groq_client = None
 try:
-    from groq import Groq
+    from groq import DefaultHttpxClient, Groq
     api_key = os.getenv("GROQ_API_KEY")
     if api_key:
-        groq_client = Groq(api_key=api_key)
+        groq_client = Groq(api_key=api_key, http_client=DefaultHttpxClient(transport=TimedTransport("groq")))
 except Exception as e:
     logger.warning(f"Groq client not initialized: {e}")
 
 
 def build_summary(username: str = "my_brand"):
     supabase = get_supabase_client()
-    user = supabase.table("users").select("id").eq("username", username).execute()
-    if not user.data:
+    user_id = resolve_user_ids(supabase, [username]).get(username)
+    if not user_id:
         return {}
-    user_id = user.data[0]["id"]
-
-    followers = supabase.table("follower_metrics") \
-        .select("follower_count") \
-        .eq("user_id", user_id) \
-        .order("recorded_at", desc=True) \
-        .limit(1).execute()
-    my_followers = followers.data[0]["follower_count"] if followers.data else 0
-
-    posts = supabase.table("posts").select("likes, comments, shares, content_type").eq("user_id", user_id).execute()
-    post_data = posts.data or []
-    total_eng = sum(p["likes"] + p["comments"] + p["shares"] for p in post_data)
-    avg_eng = round(total_eng / len(post_data), 1) if post_data else 0
-    engagement_rate = round((avg_eng / my_followers) * 100, 2) if my_followers else 0
 
-    from collections import defaultdict
-    counts = defaultdict(int)
-    for p in post_data:
-        counts[p["content_type"]] += 1
-    top_content = max(counts, key=counts.get) if counts else "N/A"
+    roster = load_roster(supabase, user_id)
+    competitor_ids = list(resolve_user_ids(supabase, [c["username"] for c in roster]).values())
+    all_ids = [user_id, *competitor_ids]
+    follower_series = load_follower_buckets(supabase, all_ids)
+    type_stats = load_engagement_stats(supabase, all_ids, "content_type")
+    week_ago = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+    recent = load_engagement_stats(supabase, [user_id], since=week_ago)[user_id]
+
+    my_series = follower_series[user_id]
+    my_followers = my_series[-1]["followers"] if my_series else 0
 
-    from datetime import datetime, timedelta
-    week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-    recent = supabase.table("posts").select("id").eq("user_id", user_id).gte("posted_at", week_ago).execute()
-    posts_per_week = len(recent.data) if recent.data else 0
+    my_stats = type_stats[user_id]
+    avg_eng = average_engagement(my_stats)
+    engagement_rate = round((avg_eng / my_followers) * 100, 2) if my_followers else 0
+    top_content = max(my_stats, key=lambda g: g["post_count"])["key"] if my_stats else "N/A"
 
-    competitors = supabase.table("competitors").select("username").eq("owner_id", user_id).execute()
     comp_followers_list = []
     comp_eng_list = []
-
-    for c in (competitors.data or []):
-        cname = c["username"]
-        cid_res = supabase.table("users").select("id").eq("username", cname).execute()
-        if not cid_res.data:
-            continue
-        cid = cid_res.data[0]["id"]
-
-        c_followers = supabase.table("follower_metrics") \
-            .select("follower_count") \
-            .eq("user_id", cid) \
-            .order("recorded_at", desc=True) \
-            .limit(1).execute()
-        if c_followers.data:
-            comp_followers_list.append(c_followers.data[0]["follower_count"])
-
-        c_posts = supabase.table("posts").select("likes, comments, shares").eq("user_id", cid).execute()
-        if c_posts.data:
-            total = sum(p["likes"] + p["comments"] + p["shares"] for p in c_posts.data)
-            comp_eng_list.append(round(total / len(c_posts.data), 1))
+    for cid in competitor_ids:
+        if follower_series[cid]:
+            comp_followers_list.append(follower_series[cid][-1]["followers"])
+        if type_stats[cid]:
+            comp_eng_list.append(average_engagement(type_stats[cid]))
 
     avg_comp_followers = round(sum(comp_followers_list) / len(comp_followers_list), 1) if comp_followers_list else 0
     avg_comp_eng = round(sum(comp_eng_list) / len(comp_eng_list), 1) if comp_eng_list else 0
@@ -82,7 +69,7 @@ def build_summary(username: str = "my_brand"):
         "my_engagement_rate": engagement_rate,
         "my_avg_engagement": avg_eng,
         "my_top_content": top_content,
-        "my_posts_per_week": posts_per_week,
+        "my_posts_per_week": sum(g["post_count"] for g in recent),
         "avg_competitor_followers": avg_comp_followers,
         "avg_competitor_engagement": avg_comp_eng,
     }
@@ -125,17 +112,8 @@ def _normalize_insights(raw: dict, fallback: dict) -> dict:
     return result
 
 
-@router.get("/")
-def get_insights(username: str = Query(default="my_brand")):
-    summary = build_summary(username=username)
-    gaps = get_gaps(username=username)
-    fallback = _default_insights(summary, gaps)
-
-    if not groq_client:
-        return {**fallback, "source": "rules"}
-
-    try:
-        prompt = f"""
+def _build_prompt(summary: dict, gaps: list) -> str:
+    return f"""
 You are a social media analytics assistant. Based ONLY on the data below, return a JSON object.
 
 DATA:
@@ -154,31 +132,147 @@ RULES:
   - "best_time_to_post": string
   - "recommendations": array of exactly 3 short strings
 """
-        response = groq_client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-        )
-        content = response.choices[0].message.content or ""
-        # Strip markdown code fences if present (```json ... ``` or ``` ... ```)
-        content = content.strip()
-        if content.startswith("```"):
-            content = content.split("```", 2)[1]
-            if content.startswith("json"):
-                content = content[4:]
-            content = content.rsplit("```", 1)[0].strip()
-        raw = json.loads(content)
-        normalized = _normalize_insights(raw, fallback)
+
+
+def _parse_completion(content: str) -> dict:
+    # Strip markdown code fences if present (```json ... ``` or ``` ... ```)
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.split("```", 2)[1]
+        if content.startswith("json"):
+            content = content[4:]
+        content = content.rsplit("```", 1)[0].strip()
+    return json.loads(content)
+
+
+def _insights_key(summary: dict, gaps: list) -> str:
+    return completion_key({"summary": summary, "gaps": gaps}, PROMPT_VERSION, INSIGHTS_MODEL)
+
+
+def _ai_insights(summary: dict, gaps: list, fallback: dict, use_cache: bool = True) -> dict:
+    """Groq insights for these inputs, served from the completion cache when possible."""
+    key = _insights_key(summary, gaps)
+    if use_cache:
+        cached = completion_cache.get(key)
+        if cached is not None:
+            return cached
+
+    response = groq_client.chat.completions.create(
+        model=INSIGHTS_MODEL,
+        messages=[{"role": "user", "content": _build_prompt(summary, gaps)}],
+        temperature=0.3,
+        timeout=INSIGHTS_AI_TIMEOUT_SECONDS,
+    )
+    raw = _parse_completion(response.choices[0].message.content or "")
+    normalized = _normalize_insights(raw, fallback)
+    completion_cache.set(key, normalized)
+    return normalized
+
+
+# ---------------------------------------------------------------------------
+# Stale-while-revalidate: answer from cache or rules, upgrade in the background
+# ---------------------------------------------------------------------------
+
+INSIGHTS_JOBS_MAX_ENTRIES = 256
+# Long enough for clients polling /insights/status to see the outcome
+INSIGHTS_JOBS_TTL_SECONDS = 3600
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="insights")
+# username -> latest regeneration {"key", "fallback", "future"}; bounded since
+# usernames come straight from the query string
+_jobs = TTLCache(INSIGHTS_JOBS_MAX_ENTRIES, INSIGHTS_JOBS_TTL_SECONDS)
+_jobs_lock = threading.Lock()
+
+
+def _regenerate(summary: dict, gaps: list, fallback: dict) -> dict:
+    return _ai_insights(summary, gaps, fallback, use_cache=False)
+
+
+def _log_failure(username: str, future):
+    if future.exception():
+        logger.error(f"Background Groq call failed for {username}: {future.exception()}")
+
+
+def _schedule_regeneration(username: str, key: str, summary: dict, gaps: list, fallback: dict):
+    with _jobs_lock:
+        job = _jobs.get(username)
+        if job and job["key"] == key and not job["future"].done():
+            return
+        future = _executor.submit(_regenerate, summary, gaps, fallback)
+        future.add_done_callback(lambda f: _log_failure(username, f))
+        _jobs.set(username, {"key": key, "fallback": fallback, "future": future})
+
+
+def _insights_state(username: str, key: str, fallback: dict) -> dict:
+    """Best insights available right now, tagged with ``source`` and ``status``.
+
+    Only completions for these exact inputs are served; an expired one still
+    counts (``status`` says it is not fresh), anything else falls back to rules.
+    """
+    cached, fresh = completion_cache.get_stale(key)
+    if fresh:
+        return {**cached, "source": "ai+rules", "status": "fresh"}
+
+    job = _jobs.get(username)
+    if job is None or job["key"] != key:
+        status = "stale"
+    elif not job["future"].done():
+        status = "pending"
+    else:
+        status = "failed" if job["future"].exception() else "stale"
+
+    if cached:
+        return {**cached, "source": "ai+rules", "status": status}
+    return {**fallback, "source": "rules", "status": status}
+
+
+@router.get("/")
+@coalesce("insights")
+def get_insights(username: str = Query(default="my_brand"), swr: bool = Query(default=False)):
+    """AI insights with a rules-based fallback.
+
+    With ``swr=true`` the response never waits on Groq: it returns the cached
+    AI result (possibly stale) or the rules result, and regenerates in the
+    background. Poll ``/insights/status`` for the upgraded result.
+    """
+    with computation_context():
+        summary = build_summary(username=username)
+        gaps = get_gaps(username=username)
+    fallback = _default_insights(summary, gaps)
+
+    if not groq_client:
+        return {**fallback, "source": "rules"}
+
+    if swr:
+        key = _insights_key(summary, gaps)
+        state = _insights_state(username, key, fallback)
+        if state["status"] != "fresh":
+            _schedule_regeneration(username, key, summary, gaps, fallback)
+            state["status"] = "pending"
+        return state
+
+    try:
+        normalized = _ai_insights(summary, gaps, fallback)
         return {**normalized, "source": "ai+rules"}
     except Exception as e:
         logger.error(f"Groq call failed: {e}")
         return {**fallback, "source": "rules"}
 
 
+@router.get("/status")
+def get_insights_status(username: str = Query(default="my_brand")):
+    """Latest insights for the most recent ``swr`` request, without touching the database."""
+    job = _jobs.get(username)
+    if job is None:
+        return {"status": "idle"}
+    return _insights_state(username, job["key"], job["fallback"])
+
+
 @router.get("/workflows")
 def get_workflows(username: str = Query(default="my_brand")):
-    summary = build_summary(username=username)
-    gaps = get_gaps(username=username)
+    with computation_context():
+        summary = build_summary(username=username)
+        gaps = get_gaps(username=username)
 
     workflows = []
 
@@ -4,6 +4,7 @@ from io import StringIO, BytesIO
 import csv
 from datetime import datetime
 
+from app.datasets import computation_context
 from app.routers.analytics import (
     get_summary,
     get_follower_growth,
@@ -216,9 +217,10 @@ def export_dashboard_csv() -> StreamingResponse:
     This reuses the existing analytics functions so the numbers
     match what you see in the UI.
     """
-    summary = get_summary()
-    followers = get_follower_growth()
-    content_types = get_content_types()
+    with computation_context():
+        summary = get_summary()
+        followers = get_follower_growth()
+        content_types = get_content_types()
 
     buffer = StringIO()
     writer = csv.writer(buffer)
@@ -260,9 +262,10 @@ def export_competitors_csv() -> StreamingResponse:
     Uses the same underlying functions as the Competitors page,
     so the report matches what you see in the charts/table.
     """
-    comps = compare_competitors()
-    growth_series = competitor_growth()
-    gaps = get_gaps()
+    with computation_context():
+        comps = compare_competitors()
+        growth_series = competitor_growth()
+        gaps = get_gaps()
 
     buffer = StringIO()
     writer = csv.writer(buffer)
@@ -271,8 +274,8 @@ def export_competitors_csv() -> StreamingResponse:
     writer.writerow(["Name", "Follower Count", "Avg Engagement"])
     for row in comps:
         writer.writerow([
-            row["username"],
-            row["follower_count"],
+            row["name"],
+            row["followers"],
             row["avg_engagement"],
         ])
 
@@ -290,14 +293,14 @@ def export_competitors_csv() -> StreamingResponse:
         "Competitor",
         "Their Top Content",
         "Your Usage",
-        "Suggested Extra Posts",
+        "Gap Score (%)",
     ])
     for gap in gaps:
         writer.writerow([
             gap["competitor"],
-            gap["their_top_content"],
-            gap["your_usage"],
-            gap["gap"],
+            gap["top_content_type"],
+            gap["my_usage"],
+            gap["gap_score"],
         ])
 
     buffer.seek(0)
@@ -321,10 +324,11 @@ def export_dashboard_pdf() -> StreamingResponse:
             detail="PDF generation library is not installed on the server.",
         ) from exc
 
-    summary = get_summary()
-    followers = get_follower_growth()
-    content_types = get_content_types()
-    trend = get_trend_prediction()
+    with computation_context():
+        summary = get_summary()
+        followers = get_follower_growth()
+        content_types = get_content_types()
+        trend = get_trend_prediction()
 
     buffer = BytesIO()
     pdf = canvas.Canvas(buffer, pagesize=letter)
@@ -414,9 +418,10 @@ def export_competitors_pdf() -> StreamingResponse:
             detail="PDF generation library is not installed on the server.",
         ) from exc
 
-    comps = compare_competitors()
-    growth = competitor_growth()
-    gaps = get_gaps()
+    with computation_context():
+        comps = compare_competitors()
+        growth = competitor_growth()
+        gaps = get_gaps()
 
     buffer = BytesIO()
     pdf = canvas.Canvas(buffer, pagesize=letter)
@@ -428,8 +433,8 @@ def export_competitors_pdf() -> StreamingResponse:
     pdf.setFont("Helvetica", 10)
     pdf.drawRightString(width - margin, height - margin, datetime.now().strftime("%Y-%m-%d %H:%M"))
 
-    labels = [row.get("username", "N/A") for row in comps]
-    follower_values = [row.get("follower_count", 0) for row in comps]
+    labels = [row.get("name", "N/A") for row in comps]
+    follower_values = [row.get("followers", 0) for row in comps]
     engagement_values = [row.get("avg_engagement", 0) for row in comps]
 
     _draw_panel(pdf, margin, 390, width - (2 * margin), 190, "Follower Comparison")
@@ -450,8 +455,8 @@ def export_competitors_pdf() -> StreamingResponse:
     row_y = 230
     for gap in gaps[:6]:
         line = (
-            f"• {gap.get('competitor', 'N/A')} | top: {gap.get('their_top_content', 'N/A')} "
-            f"| your usage: {gap.get('your_usage', 0)} | gap: {gap.get('gap', 0)}"
+            f"• {gap.get('competitor', 'N/A')} | top: {gap.get('top_content_type', 'N/A')} "
+            f"| your usage: {gap.get('my_usage', 0)} | gap: {gap.get('gap_score', 0)}%"
         )
         pdf.drawString(margin + 12, row_y, line)
         row_y -= 22
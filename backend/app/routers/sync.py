@@ -1,18 +1,27 @@
-from fastapi import APIRouter, BackgroundTasks
+from fastapi import APIRouter, Body, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from datetime import datetime, timezone, timedelta
+import asyncio
 import httpx
 import os
 import time
 import logging
 
-from app.database import get_supabase_client, retry_on_disconnect
+from postgrest.exceptions import APIError
+
+from app.cache import bump_data_version
+from app.database import get_supabase_client, is_transient_error, retry_on_disconnect
+from app.datasets import load_roster, resolve_user_ids
+from app.jobs import get_job_store, submit_history_job
+from app.metrics import AsyncTimedTransport
+from app.ratelimit import rapidapi_bucket, retry_after_seconds
+from app.singleflight import coalesce
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/sync", tags=["sync"])
 
 RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY")
-APIFY_API_TOKEN = os.getenv("APIFY_API_TOKEN")
 
 RAPIDAPI_HOST = "instagram-scraper-stable-api.p.rapidapi.com"
 RAPIDAPI_HEADERS = {
@@ -20,6 +29,13 @@ RAPIDAPI_HEADERS = {
     "x-rapidapi-host": RAPIDAPI_HOST,
 }
 
+RAPIDAPI_TIMEOUT_SECONDS = float(os.getenv("RAPIDAPI_TIMEOUT_SECONDS", "20"))
+# Accounts synced at once by POST /sync/batch
+SYNC_BATCH_CONCURRENCY = int(os.getenv("SYNC_BATCH_CONCURRENCY", "4"))
+
+# Rows sent per posts upsert request
+POSTS_UPSERT_BATCH_SIZE = int(os.getenv("POSTS_UPSERT_BATCH_SIZE", "200"))
+
 MEDIA_TYPE_MAP = {
     1: "Post",
     2: "Reel",
@@ -28,103 +44,231 @@ MEDIA_TYPE_MAP = {
 
 
 # ---------------------------------------------------------------------------
-# Background task: Apify historical follower data (first sync only)
+# Posts: normalize RapidAPI items and upsert them in batches
 # ---------------------------------------------------------------------------
 
-def run_apify_historical(user_id: str, username: str):
-    supabase = get_supabase_client()
+def _post_rows(user_id: str, items):
+    """Yield a posts row for every RapidAPI item that has a pk."""
+    for item in items:
+        # Posts can be nested under "node" or flat
+        node = item.get("node", item)
+
+        # Use pk as platform_post_id
+        platform_post_id = str(node.get("pk", ""))
+        if not platform_post_id:
+            continue
+
+        media_type = node.get("media_type", 1)
+        content_type = MEDIA_TYPE_MAP.get(media_type, "Post")
 
-    try:
-        run_url = f"https://api.apify.com/v2/acts/radeance~socialblade-api/runs?token={APIFY_API_TOKEN}"
-        payload = {
-            "creators": [username],
-            "platform": "instagram",
-            "proxySettings": {
-                "useApifyProxy": True,
-                "apifyProxyGroups": ["RESIDENTIAL"],
-                "apifyProxyCountry": "US"
-            }
+        taken_at = node.get("taken_at")
+        posted_at = (
+            datetime.fromtimestamp(taken_at, tz=timezone.utc).isoformat()
+            if taken_at
+            else datetime.now(timezone.utc).isoformat()
+        )
+
+        yield {
+            "user_id": user_id,
+            "platform_post_id": platform_post_id,
+            "likes": node.get("like_count", 0),
+            "comments": node.get("comment_count", 0),
+            "shares": 0,
+            "content_type": content_type,
+            "posted_at": posted_at,
         }
 
-        logger.info(f"[Apify] Starting historical fetch for {username}")
-        with httpx.Client(timeout=30) as client:
-            run_resp = client.post(run_url, json=payload)
-            run_resp.raise_for_status()
-            run_id = run_resp.json()["data"]["id"]
-        logger.info(f"[Apify] Run started: {run_id}")
-
-        # Poll until finished (max 5 minutes)
-        status_resp = None
-        status_url = f"https://api.apify.com/v2/actor-runs/{run_id}?token={APIFY_API_TOKEN}"
-        for attempt in range(60):
-            time.sleep(5)
-            with httpx.Client(timeout=15) as client:
-                status_resp = client.get(status_url)
-                status_resp.raise_for_status()
-                status = status_resp.json()["data"]["status"]
-            logger.info(f"[Apify] Poll {attempt+1}/60 — status: {status}")
-            if status == "SUCCEEDED":
-                break
-            elif status in ("FAILED", "ABORTED", "TIMED-OUT"):
-                logger.error(f"[Apify] Run ended with status: {status}")
-                return
-        else:
-            logger.error("[Apify] Polling timed out after 5 minutes")
-            return
 
-        # Fetch dataset items
-        dataset_id = status_resp.json()["data"]["defaultDatasetId"]
-        dataset_url = f"https://api.apify.com/v2/datasets/{dataset_id}/items?token={APIFY_API_TOKEN}"
-        with httpx.Client(timeout=30) as client:
-            data_resp = client.get(dataset_url)
-            data_resp.raise_for_status()
-            items = data_resp.json()
-        logger.info(f"[Apify] Fetched {len(items)} items for {username}")
-        if items:
-            logger.info(f"[Apify] Sample item keys: {list(items[0].keys())}")
-
-        # The actor returns one item per creator.
-        # Daily history is nested in daily_growth: [{date, subscribers}, ...]
-        rows = []
-        for item in items:
-            daily = item.get("daily_growth") or []
-            if not daily:
-                logger.warning(f"[Apify] No daily_growth in item for {username}")
-                logger.info(f"[Apify] Item keys available: {list(item.keys())}")
-                continue
-            logger.info(f"[Apify] Found {len(daily)} daily_growth entries for {username}")
-            if daily:
-                logger.info(f"[Apify] Sample daily entry: {daily[0]}")
-            for entry in daily:
-                date_str = entry.get("date") or entry.get("day") or entry.get("Date")
-                followers = (
-                    entry.get("subscribers") or entry.get("followers")
-                    or entry.get("followerCount") or entry.get("followed_by")
-                )
-                if not date_str or followers is None:
-                    continue
-                date_str = str(date_str)[:10]
-                rows.append({"user_id": user_id, "follower_count": int(followers), "recorded_at": date_str})
-
-        if not rows:
-            logger.warning(f"[Apify] No usable rows parsed for {username}")
+def _post_batches(rows, size: int = POSTS_UPSERT_BATCH_SIZE):
+    """Group rows into batches of up to ``size`` unique platform_post_ids.
+
+    Postgres rejects an upsert that touches the same row twice, so a
+    repeated post inside a batch keeps only its latest version.
+    """
+    batch = {}
+    for row in rows:
+        batch[row["platform_post_id"]] = row
+        if len(batch) >= size:
+            yield list(batch.values())
+            batch = {}
+    if batch:
+        yield list(batch.values())
+
+
+@retry_on_disconnect()
+def _upsert_post_batch(batch: list):
+    get_supabase_client().table("posts").upsert(batch, on_conflict="platform_post_id").execute()
+
+
+def _upsert_posts(rows):
+    """Upsert rows one batch per request; returns ``(upserted, errors)``.
+
+    A rejected batch is reported and the rest still go through. Each batch
+    retries transient errors on its own; if they persist they propagate.
+    """
+    upserted = 0
+    errors = []
+    for index, batch in enumerate(_post_batches(rows)):
+        try:
+            _upsert_post_batch(batch)
+        except Exception as e:
+            if is_transient_error(e):
+                raise
+            logger.error(f"Posts batch {index} ({len(batch)} rows) failed: {e}")
+            errors.append({"batch": index, "rows": len(batch), "error": str(e)})
+            continue
+        upserted += len(batch)
+    return upserted, errors
+
+
+# ---------------------------------------------------------------------------
+# Shared RapidAPI client
+# ---------------------------------------------------------------------------
+
+_http_client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Keep-alive client shared by every sync so connections are reused."""
+    global _http_client
+    if _http_client is None:
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=SYNC_BATCH_CONCURRENCY * 2,
+                max_keepalive_connections=SYNC_BATCH_CONCURRENCY * 2,
+            ),
+        )
+        _http_client = httpx.AsyncClient(
+            timeout=RAPIDAPI_TIMEOUT_SECONDS,
+            transport=AsyncTimedTransport("rapidapi", transport),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def _fetch_profile(client: httpx.AsyncClient, username: str) -> dict:
+    rapidapi_bucket.consume()
+    resp = await client.get(
+        f"https://{RAPIDAPI_HOST}/ig_get_fb_profile_hover.php",
+        headers=RAPIDAPI_HEADERS,
+        params={"username_or_url": username},
+    )
+    resp.raise_for_status()
+    return resp.json().get("user_data", {})
+
+
+async def _fetch_posts(client: httpx.AsyncClient, username: str) -> list:
+    rapidapi_bucket.consume()
+    resp = await client.post(
+        f"https://{RAPIDAPI_HOST}/get_ig_user_posts.php",
+        headers={**RAPIDAPI_HEADERS, "Content-Type": "application/x-www-form-urlencoded"},
+        data={"username_or_url": username},
+    )
+    resp.raise_for_status()
+    return resp.json().get("posts", [])
+
+
+def _rate_limited(username: str, response: httpx.Response, note: str) -> dict:
+    """Hold back every RapidAPI caller for the server's Retry-After and report it."""
+    retry_after = retry_after_seconds(response)
+    rapidapi_bucket.pause(retry_after)
+    return {"status": "rate_limited", "username": username, "note": note, "retry_after": retry_after}
+
+
+# ---------------------------------------------------------------------------
+# Database steps (blocking supabase calls, run in the threadpool). Each one
+# retries on its own and borrows a fresh client per attempt, so a dropped
+# connection never repeats the RapidAPI calls around it.
+# ---------------------------------------------------------------------------
+
+@retry_on_disconnect()
+def _find_or_create_user(username: str) -> dict:
+    supabase = get_supabase_client()
+    user_resp = (
+        supabase.table("users")
+        .select("id, instagram_id, last_synced_at")
+        .eq("username", username)
+        .execute()
+    )
+    if user_resp.data:
+        return user_resp.data[0]
+
+    insert_resp = (
+        supabase.table("users")
+        .insert({"username": username, "platform": "Instagram"})
+        .execute()
+    )
+    return insert_resp.data[0]
+
+
+# on_conflict target with no such column (before migration 0001) or no
+# unique index on it (before 0002)
+_MISSING_CONFLICT_TARGET_CODES = {"42703", "42P10"}
+_day_upsert_available = True
+
+
+def _save_daily_snapshot(supabase, user_id: str, follower_count: int):
+    """Record today's follower snapshot; a re-sync on the same day replaces it."""
+    global _day_upsert_available
+    now = datetime.now(timezone.utc)
+    row = {"user_id": user_id, "follower_count": follower_count, "recorded_at": now.isoformat()}
+    if _day_upsert_available:
+        try:
+            supabase.table("follower_metrics").upsert(row, on_conflict="user_id,recorded_day").execute()
             return
+        except APIError as e:
+            if str(e.code) not in _MISSING_CONFLICT_TARGET_CODES:
+                raise
+            logger.warning(
+                "follower_metrics has no unique (user_id, recorded_day) index, run app/migrate.py; "
+                "updating today's snapshot with separate queries until then"
+            )
+            _day_upsert_available = False
+
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    today = (
+        supabase.table("follower_metrics").select("id")
+        .eq("user_id", user_id)
+        .gte("recorded_at", day_start.isoformat())
+        .lt("recorded_at", (day_start + timedelta(days=1)).isoformat())
+        .limit(1)
+        .execute()
+    ).data
+    if today:
+        supabase.table("follower_metrics").update(
+            {"follower_count": follower_count, "recorded_at": row["recorded_at"]}
+        ).eq("id", today[0]["id"]).execute()
+    else:
+        supabase.table("follower_metrics").insert(row).execute()
+
+
+@retry_on_disconnect()
+def _record_profile(user: dict, username: str, about_data: dict) -> int:
+    supabase = get_supabase_client()
+    follower_count = about_data.get("follower_count", 0)
+    instagram_id = str(about_data.get("pk", ""))
 
-        # Fetch which dates already exist so we don't duplicate
-        existing = supabase.table("follower_metrics") \
-            .select("recorded_at") \
-            .eq("user_id", user_id).execute()
-        existing_dates = {r["recorded_at"][:10] for r in (existing.data or [])}
+    # Save instagram_id to users table if not already stored
+    if instagram_id and not user.get("instagram_id"):
+        supabase.table("users").update({"instagram_id": instagram_id}).eq("id", user["id"]).execute()
 
-        new_rows = [r for r in rows if r["recorded_at"] not in existing_dates]
-        logger.info(f"[Apify] Inserting {len(new_rows)} new rows ({len(rows) - len(new_rows)} already exist)")
+    _save_daily_snapshot(supabase, user["id"], follower_count)
+    bump_data_version(username)
+    return follower_count
 
-        if new_rows:
-            supabase.table("follower_metrics").insert(new_rows).execute()
-            logger.info(f"[Apify] Done — inserted {len(new_rows)} rows for {username}")
 
-    except Exception as e:
-        logger.error(f"[Apify] Failed for {username}: {e}")
+@retry_on_disconnect()
+def _mark_synced(user_id: str, username: str):
+    get_supabase_client().table("users").update({
+        "last_synced_at": datetime.now(timezone.utc).isoformat()
+    }).eq("id", user_id).execute()
+    bump_data_version(username)
 
 
 # ---------------------------------------------------------------------------
@@ -142,30 +286,25 @@ FAKE_POSTS = [
 ]
 
 
-@router.post("/{username}")
-@retry_on_disconnect()
-def sync_user(username: str, background_tasks: BackgroundTasks, dry_run: bool = False, fetch_history: bool = False):
-    supabase = get_supabase_client()
+def _sync_key(username: str, dry_run: bool = False, fetch_history: bool = False, client=None):
+    return username, dry_run, fetch_history
+
 
+# Concurrent syncs of one account (manual, batch, scheduler) share a single run.
+# Only the database steps retry: a RapidAPI call is spent quota, so its
+# failures surface (429s through _rate_limited) instead of being repeated.
+@coalesce("sync", key=_sync_key)
+async def sync_account(
+    username: str,
+    dry_run: bool = False,
+    fetch_history: bool = False,
+    client: httpx.AsyncClient = None,
+) -> dict:
+    """Sync one account's profile and posts from RapidAPI into Supabase."""
     # -----------------------------------------------------------------------
     # STEP 1 — Find or create user
     # -----------------------------------------------------------------------
-    user_resp = (
-        supabase.table("users")
-        .select("id, instagram_id, last_synced_at")
-        .eq("username", username)
-        .execute()
-    )
-    user = user_resp.data[0] if user_resp.data else None
-
-    if not user:
-        insert_resp = (
-            supabase.table("users")
-            .insert({"username": username, "platform": "Instagram"})
-            .execute()
-        )
-        user = insert_resp.data[0]
-
+    user = await run_in_threadpool(_find_or_create_user, username)
     user_id = user["id"]
     is_first_sync = user.get("last_synced_at") is None
 
@@ -173,11 +312,12 @@ def sync_user(username: str, background_tasks: BackgroundTasks, dry_run: bool =
     # fetch_history=True — skip RapidAPI entirely, only run Apify for user + all competitors
     # -----------------------------------------------------------------------
     if fetch_history:
-        background_tasks.add_task(run_apify_historical, user_id, username)
+        job = await run_in_threadpool(submit_history_job, user_id, username)
         return {
             "status": "success",
             "username": username,
-            "apify_historical": "running in background",
+            "apify_historical": job["status"],
+            "history_job_id": job["id"],
         }
 
     # -----------------------------------------------------------------------
@@ -187,32 +327,13 @@ def sync_user(username: str, background_tasks: BackgroundTasks, dry_run: bool =
         about_data = FAKE_PROFILE
     else:
         try:
-            with httpx.Client(timeout=20) as client:
-                about_resp = client.get(
-                    "https://instagram-scraper-stable-api.p.rapidapi.com/ig_get_fb_profile_hover.php",
-                    headers=RAPIDAPI_HEADERS,
-                    params={"username_or_url": username},
-                )
-                about_resp.raise_for_status()
-            about_data = about_resp.json().get("user_data", {})
+            about_data = await _fetch_profile(client or get_http_client(), username)
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 429:
-                return {"status": "rate_limited", "username": username, "note": "RapidAPI rate limit hit — follower data not updated, try again later"}
+                return _rate_limited(username, e.response, "RapidAPI rate limit hit — follower data not updated, try again later")
             raise
 
-    follower_count = about_data.get("follower_count", 0)
-    instagram_id = str(about_data.get("pk", ""))
-
-    # Save instagram_id to users table if not already stored
-    if instagram_id and not user.get("instagram_id"):
-        supabase.table("users").update({"instagram_id": instagram_id}).eq("id", user_id).execute()
-
-    # Insert current follower snapshot
-    supabase.table("follower_metrics").insert({
-        "user_id": user_id,
-        "follower_count": follower_count,
-        "recorded_at": datetime.now(timezone.utc).isoformat(),
-    }).execute()
+    follower_count = await run_in_threadpool(_record_profile, user, username, about_data)
 
     # -----------------------------------------------------------------------
     # STEP 3 — RapidAPI: User Posts
@@ -221,72 +342,92 @@ def sync_user(username: str, background_tasks: BackgroundTasks, dry_run: bool =
         items = FAKE_POSTS
     else:
         try:
-            with httpx.Client(timeout=20) as client:
-                posts_resp = client.post(
-                    "https://instagram-scraper-stable-api.p.rapidapi.com/get_ig_user_posts.php",
-                    headers={**RAPIDAPI_HEADERS, "Content-Type": "application/x-www-form-urlencoded"},
-                    data={"username_or_url": username},
-                )
-                posts_resp.raise_for_status()
-            items = posts_resp.json().get("posts", [])
+            items = await _fetch_posts(client or get_http_client(), username)
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 429:
-                return {"status": "rate_limited", "username": username, "note": "RapidAPI rate limit hit — posts not updated, try again later"}
+                return _rate_limited(username, e.response, "RapidAPI rate limit hit — posts not updated, try again later")
             raise
 
-    upserted = 0
-    for item in items:
-        # Posts can be nested under "node" or flat
-        node = item.get("node", item)
-
-        # Use pk as platform_post_id
-        platform_post_id = str(node.get("pk", ""))
-        if not platform_post_id:
-            continue
-
-        media_type = node.get("media_type", 1)
-        content_type = MEDIA_TYPE_MAP.get(media_type, "Post")
-
-        taken_at = node.get("taken_at")
-        posted_at = (
-            datetime.fromtimestamp(taken_at, tz=timezone.utc).isoformat()
-            if taken_at
-            else datetime.now(timezone.utc).isoformat()
-        )
-
-        row = {
-            "user_id": user_id,
-            "platform_post_id": platform_post_id,
-            "likes": node.get("like_count", 0),
-            "comments": node.get("comment_count", 0),
-            "shares": 0,
-            "content_type": content_type,
-            "posted_at": posted_at,
-        }
-
-        supabase.table("posts").upsert(
-            row, on_conflict="platform_post_id"
-        ).execute()
-        upserted += 1
+    upserted, post_errors = await run_in_threadpool(_upsert_posts, _post_rows(user_id, items))
 
     # -----------------------------------------------------------------------
     # STEP 4 — Update last_synced_at
     # -----------------------------------------------------------------------
-    supabase.table("users").update({
-        "last_synced_at": datetime.now(timezone.utc).isoformat()
-    }).eq("id", user_id).execute()
+    await run_in_threadpool(_mark_synced, user_id, username)
 
     # -----------------------------------------------------------------------
     # STEP 5 — Kick off Apify historical data if first sync OR forced
     # -----------------------------------------------------------------------
     should_fetch_history = is_first_sync or fetch_history
-    if should_fetch_history:
-        background_tasks.add_task(run_apify_historical, user_id, username)
+    job = await run_in_threadpool(submit_history_job, user_id, username) if should_fetch_history else None
 
     return {
         "status": "success",
         "username": username,
         "follower_count": follower_count,
         "posts_upserted": upserted,
-        "apify_historical": "running in background" if should_fetch_history else "skipped",
+        "post_errors": post_errors,
+        "apify_historical": job["status"] if job else "skipped",
+        "history_job_id": job["id"] if job else None,
     }
+
+
+@retry_on_disconnect()
+def _load_batch_roster(owner_username: str):
+    """``(owner_id, roster)`` for a batch sync, or ``(None, [])`` for an unknown owner."""
+    supabase = get_supabase_client()
+    owner_id = resolve_user_ids(supabase, [owner_username]).get(owner_username)
+    if not owner_id:
+        return None, []
+    return owner_id, load_roster(supabase, owner_id)
+
+
+# Declared before "/{username}" so "batch" is not taken for a username
+@router.post("/batch")
+async def sync_batch(
+    owner_username: str = Body(..., embed=True),
+    dry_run: bool = False,
+):
+    """Sync an owner and all of their competitors concurrently.
+
+    Accounts share one pooled HTTP client and at most
+    SYNC_BATCH_CONCURRENCY run at once; a failing account is reported in
+    its own result without affecting the others.
+    """
+    owner_id, roster = await run_in_threadpool(_load_batch_roster, owner_username)
+    if not owner_id:
+        raise HTTPException(status_code=400, detail="Owner user not found")
+
+    usernames = list(dict.fromkeys([owner_username, *(c["username"] for c in roster)]))
+    client = None if dry_run else get_http_client()
+    semaphore = asyncio.Semaphore(SYNC_BATCH_CONCURRENCY)
+
+    async def run(username: str) -> dict:
+        async with semaphore:
+            try:
+                return await sync_account(username, dry_run=dry_run, client=client)
+            except Exception as e:
+                logger.error(f"Batch sync failed for {username}: {e}")
+                return {"status": "error", "username": username, "error": str(e)}
+
+    started = time.monotonic()
+    results = await asyncio.gather(*(run(name) for name in usernames))
+    return {
+        "owner_username": owner_username,
+        "elapsed_seconds": round(time.monotonic() - started, 2),
+        "results": results,
+    }
+
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status of an Apify history backfill started by a sync."""
+    job = get_job_store().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/{username}")
+async def sync_user(username: str, dry_run: bool = False, fetch_history: bool = False):
+    return await sync_account(username, dry_run=dry_run, fetch_history=fetch_history)
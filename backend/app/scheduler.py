@@ -0,0 +1,135 @@
+"""Background refresh of every tracked account within the RapidAPI quota.
+
+Accounts sit in a min-heap keyed on ``users.last_synced_at`` so the stalest
+one goes first. An account is due once it is SYNC_INTERVAL_SECONDS old; each
+sync waits for two tokens in ``rapidapi_bucket``, which refills at the daily
+quota spread evenly over the day and is paused by any Retry-After. Manual
+syncs draw from the same bucket, so the scheduler backs off after them.
+
+Runs inside the API process and is opt-in: set SYNC_SCHEDULER_ENABLED=true
+(it also needs RAPIDAPI_KEY). The quota bucket lives in process memory, so
+run it in exactly one uvicorn worker; every worker that has it enabled
+spends the full daily quota on its own.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.database import get_supabase_client
+from app.engine import parse_timestamp
+from app.ratelimit import rapidapi_bucket
+from app.routers.sync import RAPIDAPI_KEY, sync_account
+
+logger = logging.getLogger(__name__)
+
+# Off unless asked for: it spends paid quota in the background
+SYNC_SCHEDULER_ENABLED = os.getenv("SYNC_SCHEDULER_ENABLED", "false").lower() == "true"
+# How old an account's data may get before it is refreshed
+SYNC_INTERVAL_SECONDS = float(os.getenv("SYNC_INTERVAL_SECONDS", str(6 * 3600)))
+# How often the queue is rebuilt from the users table (new accounts, manual syncs)
+SYNC_QUEUE_REFRESH_SECONDS = float(os.getenv("SYNC_QUEUE_REFRESH_SECONDS", "300"))
+
+REQUESTS_PER_SYNC = 2
+
+
+def _load_accounts() -> list:
+    # Runs in the threadpool: building a client can probe the pool's health
+    res = get_supabase_client().table("users").select("username, last_synced_at").execute()
+    return [
+        (parse_timestamp(r["last_synced_at"]).timestamp() if r.get("last_synced_at") else 0.0, r["username"])
+        for r in (res.data or [])
+    ]
+
+
+class SyncScheduler:
+    clock = time.time
+
+    def __init__(self, bucket=rapidapi_bucket, interval: float = SYNC_INTERVAL_SECONDS,
+                 refresh_seconds: float = SYNC_QUEUE_REFRESH_SECONDS):
+        self.bucket = bucket
+        self.interval = interval
+        self.refresh_seconds = refresh_seconds
+        self._heap = []
+        self._next_refresh = 0.0
+
+    def load(self, accounts):
+        """Rebuild the queue from ``(last_synced_ts, username)`` pairs."""
+        self._heap = list(accounts)
+        heapq.heapify(self._heap)
+        self._next_refresh = self.clock() + self.refresh_seconds
+
+    def push(self, last_synced: float, username: str):
+        heapq.heappush(self._heap, (last_synced, username))
+
+    def next_due(self):
+        """``(seconds until due, username)`` for the stalest account, or None."""
+        if not self._heap:
+            return None
+        last_synced, username = self._heap[0]
+        return max(0.0, last_synced + self.interval - self.clock()), username
+
+    async def _refresh(self):
+        self.load(await run_in_threadpool(_load_accounts))
+        logger.info(f"[Scheduler] Queue rebuilt with {len(self._heap)} accounts")
+
+    async def run_once(self):
+        """Sync the stalest account if it is due, otherwise sleep until something changes."""
+        now = self.clock()
+        if now >= self._next_refresh:
+            await self._refresh()
+
+        due = self.next_due()
+        if due is None or due[0] > 0:
+            wait = self._next_refresh - self.clock()
+            if due is not None:
+                wait = min(wait, due[0])
+            await asyncio.sleep(max(wait, 1.0))
+            return
+
+        # sync_account consumes the tokens as it calls RapidAPI
+        await self.bucket.wait(REQUESTS_PER_SYNC)
+        last_synced, username = heapq.heappop(self._heap)
+        try:
+            result = await sync_account(username)
+        except Exception as e:
+            logger.error(f"[Scheduler] Sync failed for {username}: {e}")
+            self.push(self.clock(), username)
+            return
+
+        if result.get("status") == "rate_limited":
+            # The bucket is paused for Retry-After; keep this account at the front
+            self.push(last_synced, username)
+        else:
+            self.push(self.clock(), username)
+        logger.info(f"[Scheduler] {username}: {result.get('status')}")
+
+    async def run(self):
+        logger.info(
+            f"[Scheduler] Started: interval {self.interval:.0f}s, "
+            f"{self.bucket.rate * 86400:.0f} RapidAPI requests/day"
+        )
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[Scheduler] Loop error: {e}")
+                await asyncio.sleep(self.refresh_seconds)
+
+
+scheduler = SyncScheduler()
+
+
+def start_scheduler():
+    """Start the background loop if enabled; returns its task (or None)."""
+    if not SYNC_SCHEDULER_ENABLED:
+        return None
+    if not RAPIDAPI_KEY:
+        logger.warning("SYNC_SCHEDULER_ENABLED is set but RAPIDAPI_KEY is not, scheduler not started")
+        return None
+    return asyncio.create_task(scheduler.run())
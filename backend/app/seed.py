@@ -1,85 +1,460 @@
+"""Generate synthetic brands, competitors and their history.
+
+    python app/seed.py                                   my_brand + 3 competitors, 90 days
+    python app/seed.py --brands 2500 --competitors 3 --years 2 --seed 7
+    python app/seed.py --brands 100 --output seed_data   write CSV files instead of inserting
+
+Every tracked account (brand or competitor) gets a users row, a daily
+follower series and posts; each brand also gets its competitor roster and
+daily competitor_metrics. Series are generated with NumPy per account from a
+generator seeded by ``(seed, account index)``, so the same arguments always
+produce the same data, whatever the chunk size or concurrency.
+
+Rows go to Supabase in chunked bulk inserts over a few threads. An
+interrupted run can be started again with the same arguments: brands that
+are fully stored are skipped, and brands the interrupted run only partly
+wrote are deleted (their child rows cascade) and written again. Brands whose
+accounts exist with other ids (other arguments, or synced accounts) are
+left alone. --end-date defaults to today and is printed, so pass it
+explicitly to reproduce a run on another day. With --output, one CSV per table is written for offline use
+(``\\copy <table> from '<table>.csv' csv header``).
+"""
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from faker import Faker
-from datetime import datetime, timedelta
-import random
-from app.database import supabase
+import argparse
+import csv
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
 
-fake = Faker()
+import numpy as np
+from postgrest.types import CountMethod, ReturnMethod
+
+from app.database import get_supabase_client, retry_on_disconnect
 
 CONTENT_TYPES = ["Reel", "Post", "Carousel", "Story"]
-PLATFORMS = ["Instagram"]
-
-def seed():
-    print("Seeding database...")
-
-    # Create main user
-    user = supabase.table("users").insert({
-        "username": "my_brand",
-        "platform": "Instagram"
-    }).execute()
-    user_id = user.data[0]["id"]
-    print(f"Created user: {user_id}")
-
-    # Generate 90 days of follower metrics
-    base_followers = 20000
-    for i in range(90):
-        date = datetime.now() - timedelta(days=90 - i)
-        base_followers += random.randint(50, 300)
-        supabase.table("follower_metrics").insert({
-            "user_id": user_id,
-            "follower_count": base_followers,
-            "recorded_at": date.isoformat()
-        }).execute()
-
-    print("Follower metrics seeded")
-
-    # Generate 90 days of posts
-    for i in range(90):
-        date = datetime.now() - timedelta(days=90 - i)
-        num_posts = random.randint(0, 3)
-        for _ in range(num_posts):
-            content_type = random.choice(CONTENT_TYPES)
-            multiplier = 1.5 if content_type == "Reel" else 1.0
-            supabase.table("posts").insert({
-                "user_id": user_id,
-                "content_type": content_type,
-                "likes": int(random.randint(200, 1500) * multiplier),
-                "comments": int(random.randint(10, 200) * multiplier),
-                "shares": int(random.randint(5, 100) * multiplier),
-                "posted_at": date.isoformat()
-            }).execute()
-
-    print("Posts seeded")
-
-    # Create 3 competitors
-    competitor_names = ["brand_alpha", "brand_beta", "brand_gamma"]
-    for name in competitor_names:
-        comp = supabase.table("competitors").insert({
-            "owner_id": user_id,
-            "username": name,
-            "platform": "Instagram"
-        }).execute()
-        comp_id = comp.data[0]["id"]
-
-        base_comp_followers = random.randint(18000, 35000)
-        for i in range(90):
-            date = datetime.now() - timedelta(days=90 - i)
-            base_comp_followers += random.randint(30, 400)
-            supabase.table("competitor_metrics").insert({
-                "competitor_id": comp_id,
-                "follower_count": base_comp_followers,
-                "avg_likes": random.randint(150, 2000),
-                "avg_comments": random.randint(10, 300),
-                "avg_shares": random.randint(5, 150),
-                "top_content_type": random.choice(CONTENT_TYPES),
-                "recorded_at": date.isoformat()
-            }).execute()
-
-    print("Competitors seeded")
-    print("Done...")
+# Engagement multiplier per content type, in CONTENT_TYPES order
+CONTENT_TYPE_MULTIPLIERS = np.array([1.5, 1.0, 1.2, 0.6])
+PLATFORM = "Instagram"
+
+SEED_CHUNK_SIZE = int(os.getenv("SEED_CHUNK_SIZE", "1000"))
+SEED_WORKERS = int(os.getenv("SEED_WORKERS", "4"))
+SEED_PROGRESS_SECONDS = 2.0
+# Values per in.() filter when checking existing rows; keeps request URLs short
+SEED_FILTER_CHUNK = 200
+
+TABLE_COLUMNS = {
+    "users": ["id", "username", "platform"],
+    "competitors": ["id", "owner_id", "username", "platform"],
+    "follower_metrics": ["user_id", "follower_count", "recorded_at"],
+    "posts": ["user_id", "content_type", "likes", "comments", "shares", "posted_at"],
+    "competitor_metrics": [
+        "competitor_id", "follower_count", "avg_likes", "avg_comments",
+        "avg_shares", "top_content_type", "recorded_at",
+    ],
+}
+
+
+# ---------------------------------------------------------------------------
+# Generation
+# ---------------------------------------------------------------------------
+
+def brand_names(brands: int) -> list:
+    return ["my_brand"] + [f"brand_{i:05d}" for i in range(1, brands)]
+
+
+def account_usernames(brand: str, competitors: int) -> list:
+    """The brand followed by its competitors."""
+    return [brand] + [f"{brand}_competitor_{j}" for j in range(1, competitors + 1)]
+
+
+def _rng(seed: int, index: int):
+    return np.random.default_rng([seed, index])
+
+
+def _uuid(rng) -> str:
+    return str(uuid.UUID(bytes=rng.bytes(16), version=4))
+
+
+def _timestamps(start: date, days: np.ndarray, seconds: np.ndarray = None) -> np.ndarray:
+    """ISO-8601 UTC timestamps ``days`` (+ ``seconds``) after ``start``."""
+    ts = np.datetime64(start, "s") + days.astype("timedelta64[D]")
+    if seconds is not None:
+        ts = ts + seconds.astype("timedelta64[s]")
+    return np.char.add(ts.astype(str), "+00:00")
+
+
+def follower_series(rng, days: int) -> np.ndarray:
+    """Daily follower counts: a log-normal starting audience on a noisy growth trend."""
+    start = rng.lognormal(np.log(20000), 1.0)
+    growth = rng.normal(0.002, 0.0015)
+    log_steps = rng.normal(growth, 0.004, days)
+    return np.maximum(np.round(start * np.exp(np.cumsum(log_steps))), 0).astype(np.int64)
+
+
+def post_columns(rng, followers: np.ndarray) -> dict:
+    """Posts for one account as columns: day index, seconds into the day, type and engagement."""
+    days = len(followers)
+    per_day = rng.poisson(rng.uniform(0.3, 2.0), days)
+    day = np.repeat(np.arange(days), per_day)
+    n = len(day)
+    type_mix = rng.dirichlet(np.ones(len(CONTENT_TYPES)))
+    content_type = rng.choice(len(CONTENT_TYPES), size=n, p=type_mix)
+    # Likes scale with audience and content type; comments and shares with likes
+    rate = rng.lognormal(np.log(0.03), 0.4)
+    likes = followers[day] * rate * CONTENT_TYPE_MULTIPLIERS[content_type] * rng.lognormal(0.0, 0.5, n)
+    return {
+        "day": day,
+        "second": rng.integers(0, 86400, n),
+        "content_type": content_type,
+        "likes": np.round(likes).astype(np.int64),
+        "comments": np.round(likes * rng.uniform(0.02, 0.08, n)).astype(np.int64),
+        "shares": np.round(likes * rng.uniform(0.005, 0.04, n)).astype(np.int64),
+    }
+
+
+def _daily_means(day: np.ndarray, values: np.ndarray, days: int) -> np.ndarray:
+    """Mean of ``values`` per day; days without posts carry the overall mean."""
+    counts = np.bincount(day, minlength=days)
+    totals = np.bincount(day, weights=values, minlength=days)
+    fallback = values.mean() if len(values) else 0
+    return np.round(np.where(counts > 0, totals / np.maximum(counts, 1), fallback)).astype(np.int64)
+
+
+def _account(seed: int, index: int, days: int):
+    """``(user_id, roster_id, followers, posts)`` for one account.
+
+    ``roster_id`` is the competitors row id used if the account is a competitor.
+    """
+    rng = _rng(seed, index)
+    user_id = _uuid(rng)
+    roster_id = _uuid(rng)
+    followers = follower_series(rng, days)
+    return user_id, roster_id, followers, post_columns(rng, followers)
+
+
+def account_rows(seed: int, index: int, username: str, start: date, days: int) -> dict:
+    """Users, follower_metrics and posts rows for one account, plus its columns."""
+    user_id, roster_id, followers, posts = _account(seed, index, days)
+
+    recorded_at = _timestamps(start, np.arange(days)).tolist()
+    posted_at = _timestamps(start, posts["day"], posts["second"])
+    order = np.argsort(posted_at, kind="stable")
+    types = np.array(CONTENT_TYPES)[posts["content_type"]]
+
+    return {
+        "user_id": user_id,
+        "roster_id": roster_id,
+        "followers": followers,
+        "posts": posts,
+        "recorded_at": recorded_at,
+        "users": [{"id": user_id, "username": username, "platform": PLATFORM}],
+        "follower_metrics": [
+            {"user_id": user_id, "follower_count": f, "recorded_at": ts}
+            for f, ts in zip(followers.tolist(), recorded_at)
+        ],
+        "posts_rows": [
+            {"user_id": user_id, "content_type": ct, "likes": lk, "comments": cm, "shares": sh, "posted_at": ts}
+            for ct, lk, cm, sh, ts in zip(
+                types[order].tolist(), posts["likes"][order].tolist(), posts["comments"][order].tolist(),
+                posts["shares"][order].tolist(), posted_at[order].tolist(),
+            )
+        ],
+    }
+
+
+def competitor_metric_rows(competitor_id: str, account: dict) -> list:
+    """Daily competitor_metrics derived from the competitor's own posts."""
+    posts = account["posts"]
+    days = len(account["followers"])
+    means = [_daily_means(posts["day"], posts[col], days).tolist() for col in ("likes", "comments", "shares")]
+    counts = np.bincount(posts["content_type"], minlength=len(CONTENT_TYPES))
+    top = CONTENT_TYPES[int(counts.argmax())]
+    return [
+        {
+            "competitor_id": competitor_id,
+            "follower_count": f,
+            "avg_likes": lk,
+            "avg_comments": cm,
+            "avg_shares": sh,
+            "top_content_type": top,
+            "recorded_at": ts,
+        }
+        for f, lk, cm, sh, ts in zip(account["followers"].tolist(), *means, account["recorded_at"])
+    ]
+
+
+def brand_rows(seed: int, brand_index: int, brand: str, competitors: int, start: date, days: int) -> dict:
+    """Every row for one brand and its competitors, keyed by table."""
+    stride = competitors + 1
+    rows = {table: [] for table in TABLE_COLUMNS}
+    owner = None
+    for j, username in enumerate(account_usernames(brand, competitors)):
+        account = account_rows(seed, brand_index * stride + j, username, start, days)
+        rows["users"] += account["users"]
+        rows["follower_metrics"] += account["follower_metrics"]
+        rows["posts"] += account["posts_rows"]
+        if j == 0:
+            owner = account["user_id"]
+            continue
+        competitor_id = account["roster_id"]
+        rows["competitors"].append({"id": competitor_id, "owner_id": owner, "username": username, "platform": PLATFORM})
+        rows["competitor_metrics"] += competitor_metric_rows(competitor_id, account)
+    return rows
+
+
+def brand_manifest(seed: int, brand_index: int, brand: str, competitors: int, days: int) -> dict:
+    """Ids and row counts ``brand_rows`` produces for one brand, without building the rows.
+
+    ``filters`` maps each child table to the column and ids its rows hang off.
+    """
+    stride = competitors + 1
+    users = {}
+    competitor_ids = []
+    posts = 0
+    for j, username in enumerate(account_usernames(brand, competitors)):
+        user_id, roster_id, _, account_posts = _account(seed, brand_index * stride + j, days)
+        users[username] = user_id
+        posts += len(account_posts["day"])
+        if j:
+            competitor_ids.append(roster_id)
+    user_ids = list(users.values())
+    return {
+        "users": users,
+        "filters": {
+            "competitors": ("owner_id", user_ids[:1]),
+            "follower_metrics": ("user_id", user_ids),
+            "posts": ("user_id", user_ids),
+            "competitor_metrics": ("competitor_id", competitor_ids),
+        },
+        "counts": {
+            "competitors": competitors,
+            "follower_metrics": days * stride,
+            "posts": posts,
+            "competitor_metrics": days * competitors,
+        },
+    }
+
+
+# ---------------------------------------------------------------------------
+# Sinks
+# ---------------------------------------------------------------------------
+
+class CsvSink:
+    """One CSV file per table under ``directory``."""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._files = {}
+        self._writers = {}
+        for table, columns in TABLE_COLUMNS.items():
+            f = open(self.directory / f"{table}.csv", "w", newline="")
+            self._files[table] = f
+            self._writers[table] = csv.DictWriter(f, fieldnames=columns)
+            self._writers[table].writeheader()
+
+    def existing_users(self, usernames) -> dict:
+        return {}
+
+    def write(self, rows: dict):
+        for table, table_rows in rows.items():
+            self._writers[table].writerows(table_rows)
+        return sum(len(r) for r in rows.values())
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+
+class SupabaseSink:
+    """Chunked bulk inserts, a few chunks in flight at a time.
+
+    Parent rows (users, competitors) are inserted before the rows that
+    reference them.
+    """
+
+    def __init__(self, chunk_size: int = SEED_CHUNK_SIZE, workers: int = SEED_WORKERS):
+        self.chunk_size = chunk_size
+        self._client = get_supabase_client
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._insert = retry_on_disconnect()(self._insert_chunk)
+
+    def _insert_chunk(self, table: str, chunk: list):
+        self._client().table(table).insert(chunk, returning=ReturnMethod.minimal).execute()
+
+    def existing_users(self, usernames) -> dict:
+        """username -> id for the usernames already stored."""
+        found = {}
+        for i in range(0, len(usernames), SEED_FILTER_CHUNK):
+            res = self._client().table("users").select("id, username") \
+                .in_("username", usernames[i:i + SEED_FILTER_CHUNK]).execute()
+            found.update((r["username"], r["id"]) for r in (res.data or []))
+        return found
+
+    def count(self, table: str, column: str, values: list) -> int:
+        """Rows of ``table`` whose ``column`` is one of ``values``."""
+        total = 0
+        for i in range(0, len(values), SEED_FILTER_CHUNK):
+            res = self._client().table(table).select("id", count=CountMethod.exact, head=True) \
+                .in_(column, values[i:i + SEED_FILTER_CHUNK]).execute()
+            total += res.count or 0
+        return total
+
+    def delete_users(self, ids: list):
+        """Delete users rows; their follower series, posts and rosters cascade."""
+        for i in range(0, len(ids), SEED_FILTER_CHUNK):
+            self._client().table("users").delete(returning=ReturnMethod.minimal) \
+                .in_("id", ids[i:i + SEED_FILTER_CHUNK]).execute()
+
+    def _insert_all(self, table: str, rows: list):
+        chunks = [rows[i:i + self.chunk_size] for i in range(0, len(rows), self.chunk_size)]
+        for future in [self._pool.submit(self._insert, table, chunk) for chunk in chunks]:
+            future.result()
+
+    def write(self, rows: dict):
+        for parents in (("users",), ("competitors",), ("follower_metrics", "posts", "competitor_metrics")):
+            for table in parents:
+                self._insert_all(table, rows[table])
+        return sum(len(r) for r in rows.values())
+
+    def close(self):
+        self._pool.shutdown()
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+def _stored_counts(sink, manifests: list) -> dict:
+    """Child rows already stored for these brands, per table."""
+    return {
+        table: sink.count(table, column, [v for m in manifests for v in m["filters"][table][1]])
+        for table, (column, _) in manifests[0]["filters"].items()
+    }
+
+
+def _complete_brands(sink, manifests: dict) -> set:
+    """Brands whose child rows are all stored.
+
+    Only the last batch of an interrupted run can be incomplete, so brands
+    are checked in groups and a group is only checked brand by brand when
+    its totals fall short.
+    """
+    complete = set()
+    group = []
+    group_ids = 0
+    brands = list(manifests)
+    for n, brand in enumerate(brands, 1):
+        group.append(brand)
+        group_ids += len(manifests[brand]["users"])
+        if group_ids < SEED_FILTER_CHUNK and n < len(brands):
+            continue
+        stored = _stored_counts(sink, [manifests[b] for b in group])
+        expected = {t: sum(manifests[b]["counts"][t] for b in group) for t in stored}
+        if stored == expected:
+            complete.update(group)
+        else:
+            for b in group:
+                stored = _stored_counts(sink, [manifests[b]])
+                if all(stored[t] >= c for t, c in manifests[b]["counts"].items()):
+                    complete.add(b)
+        group = []
+        group_ids = 0
+    return complete
+
+
+def _resume(sink, seed_value: int, names: list, competitors: int, days: int) -> set:
+    """Brands to skip; deletes brands an earlier run with these arguments left half written."""
+    accounts = {brand: account_usernames(brand, competitors) for brand in names}
+    existing = sink.existing_users([u for usernames in accounts.values() for u in usernames])
+    if not existing:
+        return set()
+
+    foreign = set()
+    ours = {}
+    for i, brand in enumerate(names):
+        if not any(u in existing for u in accounts[brand]):
+            continue
+        manifest = brand_manifest(seed_value, i, brand, competitors, days)
+        if any(existing.get(u, user_id) != user_id for u, user_id in manifest["users"].items()):
+            foreign.add(brand)
+        else:
+            ours[brand] = manifest
+
+    if foreign:
+        print(f"Skipping {len(foreign)} brands whose accounts were created with other arguments or synced")
+    whole = {b: m for b, m in ours.items() if all(u in existing for u in m["users"])}
+    complete = _complete_brands(sink, whole) if whole else set()
+    partial = [b for b in ours if b not in complete]
+    if complete:
+        print(f"Skipping {len(complete)} brands that are already seeded")
+    if partial:
+        print(f"Replacing {len(partial)} partly seeded brands")
+        sink.delete_users([existing[u] for b in partial for u in accounts[b] if u in existing])
+    return foreign | complete
+
+
+def seed(brands: int = 1, competitors: int = 3, years: float = 0.25, seed_value: int = 42,
+         end: date = None, output: str = None, chunk_size: int = SEED_CHUNK_SIZE, workers: int = SEED_WORKERS):
+    if end is None:
+        end = date.today()
+        print(f"No end date given, using {end}; pass --end-date {end} to reproduce or resume this run")
+    days = max(1, round(years * 365))
+    start = end - timedelta(days=days - 1)
+    names = brand_names(brands)
+    sink = CsvSink(output) if output else SupabaseSink(chunk_size, workers)
+    target = output or "Supabase"
+    print(f"Seeding {brands} brands x {competitors} competitors, {days} days ({start} to {end}) into {target}...")
+
+    skip = _resume(sink, seed_value, names, competitors, days)
+
+    started = time.perf_counter()
+    reported = started
+    total_rows = 0
+    pending = {table: [] for table in TABLE_COLUMNS}
+    try:
+        for i, brand in enumerate(names):
+            if brand not in skip:
+                for table, rows in brand_rows(seed_value, i, brand, competitors, start, days).items():
+                    pending[table] += rows
+            done = i + 1
+            if sum(len(r) for r in pending.values()) < chunk_size * workers and done < len(names):
+                continue
+            total_rows += sink.write(pending)
+            pending = {table: [] for table in TABLE_COLUMNS}
+            now = time.perf_counter()
+            if now - reported >= SEED_PROGRESS_SECONDS or done == len(names):
+                reported = now
+                elapsed = now - started
+                print(
+                    f"  {done}/{len(names)} brands, {total_rows:,} rows "
+                    f"({total_rows / max(elapsed, 1e-9):,.0f} rows/s)"
+                )
+    finally:
+        sink.close()
+
+    print(f"Done: {total_rows:,} rows in {time.perf_counter() - started:.1f}s")
+    return total_rows
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--brands", type=int, default=1, help="brands to create; the first is my_brand")
+    parser.add_argument("--competitors", type=int, default=3, help="competitors tracked by each brand")
+    parser.add_argument("--years", type=float, default=0.25, help="years of daily history")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=None, help="last day of history (default: today, printed)")
+    parser.add_argument("--output", help="write CSV files to this directory instead of inserting")
+    parser.add_argument("--chunk-size", type=int, default=SEED_CHUNK_SIZE, help="rows per insert request")
+    parser.add_argument("--workers", type=int, default=SEED_WORKERS, help="insert requests in flight")
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
-    seed()
+    args = _parse_args()
+    seed(args.brands, args.competitors, args.years, args.seed, args.end_date, args.output, args.chunk_size, args.workers)
@@ -0,0 +1,115 @@
+import asyncio
+import inspect
+import threading
+from functools import wraps
+
+from app.metrics import registry
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Share one in-flight computation per key between concurrent callers.
+
+    The first caller for a key runs the work; callers arriving before it
+    finishes wait and receive the same result (or exception). Nothing is
+    kept once the call completes, so this is not a cache. ``do`` is for
+    threadpool handlers, ``do_async`` for coroutines on the event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self.leaders = 0
+        self.joined = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.joined += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key, fn):
+        task = self._tasks.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self.joined += 1
+        # A caller that disconnects must not cancel the work the others wait on
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = len(self._calls) + len(self._tasks)
+        return {"leaders": self.leaders, "joined": self.joined, "in_flight": in_flight}
+
+
+flights = SingleFlight()
+
+
+def _flight_metrics():
+    stats = flights.stats()
+    yield "gapsight_singleflight_leaders_total", "counter", "Calls that ran the work themselves.", [({}, stats["leaders"])]
+    yield "gapsight_singleflight_joined_total", "counter", "Calls that shared an identical in-flight call.", [({}, stats["joined"])]
+    yield "gapsight_singleflight_in_flight", "gauge", "Shared calls currently running.", [({}, stats["in_flight"])]
+
+
+registry.register_collector(_flight_metrics)
+
+
+def _default_key(*args, **kwargs):
+    return args, tuple(sorted(kwargs.items()))
+
+
+def coalesce(name: str, key=None):
+    """Join concurrent identical calls of a handler into one.
+
+    Calls are identical when ``key(*args, **kwargs)`` (default: all
+    arguments) matches. Works on plain and ``async`` handlers.
+    """
+    make_key = key or _default_key
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await flights.do_async((name, make_key(*args, **kwargs)), lambda: func(*args, **kwargs))
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return flights.do((name, make_key(*args, **kwargs)), lambda: func(*args, **kwargs))
+
+        return wrapper
+    return decorator
@@ -0,0 +1,55 @@
+"""Data scales and the router functions timed at each of them."""
+from datetime import date
+
+from fastapi import HTTPException
+
+from app.routers import analytics, competitors, insights, reports
+
+USERNAME = "my_brand"
+SEED = 42
+# Fixed so every run generates the same history
+END_DATE = date(2026, 1, 1)
+
+# An account posts ~1.15 times a day on average, so posts ~= 1.15 * days * (competitors + 1)
+SCALES = {
+    "small": {"competitors": 3, "years": 0.6},    # ~1k posts
+    "medium": {"competitors": 30, "years": 7.7},  # ~100k posts
+    "large": {"competitors": 300, "years": 7.9},  # ~1M posts
+}
+
+
+class Skipped(Exception):
+    """The case cannot run in this environment (e.g. an optional library is missing)."""
+
+
+def _report(export):
+    # Reports build the whole file before returning it, so calling them times the full export
+    def run():
+        try:
+            return export()
+        except HTTPException as e:
+            if e.status_code == 503:
+                raise Skipped(e.detail) from e
+            raise
+    return run
+
+
+CASES = {
+    "analytics.get_dashboard": lambda: analytics.get_dashboard(username=USERNAME),
+    "analytics.get_summary": lambda: analytics.get_summary(username=USERNAME),
+    "analytics.get_follower_growth": lambda: analytics.get_follower_growth(username=USERNAME),
+    "analytics.get_content_types": lambda: analytics.get_content_types(username=USERNAME),
+    "analytics.get_frequency_correlation": lambda: analytics.get_frequency_correlation(username=USERNAME),
+    "analytics.get_post_performance": lambda: analytics.get_post_performance(username=USERNAME),
+    "analytics.get_trend_prediction": lambda: analytics.get_trend_prediction(username=USERNAME),
+    "competitors.get_overview": lambda: competitors.get_overview(username=USERNAME),
+    "competitors.compare_competitors": lambda: competitors.compare_competitors(username=USERNAME),
+    "competitors.competitor_growth": lambda: competitors.competitor_growth(username=USERNAME),
+    "competitors.get_gaps": lambda: competitors.get_gaps(username=USERNAME),
+    "competitors.competitor_forecast": lambda: competitors.competitor_forecast(username=USERNAME),
+    "insights.build_summary": lambda: insights.build_summary(USERNAME),
+    "reports.export_dashboard_csv": _report(reports.export_dashboard_csv),
+    "reports.export_competitors_csv": _report(reports.export_competitors_csv),
+    "reports.export_dashboard_pdf": _report(reports.export_dashboard_pdf),
+    "reports.export_competitors_pdf": _report(reports.export_competitors_pdf),
+}
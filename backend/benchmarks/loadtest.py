@@ -0,0 +1,305 @@
+"""Load-test the API with the frontend's page-load request patterns.
+
+    python benchmarks/loadtest.py                                  in-process, 20 users for 30s
+    python benchmarks/loadtest.py --users 100 --think 2 --threads 16
+    python benchmarks/loadtest.py --mix dashboard=1,insights=1 --duration 60
+    python benchmarks/loadtest.py --url http://127.0.0.1:8000 --brands 20
+
+Each virtual user loops: pick a page by --mix weight and a brand at random,
+load the page the way the frontend does (requests in a step go out in
+parallel, steps run in order), then think for an exponentially distributed
+time averaging --think seconds.
+
+Without --url the app runs in-process on the embedded SQLite backend, on a
+copy of a database seeded with --brands brands (so syncs don't change the
+seed), and the AnyIO thread pool that runs the sync handlers is sampled for
+saturation. With --url, requests go to a running server; start it with
+DATABASE_BACKEND=local on data seeded by app/seed.py with the same --brands.
+
+Reports throughput, latency percentiles and error rate per endpoint and per
+page. Syncs use dry_run, so no RapidAPI quota is spent.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Must be set before app.database builds its client pool
+os.environ.setdefault("DATABASE_BACKEND", "local")
+
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import anyio.to_thread
+import httpx
+import numpy as np
+
+from app.seed import brand_names
+
+# Requests the frontend's axios client gives up on
+REQUEST_TIMEOUT_SECONDS = 15.0
+THREADPOOL_SAMPLE_SECONDS = 0.05
+
+# page -> steps -> parallel requests of (label, method, path, params, json body).
+# "{brand}" is filled in per page load.
+PAGES = {
+    # Dashboard.jsx: one bundled request for every panel
+    "dashboard": [
+        [("GET /analytics/dashboard", "GET", "/analytics/dashboard", {"username": "{brand}"}, None)],
+    ],
+    # Competitors.jsx: one bundled request for list, compare, gaps and growth
+    "competitors": [
+        [("GET /competitors/overview", "GET", "/competitors/overview", {"username": "{brand}"}, None)],
+    ],
+    # Insights.jsx: insights (stale-while-revalidate) and workflows in parallel
+    "insights": [
+        [
+            ("GET /insights/", "GET", "/insights/", {"username": "{brand}", "swr": "true"}, None),
+            ("GET /insights/workflows", "GET", "/insights/workflows", {"username": "{brand}"}, None),
+        ],
+    ],
+    # Dashboard "Sync": sync the account, then reload the dashboard
+    "sync": [
+        [("POST /sync/{username}", "POST", "/sync/{brand}", {"dry_run": "true"}, None)],
+        [("GET /analytics/dashboard", "GET", "/analytics/dashboard", {"username": "{brand}"}, None)],
+    ],
+    # Competitors "Sync all": owner and competitors concurrently, then reload
+    "sync_all": [
+        [("POST /sync/batch", "POST", "/sync/batch", {"dry_run": "true"}, {"owner_username": "{brand}"})],
+        [("GET /competitors/overview", "GET", "/competitors/overview", {"username": "{brand}"}, None)],
+    ],
+}
+
+DEFAULT_MIX = "dashboard=6,competitors=3,insights=2,sync=1,sync_all=1"
+
+
+def _fill(value, brand: str):
+    if isinstance(value, dict):
+        return {k: _fill(v, brand) for k, v in value.items()}
+    return value.replace("{brand}", brand) if isinstance(value, str) else value
+
+
+class Recorder:
+    """Latency samples and failures per endpoint and per page."""
+
+    def __init__(self):
+        self.endpoints = defaultdict(list)
+        self.endpoint_errors = defaultdict(int)
+        self.pages = defaultdict(list)
+        self.page_errors = defaultdict(int)
+        self.error_samples = {}
+
+    def request(self, label: str, seconds: float, error: str = None):
+        self.endpoints[label].append(seconds)
+        if error:
+            self.endpoint_errors[label] += 1
+            self.error_samples.setdefault(label, error)
+
+    def page(self, name: str, seconds: float, failed: bool):
+        self.pages[name].append(seconds)
+        if failed:
+            self.page_errors[name] += 1
+
+
+async def _request(client: httpx.AsyncClient, recorder: Recorder, brand: str, spec) -> bool:
+    label, method, path, params, body = spec
+    started = time.perf_counter()
+    error = None
+    try:
+        resp = await client.request(method, _fill(path, brand), params=_fill(params, brand), json=_fill(body, brand))
+        if resp.status_code >= 400:
+            error = f"HTTP {resp.status_code}: {resp.text[:120]}"
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)[:120]}"
+    recorder.request(label, time.perf_counter() - started, error)
+    return error is None
+
+
+async def _virtual_user(client, recorder: Recorder, rng: random.Random, pages, weights, brands,
+                        think: float, start_delay: float, deadline: float):
+    await asyncio.sleep(start_delay)
+    while time.perf_counter() < deadline:
+        page = rng.choices(pages, weights)[0]
+        brand = rng.choice(brands)
+        started = time.perf_counter()
+        ok = True
+        for step in PAGES[page]:
+            results = await asyncio.gather(*(_request(client, recorder, brand, spec) for spec in step))
+            ok = ok and all(results)
+        recorder.page(page, time.perf_counter() - started, not ok)
+        if think > 0:
+            await asyncio.sleep(rng.expovariate(1 / think))
+
+
+async def _sample_threadpool(samples: list, stop: asyncio.Event):
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    while not stop.is_set():
+        samples.append(limiter.borrowed_tokens)
+        await asyncio.sleep(THREADPOOL_SAMPLE_SECONDS)
+
+
+def _summarize(samples: list, errors: int, elapsed: float) -> dict:
+    ms = np.asarray(samples) * 1000
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99]) if len(ms) else (0, 0, 0)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0,
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "p50_ms": round(float(p50), 1),
+        "p90_ms": round(float(p90), 1),
+        "p99_ms": round(float(p99), 1),
+        "max_ms": round(float(ms.max()), 1) if len(ms) else 0,
+    }
+
+
+async def run_load(client: httpx.AsyncClient, brands, users: int = 20, duration: float = 30.0,
+                   think: float = 1.0, ramp_up: float = 5.0, mix: dict = None, seed: int = 0,
+                   sample_threadpool: bool = False) -> dict:
+    mix = mix or _parse_mix(DEFAULT_MIX)
+    pages, weights = list(mix), list(mix.values())
+    recorder = Recorder()
+    threadpool_samples = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_threadpool(threadpool_samples, stop)) if sample_threadpool else None
+
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        _virtual_user(client, recorder, random.Random(seed + i), pages, weights, brands,
+                      think, ramp_up * i / max(users, 1), deadline)
+        for i in range(users)
+    ))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    if sampler:
+        await sampler
+
+    report = {
+        "config": {"users": users, "duration_s": duration, "think_s": think, "ramp_up_s": ramp_up,
+                   "mix": mix, "brands": len(brands)},
+        "elapsed_s": round(elapsed, 2),
+        "endpoints": {
+            label: _summarize(samples, recorder.endpoint_errors[label], elapsed)
+            for label, samples in sorted(recorder.endpoints.items())
+        },
+        "pages": {
+            name: _summarize(samples, recorder.page_errors[name], elapsed)
+            for name, samples in sorted(recorder.pages.items())
+        },
+        "error_samples": recorder.error_samples,
+    }
+    if threadpool_samples:
+        total = anyio.to_thread.current_default_thread_limiter().total_tokens
+        busy = np.asarray(threadpool_samples)
+        report["threadpool"] = {
+            "threads": total,
+            "peak_busy": int(busy.max()),
+            "mean_busy": round(float(busy.mean()), 1),
+            "saturated_pct": round(float((busy >= total).mean() * 100), 1),
+        }
+    return report
+
+
+def print_report(report: dict):
+    header = f"  {'':<28} {'reqs':>6} {'err%':>6} {'req/s':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    for section in ("endpoints", "pages"):
+        print(f"{section.capitalize()}:")
+        print(header)
+        for name, s in report[section].items():
+            print(
+                f"  {name:<28} {s['requests']:>6} {s['error_rate'] * 100:>5.1f}% {s['throughput_rps']:>7.1f}"
+                f" {s['p50_ms']:>8.1f} {s['p90_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['max_ms']:>8.1f}"
+            )
+    total = sum(s["requests"] for s in report["endpoints"].values())
+    errors = sum(s["errors"] for s in report["endpoints"].values())
+    print(f"Total: {total} requests in {report['elapsed_s']}s ({total / report['elapsed_s']:.1f} req/s), {errors} errors")
+    for label, sample in report["error_samples"].items():
+        print(f"  first error on {label}: {sample}")
+    pool = report.get("threadpool")
+    if pool:
+        print(
+            f"Thread pool: {pool['threads']} threads, peak {pool['peak_busy']} busy, mean {pool['mean_busy']},"
+            f" saturated {pool['saturated_pct']}% of the time"
+        )
+
+
+def _parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in PAGES:
+            raise SystemExit(f"Unknown page {name!r}, expected one of: {', '.join(PAGES)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="base URL of a running server (default: run the app in-process)")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to generate load")
+    parser.add_argument("--think", type=float, default=1.0, help="mean think time between page loads, seconds")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds over which users start")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"page weights (default {DEFAULT_MIX})")
+    parser.add_argument("--brands", type=int, default=20, help="brands to spread users over")
+    parser.add_argument("--competitors", type=int, default=3, help="competitors per seeded brand (in-process)")
+    parser.add_argument("--years", type=float, default=1.0, help="years of seeded history (in-process)")
+    parser.add_argument("--threads", type=int, help="size of the AnyIO thread pool (in-process; default 40)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for page and brand choices")
+    parser.add_argument("--json", help="also write the report to this JSON file")
+    return parser.parse_args(argv)
+
+
+async def _main(args) -> dict:
+    options = dict(
+        users=args.users, duration=args.duration, think=args.think, ramp_up=args.ramp_up,
+        mix=_parse_mix(args.mix), seed=args.seed,
+    )
+    brands = brand_names(args.brands)
+    timeout = httpx.Timeout(REQUEST_TIMEOUT_SECONDS)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout, limits=limits) as client:
+            return await run_load(client, brands, **options)
+
+    from app import database
+    from app.localdb import LocalClientPool
+    from benchmarks.run import seeded_database
+    from main import app
+
+    seeded = seeded_database(f"loadtest-b{args.brands}-c{args.competitors}-y{args.years:g}",
+                             args.brands, args.competitors, args.years)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / seeded.name
+        shutil.copy(seeded, path)
+        database._pool = LocalClientPool(str(path))
+        if args.threads:
+            anyio.to_thread.current_default_thread_limiter().total_tokens = args.threads
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+                return await run_load(client, brands, sample_threadpool=True, **options)
+        finally:
+            database._pool.close()
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    report = asyncio.run(_main(args))
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Saved report to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
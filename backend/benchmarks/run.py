@@ -0,0 +1,211 @@
+"""Time the analytics, competitor, insight and report code paths at several data scales.
+
+    python benchmarks/run.py                                   every case at every scale
+    python benchmarks/run.py --scales small,medium --only competitors
+    python benchmarks/run.py --save benchmarks/baseline.json   record a new baseline
+    python benchmarks/run.py --compare benchmarks/baseline.json  exit 1 on regressions
+
+Runs the router functions in-process against the embedded SQLite backend
+(app/localdb.py), seeded by app/seed.py with a fixed seed and end date. Seeded
+databases are kept in benchmarks/.data and reused by later runs.
+
+For every case it records the median and best wall time over up to --repeat
+calls (fewer for slow cases), the number of database queries, and, from one
+extra call under tracemalloc, the peak traced memory and the blocks still
+allocated afterwards. Response caches are cleared before every call, so each
+call does the full work.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Must be set before app.database builds its client pool
+os.environ.setdefault("DATABASE_BACKEND", "local")
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from app import database
+from app.cache import last_good_cache, response_cache
+from app.localdb import LocalClientPool
+from app.seed import seed
+from benchmarks.cases import CASES, END_DATE, SCALES, SEED, Skipped
+
+DATA_DIR = Path(__file__).resolve().parent / ".data"
+
+# A case regresses when it is this much slower / larger than the baseline...
+DEFAULT_THRESHOLD = 0.25
+# ...and the difference is also above these noise floors
+MIN_WALL_DELTA_MS = 2.0
+MIN_PEAK_DELTA_KIB = 256
+# Slow cases get fewer timed calls so the large scale finishes in minutes
+CASE_BUDGET_SECONDS = 20.0
+
+
+def seeded_database(label: str, brands: int, competitors: int, years: float) -> Path:
+    """Path of a local database seeded with these parameters, seeding it on first use."""
+    path = DATA_DIR / f"{label}-seed{SEED}-{END_DATE}.sqlite3"
+    if not path.exists():
+        DATA_DIR.mkdir(exist_ok=True)
+        partial = path.with_suffix(".partial")
+        for leftover in DATA_DIR.glob(f"{partial.name}*"):
+            leftover.unlink()
+        database._pool = LocalClientPool(str(partial))
+        print(f"Seeding {path.name}...")
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed(brands, competitors, years, SEED, END_DATE)
+        database._pool.close()
+        partial.rename(path)
+    return path
+
+
+def use_scale(name: str) -> LocalClientPool:
+    """Point the app at the seeded database for scale ``name``."""
+    params = SCALES[name]
+    database._pool = LocalClientPool(str(seeded_database(name, 1, params["competitors"], params["years"])))
+    return database._pool
+
+
+def _reset_caches():
+    response_cache.clear()
+    last_good_cache.clear()
+
+
+def measure(fn, client, repeat: int) -> dict:
+    times = []
+    queries = 0
+    for _ in range(repeat):
+        _reset_caches()
+        before = client.queries
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+        queries = client.queries - before
+
+    _reset_caches()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+        del result
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    retained = after.compare_to(before, "filename")
+
+    return {
+        "calls": repeat,
+        "wall_ms_median": round(statistics.median(times), 3),
+        "wall_ms_min": round(min(times), 3),
+        "queries": queries,
+        "peak_kib": round((peak - baseline) / 1024, 1),
+        "retained_kib": round(sum(s.size_diff for s in retained) / 1024, 1),
+        "retained_blocks": sum(s.count_diff for s in retained),
+    }
+
+
+def run(scales, only: str = None, repeat: int = 5) -> dict:
+    results = {}
+    for name in scales:
+        client = use_scale(name).get()
+        cases = {case: fn for case, fn in CASES.items() if not only or only in case}
+        results[name] = {}
+        for case, fn in cases.items():
+            _reset_caches()
+            started = time.perf_counter()
+            try:
+                fn()  # warm-up: imports, column metadata, RPC availability
+            except Skipped as e:
+                print(f"  {name:<7} {case:<40} skipped: {e}")
+                continue
+            warm_up = time.perf_counter() - started
+            stats = measure(fn, client, max(1, min(repeat, int(CASE_BUDGET_SECONDS / max(warm_up, 1e-9)))))
+            results[name][case] = stats
+            print(
+                f"  {name:<7} {case:<40} {stats['wall_ms_median']:>9.1f} ms"
+                f" {stats['queries']:>3} queries {stats['peak_kib']:>10.0f} KiB peak"
+            )
+        database._pool.close()
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": SEED,
+            "end_date": str(END_DATE),
+            "repeat": repeat,
+            "scales": {name: SCALES[name] for name in scales},
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """Regressions of ``current`` against ``baseline`` as human-readable lines."""
+    regressions = []
+    for scale, cases in current["results"].items():
+        for case, now in cases.items():
+            base = baseline.get("results", {}).get(scale, {}).get(case)
+            if base is None:
+                continue
+            label = f"{scale} {case}"
+            wall, base_wall = now["wall_ms_median"], base["wall_ms_median"]
+            if wall > base_wall * (1 + threshold) and wall - base_wall > MIN_WALL_DELTA_MS:
+                regressions.append(f"{label}: wall {base_wall:.1f} -> {wall:.1f} ms (+{wall / base_wall - 1:.0%})")
+            if now["queries"] > base["queries"]:
+                regressions.append(f"{label}: queries {base['queries']} -> {now['queries']}")
+            peak, base_peak = now["peak_kib"], base["peak_kib"]
+            if peak > base_peak * (1 + threshold) and peak - base_peak > MIN_PEAK_DELTA_KIB:
+                regressions.append(f"{label}: peak memory {base_peak:.0f} -> {peak:.0f} KiB")
+    return regressions
+
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales", default=",".join(SCALES), help=f"comma-separated subset of {', '.join(SCALES)}")
+    parser.add_argument("--only", help="run only cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5, help="timed calls per case")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to check the results against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown, 0.25 = 25%%")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    scales = [s.strip() for s in args.scales.split(",") if s.strip()]
+    unknown = set(scales) - set(SCALES)
+    if unknown:
+        raise SystemExit(f"Unknown scales: {', '.join(sorted(unknown))}")
+
+    current = run(scales, args.only, args.repeat)
+    if args.save:
+        Path(args.save).write_text(json.dumps(current, indent=2) + "\n")
+        print(f"Saved results to {args.save}")
+    if args.compare:
+        regressions = compare(current, json.loads(Path(args.compare).read_text()), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,36 @@
-from fastapi import FastAPI
+import asyncio
+import math
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from app.cache import completion_cache
+from app.database import BackendUnavailableError, close_supabase_clients
+from app.etag import etag_middleware
+from app.metrics import metrics_middleware, registry
 from app.routers import analytics, competitors, insights, reports, sync
+from app.jobs import start_job_poller
+from app.scheduler import start_scheduler
 
 
-app = FastAPI(title="GapSight API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [start_job_poller(), start_scheduler()]
+    yield
+    for task in filter(None, tasks):
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await sync.close_http_client()
+    close_supabase_clients()
+    completion_cache.flush()
+
+
+app = FastAPI(title="GapSight API", lifespan=lifespan)
+
+app.middleware("http")(etag_middleware)
+# Registered after the ETag middleware so it wraps it and also times 304s
+app.middleware("http")(metrics_middleware)
 
 
 origins = [
@@ -17,13 +44,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Server-Timing"],
 )
 
 
+@app.exception_handler(BackendUnavailableError)
+def backend_unavailable(request: Request, exc: BackendUnavailableError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of request, database, API and cache metrics."""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 app.include_router(analytics.router)
 app.include_router(competitors.router)
 app.include_router(insights.router)
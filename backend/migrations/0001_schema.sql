@@ -0,0 +1,55 @@
+-- Core tables. Written with "if not exists" so it can be applied to the
+-- existing Supabase project as well as to an empty database.
+
+create extension if not exists pgcrypto;
+
+create table if not exists users (
+    id uuid primary key default gen_random_uuid(),
+    username text not null,
+    platform text not null default 'Instagram',
+    instagram_id text,
+    last_synced_at timestamptz,
+    created_at timestamptz not null default now()
+);
+
+create table if not exists follower_metrics (
+    id uuid primary key default gen_random_uuid(),
+    user_id uuid not null references users (id) on delete cascade,
+    follower_count bigint not null,
+    recorded_at timestamptz not null default now()
+);
+
+create table if not exists posts (
+    id uuid primary key default gen_random_uuid(),
+    user_id uuid not null references users (id) on delete cascade,
+    platform_post_id text,
+    content_type text not null default 'Post',
+    likes integer not null default 0,
+    comments integer not null default 0,
+    shares integer not null default 0,
+    posted_at timestamptz not null default now()
+);
+
+create table if not exists competitors (
+    id uuid primary key default gen_random_uuid(),
+    owner_id uuid not null references users (id) on delete cascade,
+    username text not null,
+    platform text not null default 'Instagram',
+    created_at timestamptz not null default now()
+);
+
+create table if not exists competitor_metrics (
+    id uuid primary key default gen_random_uuid(),
+    competitor_id uuid not null references competitors (id) on delete cascade,
+    follower_count bigint,
+    avg_likes integer,
+    avg_comments integer,
+    avg_shares integer,
+    top_content_type text,
+    recorded_at timestamptz not null default now()
+);
+
+-- UTC calendar day of a follower snapshot; one snapshot per user and day
+alter table follower_metrics
+    add column if not exists recorded_day date
+    generated always as ((recorded_at at time zone 'UTC')::date) stored;
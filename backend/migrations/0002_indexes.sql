@@ -0,0 +1,39 @@
+-- Indexes and unique constraints for the API's access paths:
+--   users             where username = / in (...)
+--   follower_metrics  where user_id in (...) order by recorded_at
+--   posts             where user_id in (...) [and posted_at >= ...]
+--   competitors       where owner_id = ... [and username = ...]
+-- Check them against a real database with: python app/migrate.py --check
+
+-- Keep the latest snapshot per user and day before enforcing uniqueness
+delete from follower_metrics m
+using follower_metrics newer
+where newer.user_id = m.user_id
+  and newer.recorded_day = m.recorded_day
+  and (newer.recorded_at, newer.id) > (m.recorded_at, m.id);
+
+create unique index if not exists users_username_key
+    on users (username);
+
+-- Target of upsert(on_conflict="user_id,recorded_day") in the sync router
+create unique index if not exists follower_metrics_user_day_key
+    on follower_metrics (user_id, recorded_day);
+
+-- Covering index so follower series are read without touching the heap
+create index if not exists follower_metrics_user_recorded_at_idx
+    on follower_metrics (user_id, recorded_at)
+    include (follower_count);
+
+-- Target of upsert(on_conflict="platform_post_id"); nulls (seeded posts) don't collide
+create unique index if not exists posts_platform_post_id_key
+    on posts (platform_post_id);
+
+create index if not exists posts_user_posted_at_idx
+    on posts (user_id, posted_at)
+    include (content_type, likes, comments, shares);
+
+create unique index if not exists competitors_owner_username_key
+    on competitors (owner_id, username);
+
+create index if not exists competitor_metrics_competitor_recorded_at_idx
+    on competitor_metrics (competitor_id, recorded_at);
@@ -0,0 +1,17 @@
+-- Last follower count per user and day/week/month bucket.
+-- Called through supabase.rpc("follower_series_buckets", ...) by app/datasets.py;
+-- the API falls back to bucketing raw rows in Python while this is not deployed.
+create or replace function follower_series_buckets(p_user_ids uuid[], p_resolution text default 'week')
+returns table (user_id uuid, bucket date, follower_count bigint)
+language sql
+stable
+as $$
+    select distinct on (m.user_id, date_trunc(p_resolution, m.recorded_at))
+           m.user_id,
+           date_trunc(p_resolution, m.recorded_at)::date as bucket,
+           m.follower_count::bigint
+    from follower_metrics m
+    where m.user_id = any(p_user_ids)
+      and p_resolution in ('day', 'week', 'month')
+    order by m.user_id, date_trunc(p_resolution, m.recorded_at), m.recorded_at desc;
+$$;
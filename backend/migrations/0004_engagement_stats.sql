@@ -0,0 +1,30 @@
+-- Post count and total engagement (likes + comments + shares) per user and group.
+--   p_group = 'user'         one row per user (group_key is null)
+--   p_group = 'content_type' one row per user and content type
+--   p_group = 'time'         one row per user and p_bucket ('day' | 'week' | 'month'),
+--                            group_key is the bucket's first day as YYYY-MM-DD
+-- p_since restricts the aggregate to posts on or after that instant.
+-- Called through supabase.rpc("engagement_stats", ...) by app/datasets.py.
+create or replace function engagement_stats(
+    p_user_ids uuid[],
+    p_group text default 'user',
+    p_bucket text default 'month',
+    p_since timestamptz default null
+)
+returns table (user_id uuid, group_key text, post_count bigint, total_engagement bigint)
+language sql
+stable
+as $$
+    select p.user_id,
+           case p_group
+               when 'content_type' then p.content_type
+               when 'time' then to_char(date_trunc(p_bucket, p.posted_at), 'YYYY-MM-DD')
+           end as group_key,
+           count(*)::bigint as post_count,
+           sum(coalesce(p.likes, 0) + coalesce(p.comments, 0) + coalesce(p.shares, 0))::bigint as total_engagement
+    from posts p
+    where p.user_id = any(p_user_ids)
+      and (p_since is null or p.posted_at >= p_since)
+    group by 1, 2
+    order by 1, 2;
+$$;
@@ -0,0 +1,6 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Must be set before app.database builds its client pool
+os.environ.setdefault("DATABASE_BACKEND", "local")
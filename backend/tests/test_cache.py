@@ -0,0 +1,77 @@
+import pytest
+
+from app import cache, database
+from app.cache import bump_data_version, cached_response, data_version
+from app.localdb import LocalClientPool
+from app.routers import analytics
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(cache, "response_cache", cache.TTLCache(32, 60))
+    monkeypatch.setattr(cache, "last_good_cache", cache.TTLCache(32, 60))
+
+
+def _counting_view(endpoint: str, per_user: bool = True):
+    calls = []
+
+    @cached_response(endpoint, per_user=per_user)
+    def view(username: str = "my_brand", **kwargs):
+        calls.append(username)
+        return {"username": username, "rows": [{"likes": len(calls)}]}
+    return view, calls
+
+
+def test_write_invalidates_only_that_users_entries():
+    view, calls = _counting_view("test.per_user")
+    view(username="alice")
+    view(username="bob")
+    view(username="alice")
+    assert calls == ["alice", "bob"]
+
+    bump_data_version("alice")
+    view(username="alice")
+    view(username="bob")
+    assert calls == ["alice", "bob", "alice"]
+
+
+def test_shared_views_go_stale_on_any_write():
+    view, calls = _counting_view("test.shared", per_user=False)
+    view(username="alice")
+    view(username="alice")
+    assert calls == ["alice"]
+
+    bump_data_version("someone_else")
+    view(username="alice")
+    assert calls == ["alice", "alice"]
+
+
+def test_other_arguments_get_their_own_entries():
+    view, calls = _counting_view("test.kwargs")
+    view(username="alice", resolution="week")
+    view(username="alice", resolution="month")
+    view(username="alice", resolution="week")
+    assert len(calls) == 2
+
+
+def test_callers_get_copies_of_cached_responses():
+    view, calls = _counting_view("test.copies")
+    first = view(username="alice")
+    first["rows"].append({"likes": -1})
+    second = view(username="alice")
+    second["rows"][0]["likes"] = 99
+
+    assert calls == ["alice"]
+    assert view(username="alice") == {"username": "alice", "rows": [{"likes": 1}]}
+
+
+def test_creating_a_user_bumps_its_version(monkeypatch):
+    pool = LocalClientPool(":memory:")
+    monkeypatch.setattr(database, "_pool", pool)
+    before, others, total = data_version("newcomer"), data_version("my_brand"), data_version()
+
+    analytics.create_user(username="newcomer", platform="instagram")
+    assert data_version("newcomer") == before + 1
+    assert data_version("my_brand") == others
+    assert data_version() == total + 1
+    pool.close()
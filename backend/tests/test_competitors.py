@@ -0,0 +1,51 @@
+import pytest
+
+from app.localdb import LocalClient
+from app.routers.competitors import _load_competitor_data
+
+
+def _seed(client, competitors: int):
+    users = [{"id": "owner", "username": "brand"}]
+    users += [{"id": f"c{i}", "username": f"rival_{i}"} for i in range(competitors)]
+    client.table("users").insert(users).execute()
+    client.table("competitors").insert([
+        {"id": f"r{i}", "owner_id": "owner", "username": f"rival_{i}"} for i in range(competitors)
+    ]).execute()
+    client.table("posts").insert([
+        {"id": f"{u['id']}-p{d}", "user_id": u["id"], "content_type": ("Reel", "Post")[d % 2],
+         "likes": 10 * d, "comments": d, "shares": 1, "posted_at": f"2026-01-{d + 1:02d}T12:00:00+00:00"}
+        for u in users for d in range(10)
+    ]).execute()
+    client.table("follower_metrics").insert([
+        {"id": f"{u['id']}-f{d}", "user_id": u["id"], "follower_count": 1000 + d,
+         "recorded_at": f"2026-01-{d + 1:02d}T00:00:00+00:00"}
+        for u in users for d in range(10)
+    ]).execute()
+
+
+def _queries(competitors: int, **options) -> int:
+    client = LocalClient(":memory:")
+    _seed(client, competitors)
+    _load_competitor_data(client, "brand", **options)  # learn which RPCs are missing
+    client.queries = 0
+    data = _load_competitor_data(client, "brand", **options)
+    client.close()
+    assert len(data["roster"]) == competitors
+    return client.queries
+
+
+@pytest.mark.parametrize("options", [{}, {"posts": False}, {"followers": False}])
+def test_query_count_does_not_grow_with_competitors(options):
+    counts = {n: _queries(n, **options) for n in (1, 5, 25)}
+    assert len(set(counts.values())) == 1, counts
+
+
+def test_data_covers_every_competitor():
+    client = LocalClient(":memory:")
+    _seed(client, 3)
+    data = _load_competitor_data(client, "brand")
+    ids = [data["owner_id"], *data["user_ids"].values()]
+    assert sorted(data["user_ids"]) == ["rival_0", "rival_1", "rival_2"]
+    assert all(len(data["post_stats"][uid]) == 2 for uid in ids)
+    assert all(data["followers"][uid] for uid in ids)
+    client.close()
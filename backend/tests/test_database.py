@@ -0,0 +1,185 @@
+import httpx
+import pytest
+from postgrest import APIError
+
+from app import cache, database
+from app.database import (
+    BackendUnavailableError, CircuitBreaker, RetryBudget, backoff_delay, get_supabase_client,
+    is_database_error, is_transient_error, retry_on_disconnect,
+)
+from app.localdb import LocalClientPool
+
+
+def _api_error(code: str) -> APIError:
+    return APIError({"code": code, "message": "boom", "details": None, "hint": None})
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    """Fresh breaker, budgets and local database; no real sleeping."""
+    monkeypatch.setattr(database, "breaker", CircuitBreaker(failure_threshold=3, reset_seconds=30))
+    monkeypatch.setattr(database, "_budgets", {})
+    monkeypatch.setattr(database, "RETRY_MAX_BLOCKING_SECONDS", 60.0)
+    monkeypatch.setattr(database, "SUPABASE_HOST", "db.example.co")
+    monkeypatch.setattr(database.time, "sleep", lambda seconds: None)
+    pool = LocalClientPool(":memory:")
+    monkeypatch.setattr(database, "_pool", pool)
+    yield
+    pool.close()
+
+
+def _flaky(errors, result="ok"):
+    """Function raising ``errors`` in turn, then returning ``result``; counts its calls."""
+    calls = []
+
+    def func():
+        calls.append(1)
+        get_supabase_client()
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    return func, calls
+
+
+# -- classification -----------------------------------------------------------
+
+@pytest.mark.parametrize("error, database_error, transient", [
+    (_api_error("503"), True, True),
+    (_api_error("502"), True, True),
+    (_api_error("23505"), True, False),
+    (httpx.ConnectError("down", request=httpx.Request("GET", "https://db.example.co/rest/v1/users")), True, True),
+    (httpx.ConnectError("down", request=httpx.Request("GET", "https://api.apify.com/v2/acts")), False, True),
+    (ValueError("bad input"), False, False),
+])
+def test_error_classification(error, database_error, transient):
+    assert is_database_error(error) is database_error
+    assert is_transient_error(error) is transient
+
+
+def test_backoff_is_full_jitter_capped_exponential(monkeypatch):
+    monkeypatch.setattr(database.random, "uniform", lambda low, high: (low, high))
+    assert backoff_delay(0, 0.3, max_delay=2) == (0, 0.3)
+    assert backoff_delay(2, 0.3, max_delay=2) == (0, 1.2)
+    assert backoff_delay(5, 0.3, max_delay=2) == (0, 2)
+
+
+def test_retry_budget_is_spent_by_retries_and_refilled_by_calls():
+    budget = RetryBudget(ratio=0.5, max_tokens=2)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    budget.record_call()
+    assert not budget.try_spend()
+    budget.record_call()
+    assert budget.try_spend()
+
+
+# -- retries ------------------------------------------------------------------
+
+def test_503_is_retried_until_it_succeeds():
+    func, calls = _flaky([_api_error("503"), _api_error("503")])
+    assert retry_on_disconnect()(func)() == "ok"
+    assert len(calls) == 3
+    assert database.breaker.state == "closed"
+
+
+def test_query_errors_are_not_retried():
+    func, calls = _flaky([_api_error("23505")])
+    with pytest.raises(APIError):
+        retry_on_disconnect()(func)()
+    assert len(calls) == 1
+
+
+def test_other_services_errors_are_not_retried_or_counted():
+    request = httpx.Request("GET", "https://api.apify.com/v2/acts")
+    func, calls = _flaky([httpx.ConnectError("down", request=request)] * 5)
+    for _ in range(5):
+        with pytest.raises(httpx.ConnectError):
+            retry_on_disconnect()(func)()
+    assert len(calls) == 5
+    assert database.breaker.state == "closed"
+
+
+def test_retries_stop_at_max_retries():
+    func, calls = _flaky([_api_error("503")] * 10)
+    database.breaker.failure_threshold = 100
+    with pytest.raises(APIError):
+        retry_on_disconnect(max_retries=3)(func)()
+    assert len(calls) == 3
+
+
+def test_retries_stop_when_the_endpoint_budget_is_spent():
+    database.breaker.failure_threshold = 100
+    database._budgets["func"] = RetryBudget(ratio=0, max_tokens=1)
+    func, calls = _flaky([_api_error("503")] * 10)
+    func.__qualname__ = "func"
+    with pytest.raises(APIError):
+        retry_on_disconnect()(func)()
+    assert len(calls) == 2
+
+
+def test_retries_stop_before_blocking_past_the_cap(monkeypatch):
+    monkeypatch.setattr(database, "RETRY_MAX_BLOCKING_SECONDS", 0.5)
+    monkeypatch.setattr(database.random, "uniform", lambda low, high: 0.3)
+    database.breaker.failure_threshold = 100
+    func, calls = _flaky([_api_error("503")] * 10)
+    with pytest.raises(APIError):
+        retry_on_disconnect()(func)()
+    assert len(calls) == 2
+
+
+# -- circuit breaker ----------------------------------------------------------
+
+def test_breaker_opens_and_refuses_calls():
+    func, calls = _flaky([_api_error("503")] * 10)
+    with pytest.raises(APIError):
+        retry_on_disconnect(max_retries=3)(func)()
+    assert database.breaker.state == "open"
+
+    with pytest.raises(BackendUnavailableError) as exc:
+        retry_on_disconnect()(func)()
+    assert len(calls) == 3
+    assert 0 < exc.value.retry_after <= 30
+
+
+def test_half_open_trial_closes_or_reopens(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(database.time, "monotonic", lambda: now[0])
+    breaker = database.breaker
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # one trial at a time
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    now[0] += 30
+    func, calls = _flaky([])
+    assert retry_on_disconnect()(func)() == "ok"
+    assert breaker.state == "closed"
+
+
+def test_open_breaker_serves_the_last_good_response(monkeypatch):
+    monkeypatch.setattr(cache, "response_cache", cache.TTLCache(10, 60))
+    monkeypatch.setattr(cache, "last_good_cache", cache.TTLCache(10, 60))
+    get_supabase_client().table("users").insert({"id": "u1", "username": "brand"}).execute()
+    calls = []
+
+    @cache.cached_response("test.view")
+    @retry_on_disconnect()
+    def view(username: str = "my_brand"):
+        calls.append(username)
+        return get_supabase_client().table("users").select("username").eq("username", username).execute().data
+
+    assert view(username="brand") == [{"username": "brand"}]
+    cache.bump_data_version("brand")
+    for _ in range(3):
+        database.breaker.record_failure()
+
+    assert view(username="brand") == [{"username": "brand"}]
+    assert calls == ["brand"]
+    with pytest.raises(BackendUnavailableError):
+        view(username="someone_else")
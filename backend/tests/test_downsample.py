@@ -0,0 +1,57 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app.downsample import RESOLUTIONS, bucket_points, lttb
+
+
+def _series(values, start=date(2026, 1, 1)):
+    return [{"date": str(start + timedelta(days=i)), "followers": v} for i, v in enumerate(values)]
+
+
+# -- lttb -----------------------------------------------------------------------
+
+@pytest.mark.parametrize("max_points", [3, 10, 57])
+def test_lttb_returns_exactly_max_points_keeping_first_and_last(max_points):
+    points = _series([1000 + (i * 37) % 101 for i in range(365)])
+    trimmed = lttb(points, max_points)
+
+    assert len(trimmed) == max_points
+    assert trimmed[0] == points[0] and trimmed[-1] == points[-1]
+    dates = [p["date"] for p in trimmed]
+    assert dates == sorted(set(dates))
+
+
+def test_lttb_keeps_a_spike():
+    values = [1000] * 200
+    values[123] = 5000
+    trimmed = lttb(_series(values), 20)
+    assert {"date": str(date(2026, 1, 1) + timedelta(days=123)), "followers": 5000} in trimmed
+
+
+@pytest.mark.parametrize("max_points", [None, 2, 30, 31])
+def test_lttb_passes_short_series_and_small_budgets_through(max_points):
+    points = _series(range(30))
+    assert lttb(points, max_points) is points
+
+
+# -- bucket_points --------------------------------------------------------------
+
+def test_bucket_points_keeps_the_last_count_per_bucket():
+    # 2026-01-01 is a Thursday: the first week bucket starts on Monday 2025-12-29
+    points = _series(range(40))
+    assert bucket_points(points, "day") == points
+    assert bucket_points(points, "week")[:2] == [
+        {"date": "2025-12-29", "followers": 3},
+        {"date": "2026-01-05", "followers": 10},
+    ]
+    assert bucket_points(points, "week")[-1] == {"date": "2026-02-09", "followers": 39}
+    assert bucket_points(points, "month") == [
+        {"date": "2026-01-01", "followers": 30},
+        {"date": "2026-02-01", "followers": 39},
+    ]
+
+
+@pytest.mark.parametrize("resolution", RESOLUTIONS)
+def test_bucket_points_handles_empty_series(resolution):
+    assert bucket_points([], resolution) == []
@@ -0,0 +1,74 @@
+import numpy as np
+
+from app.engine import PostFrame, rank_desc, rolling_mean
+from app.routers.competitors import _compare_view, _gaps_view
+
+
+def _frame(engagements):
+    return PostFrame.from_rows([
+        {"posted_at": f"2026-01-{i + 1:02d}T12:00:00+00:00", "likes": e, "comments": 0, "shares": 0,
+         "content_type": "Reel"}
+        for i, e in enumerate(engagements)
+    ])
+
+
+def test_rolling_mean_averages_the_trailing_window():
+    assert rolling_mean([2, 4, 6, 8, 10], 3).tolist() == [2.0, 3.0, 4.0, 6.0, 8.0]
+
+
+def test_rolling_mean_with_window_longer_than_series_is_cumulative_mean():
+    assert rolling_mean([1, 3, 5], 10).tolist() == [1.0, 2.0, 3.0]
+
+
+def test_rolling_mean_matches_naive_window():
+    values = np.random.default_rng(0).integers(0, 1000, 200)
+    expected = [values[max(0, i - 6):i + 1].mean() for i in range(len(values))]
+    assert np.allclose(rolling_mean(values, 7), expected)
+
+
+def test_rank_is_highest_first_and_ties_share_the_best_rank():
+    assert rank_desc([10, 30, 20, 30, 5]).tolist() == [4, 1, 3, 1, 5]
+
+
+def test_empty_inputs():
+    assert rolling_mean([], 3).tolist() == []
+    assert rank_desc([]).tolist() == []
+    assert _frame([]).records() == []
+
+
+def test_post_frame_operations_run_over_engagement():
+    frame = _frame([3, 9, 6])
+    assert frame.rank().tolist() == [3, 1, 2]
+    assert frame.rolling_mean(2).tolist() == [3.0, 6.0, 7.5]
+    assert [r["rolling_engagement"] for r in frame.records(window=2)] == [3.0, 6.0, 7.5]
+
+
+def _competitor_data(stats):
+    return {
+        "owner_id": "me",
+        "roster": [{"username": "a"}, {"username": "b"}],
+        "user_ids": {"a": "ua", "b": "ub"},
+        "followers": {},
+        "post_stats": stats,
+    }
+
+
+def test_compare_view_ranks_by_average_engagement():
+    data = _competitor_data({
+        "me": [{"key": "Reel", "post_count": 2, "total_engagement": 20}],
+        "ua": [{"key": "Reel", "post_count": 1, "total_engagement": 50}],
+        "ub": [{"key": "Post", "post_count": 4, "total_engagement": 40}],
+    })
+    ranks = {row["name"]: row["engagement_rank"] for row in _compare_view("me_brand", data)}
+    assert ranks == {"a": 1, "me_brand": 2, "b": 2}
+
+
+def test_gaps_view_picks_the_best_ranked_content_type_first_on_ties():
+    data = _competitor_data({
+        "me": [{"key": "Post", "post_count": 1, "total_engagement": 10}],
+        "ua": [
+            {"key": "Carousel", "post_count": 1, "total_engagement": 40},
+            {"key": "Post", "post_count": 2, "total_engagement": 80},
+        ],
+    })
+    assert [(g["competitor"], g["top_content_type"]) for g in _gaps_view(data)] == [("a", "Carousel")]
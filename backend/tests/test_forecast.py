@@ -0,0 +1,89 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from app.forecast import forecast_series, series_from_points
+
+START = date(2026, 1, 5)  # a Monday
+
+
+def _series(values, start=START):
+    return [str(start + timedelta(days=i)) for i in range(len(values))], list(values)
+
+
+def test_exact_linear_trend_is_projected_exactly():
+    dates, values = _series([1000 + 25 * i for i in range(60)])
+    [result] = forecast_series([(dates, values)], horizon_days=28, step_days=7)
+
+    assert result["slope_per_day"] == 25.0
+    assert [p["date"] for p in result["points"]] == [str(START + timedelta(days=59 + d)) for d in (7, 14, 21, 28)]
+    for p, d in zip(result["points"], (7, 14, 21, 28)):
+        assert p["followers"] == 1000 + 25 * (59 + d)
+        assert p["lower"] == p["followers"] == p["upper"]
+
+
+def test_robust_fit_ignores_outliers():
+    values = np.array([2000 + 10 * i for i in range(60)], dtype=float)
+    values[[10, 30, 50]] += 5000
+    series = _series(values.tolist())
+
+    [linear] = forecast_series([series], model="linear")
+    [robust] = forecast_series([series], model="robust")
+    assert abs(robust["slope_per_day"] - 10) < 0.5
+    assert abs(linear["slope_per_day"] - 10) > abs(robust["slope_per_day"] - 10)
+    assert robust["points"][0]["followers"] == pytest.approx(2000 + 10 * (59 + 7), abs=10)
+
+
+def test_seasonal_fit_recovers_the_weekday_pattern():
+    weekly = [0, 40, 80, 120, 80, 40, -360]  # Monday..Sunday, centred
+    values = [5000 + 3 * i + weekly[i % 7] for i in range(70)]
+    series = _series(values)
+
+    [seasonal] = forecast_series([series], horizon_days=7, step_days=1, model="seasonal")
+    [linear] = forecast_series([series], horizon_days=7, step_days=1, model="linear")
+    expected = [5000 + 3 * (69 + d) + weekly[(69 + d) % 7] for d in range(1, 8)]
+
+    # The trend is fit before the weekday effects, so the Sunday dip biases
+    # the level slightly; the day-to-day shape must still match exactly
+    predicted = [p["followers"] for p in seasonal["points"]]
+    assert np.diff(predicted).tolist() == pytest.approx(np.diff(expected).tolist(), abs=1)
+    assert np.abs(np.subtract(predicted, expected)).max() < 0.2 * np.abs(
+        np.subtract([p["followers"] for p in linear["points"]], expected)
+    ).max()
+    seasonal_width = seasonal["points"][0]["upper"] - seasonal["points"][0]["lower"]
+    linear_width = linear["points"][0]["upper"] - linear["points"][0]["lower"]
+    assert seasonal_width < linear_width
+
+
+@pytest.mark.parametrize("model", ["linear", "robust", "seasonal"])
+def test_intervals_widen_with_the_horizon(model):
+    rng = np.random.default_rng(3)
+    values = (3000 + 12 * np.arange(90) + rng.normal(0, 40, 90)).round()
+    [result] = forecast_series([_series(values.tolist())], horizon_days=84, step_days=7, model=model)
+
+    widths = [p["upper"] - p["lower"] for p in result["points"]]
+    assert widths == sorted(widths) and widths[-1] > widths[0]
+    assert all(p["lower"] <= p["followers"] <= p["upper"] for p in result["points"])
+
+    [narrow] = forecast_series([_series(values.tolist())], horizon_days=84, step_days=7, model=model, level=0.5)
+    assert narrow["points"][-1]["upper"] - narrow["points"][-1]["lower"] < widths[-1]
+
+
+def test_series_are_fit_independently_in_one_batch():
+    rising = _series([100 + 5 * i for i in range(30)])
+    falling = _series([900 - 2 * i for i in range(14)], start=START + timedelta(days=20))
+    batch = forecast_series([rising, falling, ([], []), _series([7])])
+
+    assert [r["slope_per_day"] for r in batch] == [5.0, -2.0, 0.0, 0.0]
+    assert batch[0] == forecast_series([rising])[0]
+    assert batch[1] == forecast_series([falling])[0]
+    assert batch[2]["points"] == batch[3]["points"] == []
+
+
+def test_series_from_points_and_unknown_models():
+    points = [{"date": "2026-01-05", "followers": 10}, {"date": "2026-01-06", "followers": 12}]
+    assert series_from_points(points) == (["2026-01-05", "2026-01-06"], [10, 12])
+    assert forecast_series([]) == []
+    with pytest.raises(ValueError):
+        forecast_series([series_from_points(points)], model="prophet")
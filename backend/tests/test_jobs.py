@@ -0,0 +1,113 @@
+import asyncio
+
+import httpx
+
+from app import jobs
+from app.jobs import ApifyPoller, JobStore
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _apify_client(run_status: str = "RUNNING"):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            return httpx.Response(201, json={"data": {"id": "run-1"}})
+        return httpx.Response(200, json={"data": {"status": run_status}})
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def _store(tmp_path, clock):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    store.clock = clock
+    return store
+
+
+def _tick(poller):
+    async def run():
+        async with _apify_client() as client:
+            await poller.run_once(client)
+    asyncio.run(run())
+
+
+def test_job_resumed_after_downtime_is_not_timed_out(tmp_path):
+    clock = FakeClock(0.0)
+    store = _store(tmp_path, clock)
+    job = store.create("user-1", "brand")
+
+    # The process was down for longer than the timeout
+    clock.now = 10_000.0
+    poller = ApifyPoller(store, timeout_seconds=600)
+    _tick(poller)
+
+    job = store.get(job["id"])
+    assert job["status"] == "running"
+    assert job["run_id"] == "run-1"
+
+    clock.now += 300
+    _tick(poller)
+    job = store.get(job["id"])
+    assert job["status"] == "running"
+    assert job["polls"] == 1
+
+
+def test_job_times_out_after_timeout_since_pickup(tmp_path):
+    clock = FakeClock(0.0)
+    store = _store(tmp_path, clock)
+    job = store.create("user-1", "brand")
+    poller = ApifyPoller(store, timeout_seconds=600)
+
+    _tick(poller)
+    clock.now = 601.0
+    _tick(poller)
+
+    job = store.get(job["id"])
+    assert job["status"] == "failed"
+    assert "Timed out" in job["error"]
+    assert poller._picked_up == {job["id"]: 0.0}
+
+    # Finished jobs are forgotten on the next tick
+    _tick(poller)
+    assert poller._picked_up == {}
+
+
+def test_finished_run_is_stored_page_by_page(tmp_path, monkeypatch):
+    items = [
+        {"daily_growth": [{"date": f"2025-12-{day:02d}", "subscribers": 1000 + day}]}
+        for day in range(1, 6)
+    ]
+    offsets = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/items"):
+            offset, limit = int(request.url.params["offset"]), int(request.url.params["limit"])
+            offsets.append(offset)
+            return httpx.Response(200, json=items[offset:offset + limit])
+        return httpx.Response(200, json={"data": {"status": "SUCCEEDED", "defaultDatasetId": "ds-1"}})
+
+    stored = []
+
+    def store_history(user_id, username, rows):
+        rows = list(rows)
+        stored.append([r["recorded_at"] for r in rows])
+        return len(rows)
+
+    monkeypatch.setattr(jobs, "store_history", store_history)
+    store = _store(tmp_path, FakeClock(0.0))
+    job = store.create("user-1", "brand")
+    store.update(job["id"], status="running", run_id="run-1")
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await ApifyPoller(store, page_size=2).run_once(client)
+    asyncio.run(run())
+
+    assert offsets == [0, 2, 4]
+    assert stored == [["2025-12-01", "2025-12-02"], ["2025-12-03", "2025-12-04"], ["2025-12-05"]]
+    job = store.get(job["id"])
+    assert (job["status"], job["rows_inserted"], job["dataset_id"]) == ("succeeded", 5, "ds-1")
@@ -0,0 +1,234 @@
+"""The local backend against PostgREST semantics, one builder call at a time.
+
+Each test builds the same chain on a real postgrest client, checks the
+request PostgREST would receive, and checks that the local client returns
+what PostgREST answers to that request.
+"""
+import pytest
+from postgrest import APIError, SyncPostgrestClient
+from postgrest.types import CountMethod, ReturnMethod
+
+from app import datasets
+from app.localdb import LocalClient
+
+USERS = [
+    {"id": "u1", "username": "alpha", "last_synced_at": "2026-01-03T10:00:00+00:00"},
+    {"id": "u2", "username": "bravo", "last_synced_at": None},
+    {"id": "u3", "username": "charlie", "last_synced_at": "2026-01-01T10:00:00+00:00"},
+    {"id": "u4", "username": "delta", "last_synced_at": "2026-01-02T10:00:00+00:00"},
+]
+
+
+@pytest.fixture
+def db():
+    client = LocalClient(":memory:")
+    client.table("users").insert(USERS).execute()
+    yield client
+    client.close()
+
+
+def _request(build):
+    """What postgrest-py would send for ``build(client)``."""
+    request = build(SyncPostgrestClient("http://postgrest.invalid")).request
+    return {
+        "method": request.http_method,
+        "params": dict(request.params),
+        "prefer": request.headers.get("prefer", ""),
+    }
+
+
+def _usernames(response) -> list:
+    return [r["username"] for r in response.data]
+
+
+# -- in_ ----------------------------------------------------------------------
+
+def test_in_filters_to_listed_values(db):
+    build = lambda c: c.from_("users").select("username").in_("id", ["u3", "u1", "missing"]).order("username")
+    assert _request(build)["params"]["id"] == "in.(u3,u1,missing)"
+    assert _usernames(build(db).execute()) == ["alpha", "charlie"]
+
+
+def test_in_with_no_values_matches_nothing(db):
+    build = lambda c: c.from_("users").select("username").in_("id", [])
+    assert _request(build)["params"]["id"] == "in.()"
+    assert build(db).execute().data == []
+
+
+def test_in_compares_timestamps_as_instants(db):
+    build = lambda c: c.from_("users").select("username").in_("last_synced_at", ["2026-01-01T11:00:00+01:00"])
+    assert _usernames(build(db).execute()) == ["charlie"]
+
+
+# -- order --------------------------------------------------------------------
+
+def test_order_defaults_to_nulls_last_ascending(db):
+    build = lambda c: c.from_("users").select("username").order("last_synced_at")
+    assert _request(build)["params"]["order"] == "last_synced_at.asc"
+    assert _usernames(build(db).execute()) == ["charlie", "delta", "alpha", "bravo"]
+
+
+def test_order_defaults_to_nulls_first_descending(db):
+    build = lambda c: c.from_("users").select("username").order("last_synced_at", desc=True)
+    assert _request(build)["params"]["order"] == "last_synced_at.desc"
+    assert _usernames(build(db).execute()) == ["bravo", "alpha", "delta", "charlie"]
+
+
+@pytest.mark.parametrize("desc, nullsfirst, suffix, expected", [
+    (True, False, "desc.nullslast", ["alpha", "delta", "charlie", "bravo"]),
+    (False, True, "asc.nullsfirst", ["bravo", "charlie", "delta", "alpha"]),
+])
+def test_order_with_explicit_nulls(db, desc, nullsfirst, suffix, expected):
+    build = lambda c: c.from_("users").select("username").order("last_synced_at", desc=desc, nullsfirst=nullsfirst)
+    assert _request(build)["params"]["order"] == f"last_synced_at.{suffix}"
+    assert _usernames(build(db).execute()) == expected
+
+
+def test_repeated_order_calls_break_ties(db):
+    db.table("users").update({"platform": "TikTok"}).in_("id", ["u2", "u4"]).execute()
+    build = lambda c: c.from_("users").select("username").order("platform").order("username", desc=True)
+    assert _request(build)["params"]["order"] == "platform.asc,username.desc"
+    assert _usernames(build(db).execute()) == ["charlie", "alpha", "delta", "bravo"]
+
+
+# -- range / limit ------------------------------------------------------------
+
+def test_range_is_inclusive(db):
+    build = lambda c: c.from_("users").select("username").order("username").range(1, 2)
+    params = _request(build)["params"]
+    assert (params["offset"], params["limit"]) == ("1", "2")
+    assert _usernames(build(db).execute()) == ["bravo", "charlie"]
+
+
+def test_range_past_the_end_is_empty(db):
+    build = lambda c: c.from_("users").select("username").order("username").range(4, 7)
+    assert build(db).execute().data == []
+
+
+def test_limit(db):
+    build = lambda c: c.from_("users").select("username").order("username").limit(3)
+    assert _request(build)["params"]["limit"] == "3"
+    assert _usernames(build(db).execute()) == ["alpha", "bravo", "charlie"]
+
+
+def test_fetch_all_pages_through_capped_responses(db):
+    db.max_rows = 3
+    rows = datasets.fetch_all(db, lambda: db.table("users").select("username").order("username"))
+    assert [r["username"] for r in rows] == ["alpha", "bravo", "charlie", "delta"]
+
+
+# -- count --------------------------------------------------------------------
+
+def test_exact_count_ignores_range(db):
+    build = lambda c: c.from_("users").select("username", count=CountMethod.exact) \
+        .neq("username", "alpha").order("username").range(0, 0)
+    assert _request(build)["prefer"] == "count=exact"
+    response = build(db).execute()
+    assert _usernames(response) == ["bravo"]
+    assert response.count == 3
+
+
+def test_count_without_count_method_is_none(db):
+    assert db.table("users").select("username").execute().count is None
+
+
+def test_head_returns_only_the_count(db):
+    build = lambda c: c.from_("users").select("id", count=CountMethod.exact, head=True).in_("id", ["u1", "u2"])
+    assert _request(build)["method"] == "HEAD"
+    response = build(db).execute()
+    assert response.data == []
+    assert response.count == 2
+
+
+# -- upsert -------------------------------------------------------------------
+
+def _metrics(db) -> list:
+    res = db.table("follower_metrics").select("user_id, follower_count, recorded_at") \
+        .order("user_id").order("recorded_at").execute()
+    return [(r["user_id"], r["follower_count"], r["recorded_at"][:10]) for r in res.data]
+
+
+@pytest.fixture
+def metrics(db):
+    db.table("follower_metrics").insert([
+        {"user_id": "u1", "follower_count": 100, "recorded_at": "2026-01-01T08:00:00+00:00"},
+        {"user_id": "u1", "follower_count": 110, "recorded_at": "2026-01-02T08:00:00+00:00"},
+    ]).execute()
+    return db
+
+
+def test_upsert_without_on_conflict_merges_on_primary_key(db):
+    build = lambda c: c.from_("users").upsert({"id": "u1", "username": "alpha2"})
+    request = _request(build)
+    assert "on_conflict" not in request["params"]
+    assert "resolution=merge-duplicates" in request["prefer"]
+    response = build(db).execute()
+    assert _usernames(response) == ["alpha2"]
+    assert len(db.table("users").select("id").execute().data) == len(USERS)
+
+
+def test_upsert_on_conflict_updates_the_existing_row(metrics):
+    rows = [
+        {"user_id": "u1", "follower_count": 115, "recorded_at": "2026-01-02T20:00:00+00:00"},
+        {"user_id": "u1", "follower_count": 120, "recorded_at": "2026-01-03T08:00:00+00:00"},
+    ]
+    build = lambda c: c.from_("follower_metrics").upsert(rows, on_conflict="user_id,recorded_day")
+    assert _request(build)["params"]["on_conflict"] == "user_id,recorded_day"
+    response = build(metrics).execute()
+    assert [r["follower_count"] for r in response.data] == [115, 120]
+    assert _metrics(metrics) == [("u1", 100, "2026-01-01"), ("u1", 115, "2026-01-02"), ("u1", 120, "2026-01-03")]
+
+
+def test_upsert_ignore_duplicates_keeps_existing_rows_and_counts_inserts(metrics):
+    rows = [
+        {"user_id": "u1", "follower_count": 999, "recorded_at": "2026-01-01T20:00:00+00:00"},
+        {"user_id": "u1", "follower_count": 130, "recorded_at": "2026-01-04T08:00:00+00:00"},
+    ]
+    build = lambda c: c.from_("follower_metrics").upsert(
+        rows, on_conflict="user_id,recorded_day", ignore_duplicates=True,
+        returning=ReturnMethod.minimal, count=CountMethod.exact,
+    )
+    assert _request(build)["prefer"] == "return=minimal,count=exact,resolution=ignore-duplicates"
+    response = build(metrics).execute()
+    assert response.data == []
+    assert response.count == 1
+    assert _metrics(metrics) == [("u1", 100, "2026-01-01"), ("u1", 110, "2026-01-02"), ("u1", 130, "2026-01-04")]
+
+
+def test_upsert_without_matching_unique_index_raises_42p10(db):
+    db.run(lambda conn: conn.execute("drop index follower_metrics_user_day_key"))
+    with pytest.raises(APIError) as exc:
+        db.table("follower_metrics").upsert(
+            {"user_id": "u1", "follower_count": 1, "recorded_at": "2026-01-01T00:00:00+00:00"},
+            on_conflict="user_id,recorded_day",
+        ).execute()
+    assert exc.value.code == "42P10"
+
+
+def test_insert_conflict_raises_unique_violation(db):
+    with pytest.raises(APIError) as exc:
+        db.table("users").insert({"id": "u9", "username": "alpha"}).execute()
+    assert exc.value.code == "23505"
+
+
+def test_insert_with_missing_parent_raises_foreign_key_violation(db):
+    with pytest.raises(APIError) as exc:
+        db.table("posts").insert({"user_id": "nobody"}).execute()
+    assert exc.value.code == "23503"
+
+
+# -- rpc ----------------------------------------------------------------------
+
+def test_rpc_fails_as_function_not_found(db):
+    assert _request(lambda c: c.rpc("follower_series_buckets", {}).range(0, 9))["params"]["limit"] == "10"
+    with pytest.raises(APIError) as exc:
+        db.rpc("follower_series_buckets", {"p_user_ids": ["u1"]}).execute()
+    assert exc.value.code == "PGRST202"
+
+
+def test_call_rpc_falls_back_when_the_function_is_missing(db, monkeypatch):
+    monkeypatch.setattr(datasets, "_unavailable_rpcs", set())
+    db.max_rows = 1000
+    assert datasets.call_rpc(db, "engagement_stats", {}) is None
+    assert "engagement_stats" in datasets._unavailable_rpcs
+
@@ -0,0 +1,20 @@
+import csv
+from datetime import date
+
+from app.seed import seed
+
+
+def _column(path, name) -> list:
+    with open(path, newline="") as f:
+        return [row[name] for row in csv.DictReader(f)]
+
+
+def test_history_ends_on_the_end_date(tmp_path):
+    seed(brands=1, competitors=1, years=0.1, seed_value=3, end=date(2026, 1, 1), output=str(tmp_path))
+
+    recorded = sorted(_column(tmp_path / "follower_metrics.csv", "recorded_at"))
+    assert recorded[-1][:10] == "2026-01-01"
+    assert recorded[0][:10] == "2025-11-27"  # 36 days, end date included
+    assert len(set(recorded)) == 36
+    assert max(_column(tmp_path / "posts.csv", "posted_at"))[:10] <= "2026-01-01"
+    assert max(_column(tmp_path / "competitor_metrics.csv", "recorded_at"))[:10] == "2026-01-01"
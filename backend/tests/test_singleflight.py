@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app import singleflight
+from app.singleflight import SingleFlight, coalesce
+
+CALLERS = 8
+
+
+@pytest.fixture(autouse=True)
+def flights(monkeypatch):
+    fresh = SingleFlight()
+    monkeypatch.setattr(singleflight, "flights", fresh)
+    return fresh
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def _run_concurrently(func, *args, **kwargs):
+    """Call ``func`` from CALLERS threads, holding the leader until every other caller has joined."""
+    results, errors = [None] * CALLERS, [None] * CALLERS
+
+    def call(i):
+        try:
+            results[i] = func(*args, **kwargs)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(CALLERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+    return results, errors
+
+
+def _gated(flights, outcome):
+    """Handler that holds until the other callers join, then returns or raises ``outcome``."""
+    calls = []
+
+    @coalesce("test.view")
+    def view(username: str = "my_brand"):
+        calls.append(username)
+        _wait_for(lambda: flights.joined == CALLERS - 1)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return {"username": username, "value": outcome}
+    return view, calls
+
+
+def test_concurrent_callers_share_one_call(flights):
+    view, calls = _gated(flights, 42)
+    results, errors = _run_concurrently(view, username="brand")
+
+    assert calls == ["brand"]
+    assert errors == [None] * CALLERS
+    assert all(r is results[0] for r in results)
+    assert results[0] == {"username": "brand", "value": 42}
+    assert flights.stats() == {"leaders": 1, "joined": CALLERS - 1, "in_flight": 0}
+
+
+def test_concurrent_callers_share_the_exception(flights):
+    failure = RuntimeError("database down")
+    view, calls = _gated(flights, failure)
+    results, errors = _run_concurrently(view, username="brand")
+
+    assert calls == ["brand"]
+    assert all(e is failure for e in errors)
+
+
+def test_different_arguments_run_separately(flights):
+    release = threading.Event()
+    calls = []
+
+    @coalesce("test.view")
+    def view(username: str = "my_brand", resolution: str = "week"):
+        calls.append((username, resolution))
+        release.wait(timeout=5)
+        return username, resolution
+
+    args = [("a", "week"), ("b", "week"), ("a", "month")]
+    threads = [threading.Thread(target=view, kwargs={"username": u, "resolution": r}) for u, r in args]
+    for t in threads:
+        t.start()
+    _wait_for(lambda: len(calls) == len(args))
+    release.set()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert sorted(calls) == sorted(args)
+    assert flights.stats()["joined"] == 0
+
+
+def test_custom_key_joins_calls_it_considers_identical(flights):
+    view_calls = []
+
+    @coalesce("test.view", key=lambda username, **kwargs: username)
+    def view(username: str, request_id: int):
+        view_calls.append(request_id)
+        _wait_for(lambda: flights.joined == CALLERS - 1)
+        return username
+
+    results, _ = _run_concurrently(view, username="brand", request_id=1)
+    assert results == ["brand"] * CALLERS
+    assert len(view_calls) == 1
+
+
+def test_nothing_is_kept_after_the_call(flights):
+    calls = []
+
+    @coalesce("test.view")
+    def view(username: str = "my_brand"):
+        calls.append(username)
+        return len(calls)
+
+    assert view(username="brand") == 1
+    assert view(username="brand") == 2
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_async_callers_share_one_call(flights):
+    calls = []
+
+    @coalesce("test.async_view")
+    async def view(username: str = "my_brand"):
+        calls.append(username)
+        await asyncio.sleep(0.01)
+        return {"username": username}
+
+    async def main():
+        return await asyncio.gather(*(view(username="brand") for _ in range(CALLERS)), view(username="other"))
+
+    results = asyncio.run(main())
+    assert calls == ["brand", "other"]
+    assert all(r is results[0] for r in results[:CALLERS])
+    assert results[-1] == {"username": "other"}
@@ -0,0 +1,34 @@
+import pytest
+
+from app.localdb import LocalClient
+from app.routers import sync
+
+
+@pytest.fixture
+def db():
+    client = LocalClient(":memory:")
+    client.table("users").insert({"id": "u1", "username": "brand"}).execute()
+    yield client
+    client.close()
+
+
+def _snapshots(db) -> list:
+    return [r["follower_count"] for r in db.table("follower_metrics").select("follower_count").execute().data]
+
+
+def test_daily_snapshot_is_replaced_on_the_same_day(db, monkeypatch):
+    monkeypatch.setattr(sync, "_day_upsert_available", True)
+    sync._save_daily_snapshot(db, "u1", 100)
+    sync._save_daily_snapshot(db, "u1", 120)
+    assert _snapshots(db) == [120]
+
+
+def test_daily_snapshot_falls_back_without_the_unique_index(db, monkeypatch):
+    # The schema before migration 0002
+    db.run(lambda conn: conn.execute("drop index follower_metrics_user_day_key"))
+    monkeypatch.setattr(sync, "_day_upsert_available", True)
+
+    sync._save_daily_snapshot(db, "u1", 100)
+    assert sync._day_upsert_available is False
+    sync._save_daily_snapshot(db, "u1", 120)
+    assert _snapshots(db) == [120]
@@ -27,16 +27,11 @@ export default function Competitors() {
     setError(null)
     try {
       const params = { username }
-      const [listRes, compareRes, gapsRes, growthRes] = await Promise.all([
-        api.get('/competitors/list', { params }),
-        api.get('/competitors/compare', { params }),
-        api.get('/competitors/gaps', { params }),
-        api.get('/competitors/growth', { params }),
-      ])
-      setCompetitorList(listRes.data || [])
-      setCompetitors(compareRes.data || [])
-      setGaps(gapsRes.data || [])
-      setGrowthSeries(growthRes.data || [])
+      const { data } = await api.get('/competitors/overview', { params })
+      setCompetitorList(data.list || [])
+      setCompetitors(data.compare || [])
+      setGaps(data.gaps || [])
+      setGrowthSeries(data.growth || [])
     } catch (err) {
       setError('Failed to load competitor data.')
       console.error(err)
@@ -101,6 +96,21 @@ export default function Competitors() {
     }
   }
 
+  const [syncingAll, setSyncingAll] = useState(false)
+
+  const handleSyncAll = async () => {
+    setSyncingAll(true)
+    try {
+      // Syncs you and every competitor concurrently on the backend
+      await api.post('/sync/batch', { owner_username: username })
+      await fetchAll()
+    } catch (err) {
+      console.error('Sync all failed:', err)
+    } finally {
+      setSyncingAll(false)
+    }
+  }
+
   const showCompetitors = Array.isArray(competitors) && competitors.length > 0
   const showGaps = Array.isArray(gaps) && gaps.length > 0
   const showGrowth = Array.isArray(growthSeries) && growthSeries.length > 0
@@ -122,7 +132,17 @@ export default function Competitors() {
         <>
           {/* Manage competitors */}
           <div className="bg-gray-900 rounded-2xl p-4 space-y-4">
-            <h2 className="text-lg font-semibold text-white">Manage Competitors</h2>
+            <div className="flex items-center justify-between">
+              <h2 className="text-lg font-semibold text-white">Manage Competitors</h2>
+              <button
+                onClick={handleSyncAll}
+                disabled={syncingAll || competitorList.length === 0}
+                title="Re-sync you and all competitors from RapidAPI"
+                className="px-3 py-1.5 text-sm rounded-lg bg-gray-800 border border-gray-700 text-gray-300 hover:text-indigo-400 disabled:opacity-50"
+              >
+                {syncingAll ? 'Syncing…' : '↻ Sync all'}
+              </button>
+            </div>
 
             {/* Add */}
             <div className="flex gap-2 items-center">
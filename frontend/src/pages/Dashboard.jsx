@@ -20,6 +20,7 @@ export default function Dashboard() {
   const [loading, setLoading] = useState(false)
   const [syncing, setSyncing] = useState(false)
   const [fetchingHistory, setFetchingHistory] = useState(false)
+  const [historyMsg, setHistoryMsg] = useState('')
   const [error, setError] = useState(null)
 
   const apiBase = import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000'
@@ -30,30 +31,13 @@ export default function Dashboard() {
     setError(null)
     try {
       const params = { username: user }
-      const [summaryRes, followersRes, contentRes, performanceRes, freqRes, trendRes] =
-        await Promise.allSettled([
-          api.get('/analytics/summary', { params }),
-          api.get('/analytics/followers', { params }),
-          api.get('/analytics/content-types', { params }),
-          api.get('/analytics/post-performance', { params }),
-          api.get('/analytics/frequency-correlation', { params }),
-          api.get('/analytics/trend-prediction', { params }),
-        ])
-
-      if (summaryRes.status === 'fulfilled') setSummary(summaryRes.value.data)
-      if (followersRes.status === 'fulfilled') setFollowers(followersRes.value.data)
-      if (contentRes.status === 'fulfilled') setContentTypes(contentRes.value.data)
-      if (performanceRes.status === 'fulfilled') setPostPerformance(performanceRes.value.data)
-      if (freqRes.status === 'fulfilled') setFrequencyCorrelation(freqRes.value.data)
-      if (trendRes.status === 'fulfilled') setTrendPrediction(trendRes.value.data)
-
-      const anyFailed = [summaryRes, followersRes, contentRes, performanceRes, freqRes, trendRes]
-        .some(r => r.status === 'rejected')
-      if (anyFailed) {
-        const allFailed = [summaryRes, followersRes, contentRes, performanceRes, freqRes, trendRes]
-          .every(r => r.status === 'rejected')
-        setError(allFailed ? 'Failed to load analytics.' : 'Some analytics sections failed to load.')
-      }
+      const { data } = await api.get('/analytics/dashboard', { params })
+      setSummary(data.summary)
+      setFollowers(data.followers)
+      setContentTypes(data.content_types)
+      setPostPerformance(data.post_performance)
+      setFrequencyCorrelation(data.frequency_correlation)
+      setTrendPrediction(data.trend_prediction)
     } catch (err) {
       setError('Failed to load analytics.')
       console.error(err)
@@ -83,19 +67,35 @@ export default function Dashboard() {
     }
   }
 
+  // Poll an Apify backfill job until it finishes; resolves with the final job
+  const waitForJob = async (jobId) => {
+    for (;;) {
+      const { data } = await api.get(`/sync/jobs/${jobId}`)
+      if (data.status === 'succeeded' || data.status === 'failed') return data
+      await new Promise((resolve) => setTimeout(resolve, 5000))
+    }
+  }
+
   const handleFetchHistory = async () => {
     const user = inputVal.trim() || username
     if (!user) return
     setFetchingHistory(true)
     setError(null)
     try {
-      await api.post(`/sync/${user}?fetch_history=true`)
-      // Apify runs in the background — notify user to reload in a few minutes
-      setError('History fetch started. Apify is running in the background (2–5 min). Click Load when done.')
+      const { data } = await api.post(`/sync/${user}?fetch_history=true`)
+      setHistoryMsg('Fetching follower history via Apify (usually 2–5 min)…')
+      const job = await waitForJob(data.history_job_id)
+      if (job.status === 'failed') {
+        setError(`History fetch failed: ${job.error || 'unknown error'}`)
+      } else {
+        setUsername(user)
+        await fetchAnalytics(user)
+      }
     } catch (err) {
-      setError('Failed to start history fetch. Check uvicorn logs for details.')
+      setError('Failed to fetch history. Check uvicorn logs for details.')
       console.error(err)
     } finally {
+      setHistoryMsg('')
       setFetchingHistory(false)
     }
   }
@@ -150,6 +150,7 @@ export default function Dashboard() {
       </div>
 
       {error && <div className="text-red-400 text-sm">{error}</div>}
+      {historyMsg && <div className="text-indigo-400 text-sm animate-pulse">{historyMsg}</div>}
 
       {!username && !loading && (
         <div className="flex items-center justify-center h-64 text-gray-500">
@@ -19,7 +19,7 @@ export default function Insights() {
     try {
       const params = { username }
       const [res, workflowsRes] = await Promise.allSettled([
-        api.get('/insights/', { params }),
+        api.get('/insights/', { params: { ...params, swr: true } }),
         api.get('/insights/workflows', { params }),
       ])
 
@@ -47,6 +47,25 @@ export default function Insights() {
     fetchInsights()
   }, [fetchInsights])
 
+  // The AI layer is generated in the background — poll until it lands
+  const pending = insights?.status === 'pending'
+  useEffect(() => {
+    if (!pending || !username) return
+    const timer = setInterval(async () => {
+      try {
+        const { data } = await api.get('/insights/status', { params: { username } })
+        if (data.status !== 'pending') {
+          if (data.source) setInsights(data)
+          clearInterval(timer)
+        }
+      } catch (err) {
+        console.error(err)
+        clearInterval(timer)
+      }
+    }, 3000)
+    return () => clearInterval(timer)
+  }, [pending, username])
+
   if (!username) return (
     <div className="flex items-center justify-center h-screen text-gray-500">
       Set your username on the Dashboard first.